@@ -10,12 +10,18 @@ from researchers.tools import yahoo_find_ticker as yft
 
 # Import necessary functions and classes from other researchers
 from researchers.SECresearcher import run_sec_filing_agent, _safe_parse_json, _load_openai_client
-from researchers.News_Agent_Crew import news_agent_crew
+from researchers.News_Agent_Crew import build_news_crew
 from researchers.FREDresearcher import create_crewai_fred_agent
 from researchers.YahooFinanceCrew import run_yahoo_finance_agent
+from researchers.tools.sec_tools import use_bulk_filings
 
 # Import logging for debugging
 import logging
+import argparse
+import contextvars
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Load environment variables
 load_dotenv()
@@ -32,6 +38,7 @@ class FinancialAnalysisFlow(Flow):
         logging.basicConfig(level=logging.INFO)
         self.log = logging.getLogger(__name__)
         self.state['debug'] = False  # default debug to False
+        self.state['parallel'] = False  # default to running the research branches in sequence
         self.client = _load_openai_client()  # Initialize OpenAI client
 
     # Define the start of the flow
@@ -50,7 +57,7 @@ class FinancialAnalysisFlow(Flow):
             print(f"Prompt: {prompt}")
 
         try:
-            best = yft.yahoo_find_ticker(prompt)
+            best = yft.yahoo_find_ticker_cached(prompt)
             self.state["best"] = best
             print(best)
             return best
@@ -63,12 +70,15 @@ class FinancialAnalysisFlow(Flow):
     def check_equity(self):
         type = self.state["best"]["typeDisp"]
 
+        # Parallel mode fans out to all branches at once instead of chaining them
+        prefix = "PARALLEL_" if self.state.get("parallel", False) else ""
+
         if type == "":
             return "UNKNOWN_BRANCH"
         elif type == "EQUITY":
-            return "EQUITY_BRANCH"
+            return prefix + "EQUITY_BRANCH"
         else:
-            return "NON_EQUITY_BRANCH"
+            return prefix + "NON_EQUITY_BRANCH"
     
     # Define the handler for unknown security types
     @listen('UNKNOWN_BRANCH')
@@ -83,33 +93,94 @@ class FinancialAnalysisFlow(Flow):
     def get_sec_agent(self):
         symbol = self.state["best"]["symbol"]
         print(f"Equity branch for {symbol} - running SEC research agent...")
-
-        try:
-            # Run the SEC filing analysis agent
-            result = run_sec_filing_agent({"ticker": symbol})
-            self.state["sec_result"] = result
-            if self.state["debug"]:
-                print(self.state["sec_result"])
-            print(f"SEC Research completed for {symbol}")
-        except Exception as e:
-            print(f"Error running SEC agent: {e}")
-            self.state["sec_result"] = {}
+        self._run_sec_branch(symbol)
         return "SEC_DONE"
  
     @listen('get_sec_agent')
     def get_yahoo_agent(self):
         symbol = self.state["best"]["symbol"]
-        # Run the Yahoo Finance research agent
-        yahoo_result = run_yahoo_finance_agent({"ticker": symbol})
-        self.state["yahoo_result"] = yahoo_result
-        if self.state["debug"]:
-            print(self.state["yahoo_result"])
+        self._run_yahoo_branch(symbol)
         print(f"Yahoo branch for {symbol} - proceeding to do yahoo research")
         return 'YAHOO_DONE'
     
     @listen(or_('NON_EQUITY_BRANCH', 'get_yahoo_agent'))
     def get_fred_agent(self):
         symbol = self.state["best"]["symbol"]
+        if not self._run_fred_branch(symbol):
+            return 'ERROR_DONE'
+        print(f"Yahoo done branch for {symbol} - proceeding to do fred research")
+        return 'FRED_DONE'
+    
+    @listen('get_fred_agent')
+    def get_news_agent(self):
+        symbol = self.state["best"]["symbol"]
+        print(f"News branch for {symbol} - proceeding to do news research")
+        if not self._run_news_branch(symbol):
+            return 'ERROR_DONE'
+        print(f"NewsAgent Crew completed for {symbol}")
+        return 'NEWS_DONE'
+
+    # Fan-out/fan-in: run every applicable research branch at once and join before finalize
+    @listen(or_('PARALLEL_EQUITY_BRANCH', 'PARALLEL_NON_EQUITY_BRANCH'))
+    def run_parallel_agents(self):
+        symbol = self.state["best"]["symbol"]
+        branches = {
+            "yahoo": self._run_yahoo_branch,
+            "fred": self._run_fred_branch,
+            "news": self._run_news_branch,
+        }
+        # SEC filings only exist for equities
+        if self.state["best"]["typeDisp"] == "EQUITY":
+            branches["sec"] = self._run_sec_branch
+        else:
+            self.state["sec_result"] = {}
+
+        print(f"Parallel branch for {symbol} - running {', '.join(branches)} research agents...")
+        with ThreadPoolExecutor(max_workers=len(branches), thread_name_prefix=f"flow-{symbol}") as pool:
+            # Each branch runs in a copy of this context so batch-scoped settings (see use_bulk_filings) follow it
+            futures = {name: pool.submit(contextvars.copy_context().run, run, symbol) for name, run in branches.items()}
+            for name, future in futures.items():
+                if not future.result():
+                    print(f"{name} branch for {symbol} finished with errors")
+        print(f"All research branches completed for {symbol}")
+        return 'PARALLEL_DONE'
+
+    # === Research branches ===
+    # Each branch stores its result (or {} on failure) in state and returns True on success,
+    # so they can be chained by the listeners above or run side by side in run_parallel_agents
+
+    def _record_branch_error(self, branch: str, error: Exception):
+        print(f"Error running {branch} agent: {error}")
+        self.state.setdefault("branch_errors", {})[branch] = str(error)
+
+    def _run_sec_branch(self, symbol: str) -> bool:
+        try:
+            # Run the SEC filing analysis agent
+            result = run_sec_filing_agent({"ticker": symbol})
+        except Exception as e:
+            self._record_branch_error("SEC", e)
+            self.state["sec_result"] = {}
+            return False
+        self.state["sec_result"] = result
+        if self.state["debug"]:
+            print(self.state["sec_result"])
+        print(f"SEC Research completed for {symbol}")
+        return True
+
+    def _run_yahoo_branch(self, symbol: str) -> bool:
+        try:
+            # Run the Yahoo Finance research agent
+            yahoo_result = run_yahoo_finance_agent({"ticker": symbol})
+        except Exception as e:
+            self._record_branch_error("Yahoo", e)
+            self.state["yahoo_result"] = {}
+            return False
+        self.state["yahoo_result"] = yahoo_result
+        if self.state["debug"]:
+            print(self.state["yahoo_result"])
+        return True
+
+    def _run_fred_branch(self, symbol: str) -> bool:
         try:
             print(f"FRED branch for {symbol} - running FRED research agent...")
             # Create FRED agent
@@ -125,36 +196,29 @@ class FinancialAnalysisFlow(Flow):
             crew = Crew(agents=[fred_agent], tasks=[task])
             self.log.info("Starting economic analysis...")
             result = crew.kickoff()
-            
         except Exception as e:
-            print(f"Error running FRED agent: {e}")
+            self._record_branch_error("FRED", e)
             self.state["fred_result"] = {}
-            return 'ERROR_DONE'
-
+            return False
         self.state["fred_result"] = result
         if self.state["debug"]:
             print(self.state["fred_result"])
-        print(f"Yahoo done branch for {symbol} - proceeding to do fred research")
-        return 'FRED_DONE'
-    
-    @listen('get_fred_agent')
-    def get_news_agent(self):
-        symbol = self.state["best"]["symbol"]
-        print(f"News branch for {symbol} - proceeding to do news research")
+        return True
+
+    def _run_news_branch(self, symbol: str) -> bool:
         try:
-            # Run the News agent crew
-            result = news_agent_crew.kickoff(inputs={"company": symbol})
-            self.state["news_result"] = result
-            if self.state["debug"]:
-                print(self.state["news_result"])
+            # Run a News agent crew of our own; crews keep per-run state and batch flows run concurrently
+            result = build_news_crew().kickoff(inputs={"company": symbol})
         except Exception as e:
-            print(f"Error running News agent: {e}")
+            self._record_branch_error("News", e)
             self.state["news_result"] = {}
-            return 'ERROR_DONE'
-        print(f"NewsAgent Crew completed for {symbol}")
-        return 'NEWS_DONE'
+            return False
+        self.state["news_result"] = result
+        if self.state["debug"]:
+            print(self.state["news_result"])
+        return True
     
-    @listen('get_news_agent')
+    @listen(or_('get_news_agent', 'run_parallel_agents'))
     def finalize(self):
         symbol = self.state["best"]["symbol"]
         print(self.state)
@@ -192,10 +256,118 @@ class FinancialAnalysisFlow(Flow):
         print(f"Final analysis completed for {symbol}")
         return self.state
 
+# === Batch portfolio mode ===
+
+# Run one flow for a prompt and summarize it as a report; never raises so one bad name can't stop a batch
+def _run_flow_report(prompt: str, parallel: bool = True, debug: bool = False) -> dict:
+    start_ts = time.perf_counter()
+    report = {"prompt": prompt, "symbol": None, "final_result": None, "error": None, "branch_errors": {}}
+    try:
+        flow = FinancialAnalysisFlow()
+        flow.kickoff(inputs={"prompt": prompt, "parallel": parallel, "debug": debug})
+        state = flow.state
+        report["symbol"] = state.get("best", {}).get("symbol")
+        report["final_result"] = state.get("final_result")
+        report["branch_errors"] = state.get("branch_errors", {})
+        if state.get("error"):
+            report["error"] = state["error"]
+        elif not report["final_result"]:
+            report["error"] = "No final result produced"
+    except Exception as e:
+        report["error"] = str(e)
+    report["seconds"] = round(time.perf_counter() - start_ts, 2)
+    return report
+
+# Nearest-rank percentile of a list of latencies
+def _percentile(values, pct: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def _print_report(report: dict):
+    status = "FAILED" if report["error"] else "OK"
+    print(f"[{status}] {report['prompt']} ({report['symbol']}) in {report['seconds']}s")
+    if report["error"]:
+        print(f"  error: {report['error']}")
+    else:
+        print(report["final_result"])
+
+def run_batch(prompts, max_concurrency: int = 4, parallel: bool = True, debug: bool = False, on_report=None,
+              bulk_filings: bool = False):
+    """
+    Run FinancialAnalysisFlow over many prompts or tickers at once.
+
+    At most max_concurrency flows run at a time. Ticker resolution, the SEC
+    StockMapper, FRED macro data and HTTP sessions are process-wide, so they
+    are shared by every flow in the batch. Each report is passed to on_report
+    (printed by default) as soon as its flow finishes, and a summary with
+    throughput, failures and p50/p95 latency is printed at the end. With
+    bulk_filings (opt in), latest-filing lookups may read an ingested (and recent enough)
+    submissions archive instead of one request per company.
+    Returns {"reports": [...], "summary": {...}}.
+    """
+    prompts = [p.strip() for p in prompts if p and p.strip()]
+    on_report = on_report or _print_report
+    reports = []
+
+    batch_start = time.perf_counter()
+    # Scoped to this batch's flows only: other flows (and overlapping batches) keep their own setting
+    with use_bulk_filings(bulk_filings), \
+            ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="batch") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, _run_flow_report, p, parallel, debug) for p in prompts]
+        for future in as_completed(futures):
+            report = future.result()
+            reports.append(report)
+            on_report(report)
+    elapsed = time.perf_counter() - batch_start
+
+    latencies = [r["seconds"] for r in reports]
+    failures = [r for r in reports if r["error"]]
+    summary = {
+        "flows": len(reports),
+        "succeeded": len(reports) - len(failures),
+        "failed": len(failures),
+        "failures": {r["prompt"]: r["error"] for r in failures},
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_per_minute": round(len(reports) / elapsed * 60, 2) if elapsed > 0 else None,
+        "p50_seconds": _percentile(latencies, 50),
+        "p95_seconds": _percentile(latencies, 95),
+    }
+
+    print("=== Batch summary ===")
+    print(f"Flows: {summary['flows']}  succeeded: {summary['succeeded']}  failed: {summary['failed']}")
+    print(f"Elapsed: {summary['elapsed_seconds']}s  throughput: {summary['throughput_per_minute']} flows/min")
+    print(f"Per-ticker latency p50: {summary['p50_seconds']}s  p95: {summary['p95_seconds']}s")
+    for prompt, error in summary["failures"].items():
+        print(f"  {prompt}: {error}")
+
+    return {"reports": reports, "summary": summary}
+
 # --- Run the flow ---
-flow = FinancialAnalysisFlow()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the financial analysis flow")
+    parser.add_argument("prompts", nargs="*", help="Company names or tickers to analyze as a batch")
+    parser.add_argument("--file", help="File with one company name or ticker per line")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of flows running at once")
+    parser.add_argument("--sequential", action="store_true", help="Run each flow's research branches in sequence")
+    parser.add_argument("--bulk-filings", action="store_true",
+                        help="Let latest-filing lookups read the ingested SEC submissions archive")
+    args = parser.parse_args()
+
+    prompts = list(args.prompts)
+    if args.file:
+        with open(args.file) as f:
+            prompts.extend(line.strip() for line in f if line.strip())
+
+    if prompts:
+        run_batch(prompts, max_concurrency=args.concurrency, parallel=not args.sequential,
+                  bulk_filings=args.bulk_filings)
+    else:
+        flow = FinancialAnalysisFlow()
 
-flow.plot()  # visualize flow
+        flow.plot()  # visualize flow
 
-# Example run using Apple as prompt
-result = flow.kickoff(inputs={"prompt": "Apple", "debug": True})
+        # Example run using Apple as prompt, running the research branches in parallel
+        result = flow.kickoff(inputs={"prompt": "Apple", "debug": True, "parallel": True})
@@ -33,20 +33,8 @@ def run_news_agent(company: str):
     except json.JSONDecodeError:
         return {"error": "Invalid JSON returned by NewsAgent", "raw_result": result}
 
-# Define CrewAI Agent 
-news_agent_wrapper = Agent(
-    role="News Analysis Agent",
-    goal="Fetch and analyze recent news for a given company and summarize sentiment.",
-    backstory="This agent uses NewsAgent to collect and analyze company-related news articles.",
-    llm=llm,  # Attach Gemini as the reasoning model
-)
-
-
-
-# Define CrewAI Task 
-news_agent_task = Task(
-    description="Run NewsAgent workflow for {company} and return analysis result.",
-    expected_output=""" 
+# Output format the news task asks for
+NEWS_TASK_EXPECTED_OUTPUT = """ 
     Required JSON format:
     {
   "company": "{company}",
@@ -70,18 +58,35 @@ Rules:
 3. Count the number of articles correctly for each sentiment.
 4. Summaries (main_topic, good_news, bad_news, feedback) should be concise and informative.
 5. Dates must be in ISO8601 format (YYYY-MM-DDTHH:MM:SS).
-""",
-    agent=news_agent_wrapper,
-    function= run_news_agent,
+"""
+
+
+# Define CrewAI Agent, Task and Crew. They keep per-run state, so flows that run at
+# the same time (RouterMain batch mode) each build their own crew
+def build_news_crew() -> Crew:
+    news_agent_wrapper = Agent(
+        role="News Analysis Agent",
+        goal="Fetch and analyze recent news for a given company and summarize sentiment.",
+        backstory="This agent uses NewsAgent to collect and analyze company-related news articles.",
+        llm=llm,  # Attach Gemini as the reasoning model
     )
 
+    news_agent_task = Task(
+        description="Run NewsAgent workflow for {company} and return analysis result.",
+        expected_output=NEWS_TASK_EXPECTED_OUTPUT,
+        agent=news_agent_wrapper,
+        function=run_news_agent,
+    )
 
-# Define Crew 
-news_agent_crew = Crew(
-    agents=[news_agent_wrapper],
-    tasks=[news_agent_task],
-    process=Process.sequential,
-)
+    return Crew(
+        agents=[news_agent_wrapper],
+        tasks=[news_agent_task],
+        process=Process.sequential,
+    )
+
+
+# Shared crew for single runs
+news_agent_crew = build_news_crew()
 
 # Optional test run 
 if __name__ == "__main__":
@@ -1,6 +1,13 @@
+import ast
+import contextvars
 import json
 import os
-from typing import Any, Dict
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
 from crewai import Agent, Crew, Process, Task
 from crewai.flow.flow import Flow, and_, listen, start
@@ -10,27 +17,63 @@ from openai import OpenAI
 try:
     # Import sec_tools from the tools package if available
     from tools.sec_tools import (
+        FINAL_RATING_WEIGHTS,
         calc_debt_to_equity,
         calc_positive_netincome,
         calc_profit,
         calc_yoy_rev,
-        get_recent_facts,
+        final_rating,
+        get_llm_cache,
+        get_risk_factor_changes as fetch_risk_changes,
         get_risks_mna as fetch_risks_mna,
+        get_sic_code,
+        latest_10k_accession,
+        load_fact_table,
         ticker_to_cik,
     )
+    from tools.fact_store import FactIndex
+    from tools.fundamentals import fundamental_series, summarize_fundamentals
+    from tools.text_chunks import chunk_text, count_tokens, truncate_to_tokens
+    from tools.peer_stats import load_peer_stats
 except ImportError:
     # Fallback import if tools is not a package
     from researchers.tools.sec_tools import (  # type: ignore
+        FINAL_RATING_WEIGHTS,
         calc_debt_to_equity,
         calc_positive_netincome,
         calc_profit,
         calc_yoy_rev,
-        get_recent_facts,
+        final_rating,
+        get_llm_cache,
+        get_risk_factor_changes as fetch_risk_changes,
         get_risks_mna as fetch_risks_mna,
+        get_sic_code,
+        latest_10k_accession,
+        load_fact_table,
         ticker_to_cik,
     )
+    from researchers.tools.fact_store import FactIndex  # type: ignore
+    from researchers.tools.fundamentals import fundamental_series, summarize_fundamentals  # type: ignore
+    from researchers.tools.text_chunks import chunk_text, count_tokens, truncate_to_tokens  # type: ignore
+    from researchers.tools.peer_stats import load_peer_stats  # type: ignore
+
+# === Risk factors / MD&A map-reduce settings ===
+RATING_MODEL = "gpt-5"
+SUMMARY_MODEL = "gpt-5-mini"
+SECTION_TOKEN_BUDGET = 12_000      # most section tokens sent in any single call
+SUMMARY_WORDS = 250                # length of each chunk summary
+LATENCY_TARGET_SECONDS = 120.0     # target for the whole risk/MD&A step
+MAP_SHARE = 0.6                    # part of the target the chunk summaries may use
+MAP_CONCURRENCY = 8                # concurrent summary calls per section
+MAX_REDUCE_ROUNDS = 2              # extra summary rounds over the chunk summaries before truncating
+MIN_CALL_TIMEOUT = 15.0            # floor for a call's timeout once the target is nearly spent
+# Bump whenever the risk/MD&A prompts change so cached ratings from the old prompts are not reused
+RISK_PROMPT_VERSION = "3"
+HEADING_CHARS = 120                # unchanged risk paragraphs are listed by their opening words only
 
 # === Helper functions ===
+# One client (and connection pool) per process; the OpenAI client is thread-safe
+@lru_cache(maxsize=1)
 def _load_openai_client() -> OpenAI:
     load_dotenv()
     openai_api_key = os.getenv("OPENAI_API_KEY")
@@ -45,31 +88,165 @@ def _safe_parse_json(raw_content: str) -> Any:
     except json.JSONDecodeError:
         return raw_content
 
+
+# Section ratings only: the prompt shows a single-quoted example, which models often copy verbatim,
+# so a reply json can't read is also tried as a Python literal before falling back to the raw text
+def _parse_section_rating(raw_content: str) -> Any:
+    parsed = _safe_parse_json(raw_content)
+    if not isinstance(parsed, str):
+        return parsed
+    try:
+        return ast.literal_eval(raw_content)
+    except (ValueError, SyntaxError):
+        return raw_content
+
+
+def _rating_value(parsed: Any) -> Optional[float]:
+    if isinstance(parsed, dict):
+        try:
+            return float(parsed.get("rating"))
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def _rationale(parsed: Any) -> str:
+    return str(parsed.get("rationale", "")) if isinstance(parsed, dict) else str(parsed)
+
+
+def _time_left(deadline: float) -> float:
+    return deadline - time.monotonic()
+
+
+# First sentence of a paragraph, cut to HEADING_CHARS (risk factors open with a one-line heading)
+def _heading(paragraph: str) -> str:
+    sentence = re.split(r"(?<=[.!?])\s", paragraph, maxsplit=1)[0]
+    return sentence if len(sentence) <= HEADING_CHARS else sentence[:HEADING_CHARS].rsplit(" ", 1)[0] + "..."
+
+
+# Prompt text for the risk factors that differ from the prior 10-K (see get_risk_factor_changes)
+def _risk_delta_text(changes: dict, prior_rating: Any = None) -> str:
+    parts = []
+    if prior_rating is not None:
+        parts.append(f"Rating of the prior 10-K's risk factors: {prior_rating}.")
+    else:
+        parts.append("Risk factors carried over unchanged (opening words): "
+                     + " | ".join(_heading(p) for p in changes["unchanged"]))
+    parts.append(f"{len(changes['unchanged'])} of {changes['total']} paragraphs are unchanged from the prior 10-K.")
+    if changes["new"]:
+        parts.append("New paragraphs:\n" + "\n".join(changes["new"]))
+    if changes["changed"]:
+        parts.append("Revised paragraphs (current wording):\n" + "\n".join(c["text"] for c in changes["changed"]))
+    if changes["removed"]:
+        parts.append("Removed paragraphs:\n" + "\n".join(changes["removed"]))
+    return "\n\n".join(parts)
+
+
+# Financial rating key -> final_rating weight name (calc_yoy_rev spells its rating key 'ratintg')
+_COMPONENT_WEIGHTS = {"yoy": "yoy", "profit": "profit", "debt": "debt_equity", "income": "net_income"}
+
+
+def _component_rating(component: dict) -> float:
+    return float(component.get("rating", component.get("ratintg")))
+
+
+# "Description: value (rating x/5, weight y%)" for one calc_* result
+def _describe_component(component: dict, weight: float) -> str:
+    value = next((v for k, v in component.items() if k not in ("rating", "ratintg", "description")), None)
+    shown = f"{value:,.2f}" if isinstance(value, (int, float)) else str(value)
+    return f"{component.get('description', 'Component')}: {shown} (rating {_component_rating(component):.1f}/5, weight {weight:.0%})"
+
 from openai import OpenAI
 
 # === SEC Filing Analysis Flow ===
 class SECFilingAnalysis:
-    # Initialize with OpenAI client
-    def __init__(self):
+    # Initialize with OpenAI client; include_history adds multi-period trends from the full fact history.
+    # token_budget caps the section text per LLM call; latency_target bounds the risk/MD&A step.
+    # Risk/MD&A ratings are cached per 10-K accession; refresh_cache drops the entry before rating again.
+    # local_scoring applies the final_rating weights here instead of asking the LLM; narrative adds LLM prose.
+    # include_peers adds percentiles within the company's SIC peer group from the XBRL frames.
+    # risk_delta rates risk factors on what changed since the prior 10-K instead of the full section
+    def __init__(self, include_history: bool = False, token_budget: int = SECTION_TOKEN_BUDGET,
+                 latency_target: float = LATENCY_TARGET_SECONDS, map_concurrency: int = MAP_CONCURRENCY,
+                 use_cache: bool = True, refresh_cache: bool = False, local_scoring: bool = True,
+                 narrative: bool = False, include_peers: bool = False, risk_delta: bool = True):
         self.client = _load_openai_client()
+        self.risk_delta = risk_delta
+        self.include_history = include_history
+        self.include_peers = include_peers
+        self.token_budget = token_budget
+        self.latency_target = latency_target
+        self.map_concurrency = map_concurrency
+        self.use_cache = use_cache
+        self.refresh_cache = refresh_cache
+        self.local_scoring = local_scoring
+        self.narrative = narrative
         self.state = {}
+        self.timings = {}
 
     # === Public API ===
     def run(self, ticker: str):
         if not ticker:
             raise ValueError("No ticker provided. Example: run('AAPL')")
 
-        cik = self._get_cik(ticker)
-        facts = self._get_facts(cik)
-        financial_ratings = self._calc_financial_ratings(facts)
-        risk_mna_rating = self._get_risks_mna(cik)
-        final_report = self._get_final_report(financial_ratings, risk_mna_rating)
+        started = time.perf_counter()
+        self.timings = {}
+        cik = self._timed("cik", self._get_cik, ticker)
 
-        return {
+        # The 10-K download + risk LLM call run in the background while companyfacts
+        # is fetched and the ratios are computed on this thread
+        pool = ThreadPoolExecutor(max_workers=1)
+        abandoned = threading.Event()
+        risk_future = None
+        try:
+            risk_future = pool.submit(contextvars.copy_context().run, self._timed, "risks_mna",
+                                      self._get_risks_mna, cik, abandoned)
+            facts = self._timed("facts", self._get_facts, cik)
+            financial_ratings = self._timed("financial_ratings", self._calc_financial_ratings, facts)
+            history = self._timed("history", self._get_history) if self.include_history else None
+            peers = self._timed("peers", self._get_peers, cik) if self.include_peers else None
+            risk_mna_rating = risk_future.result()
+        except BaseException:
+            # Don't hold up an error from the facts side waiting for the LLM call; a worker that
+            # already started stops before its LLM calls and leaves the cache and state alone
+            abandoned.set()
+            raise
+        finally:
+            if risk_future is not None:
+                risk_future.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.state["risk_mna_rating"] = risk_mna_rating
+
+        final_report = None
+        if self.local_scoring:
+            final_report = self._timed("final_score", self._score_locally, financial_ratings, risk_mna_rating)
+            if final_report is not None and self.narrative:
+                final_report["narrative"] = self._timed(
+                    "narrative", self._get_narrative, final_report, financial_ratings, risk_mna_rating, history
+                )
+        if final_report is None:
+            final_report = self._timed("final_report", self._get_final_report, financial_ratings, risk_mna_rating, history)
+        self.timings["total"] = time.perf_counter() - started
+
+        result = {
             "final_result": final_report,
             "financial_ratings": financial_ratings,
             "risk_mna_rating": risk_mna_rating,
         }
+        if history is not None:
+            result["fundamental_history"] = history
+        if peers is not None:
+            result["peer_percentiles"] = peers
+        result["timings"] = {step: round(seconds, 3) for step, seconds in self.timings.items()}
+        return result
+
+    # Run one step and record its wall time in self.timings (steps may run on different threads)
+    def _timed(self, step: str, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.timings[step] = time.perf_counter() - started
 
     # === Individual steps ===
 
@@ -81,51 +258,293 @@ class SECFilingAnalysis:
         self.state["cik"] = cik
         return cik
 
-    # Get recent facts from CIK
+    # Get recent facts from CIK as a columnar table (memory-mapped from the per-CIK store)
     def _get_facts(self, cik: str):
-        facts = get_recent_facts(cik)
-        if not facts:
+        table = load_fact_table(cik)
+        facts = table.latest_filing()
+        if not len(facts):
             raise ValueError(f"No recent facts returned for CIK '{cik}'.")
+        self.state["fact_table"] = table
         self.state["facts"] = facts
         return facts
 
-    # Calculate financial ratings
+    # Quarterly/annual series and trends from the full history already in the fact table
+    def _get_history(self):
+        history = summarize_fundamentals(fundamental_series(self.state["fact_table"]))
+        self.state["fundamental_history"] = history
+        return history
+
+    # Percentile of revenue growth, net margin and debt to equity among SIC peers (latest full calendar year)
+    def _get_peers(self, cik: str):
+        try:
+            stats = load_peer_stats()
+            peers = {"year": stats.year, **stats.company_percentiles(int(cik), get_sic_code(cik))}
+        except Exception as e:
+            # Peer context is optional; the ratings don't depend on it
+            print(f"[Warning] Peer statistics unavailable for CIK {cik}: {e}")
+            peers = {}
+        self.state["peer_percentiles"] = peers
+        return peers
+
+    # Calculate financial ratings from one concept index shared by every ratio
     def _calc_financial_ratings(self, facts):
+        index = FactIndex(facts)
         financial_ratings = {
-            "yoy": calc_yoy_rev(facts),
-            "profit": calc_profit(facts),
-            "debt": calc_debt_to_equity(facts),
-            "income": calc_positive_netincome(facts),
+            "yoy": calc_yoy_rev(index),
+            "profit": calc_profit(index),
+            "debt": calc_debt_to_equity(index),
+            "income": calc_positive_netincome(index),
         }
         self.state["financial_ratings"] = financial_ratings
         return financial_ratings
 
-    # Get risk/MNA rating
-    def _get_risks_mna(self, cik: str):
-        risks, mna = fetch_risks_mna(cik)
+    # Get risk/MNA rating, from the per-accession cache when this 10-K was rated before.
+    # abandoned is set by run() when the rest of the run failed; the rating is then discarded
+    def _get_risks_mna(self, cik: str, abandoned: Optional[threading.Event] = None):
+        abandoned = abandoned or threading.Event()
+        if not self.use_cache:
+            return self._rate_risks_mna(cik, abandoned)
+
+        cache = get_llm_cache()
+        accession = latest_10k_accession(cik)
+        key = (accession, *self._risk_cache_key())
+        if self.refresh_cache:
+            cache.invalidate(accession, "risk_mna")
+        else:
+            cached = cache.get(*key)
+            if cached is not None:
+                if not abandoned.is_set():
+                    self.state["risk_mna_cache"] = "hit"
+                return cached
+
+        parsed_rating = self._rate_risks_mna(cik, abandoned)
+        if parsed_rating is None:
+            return None
+        if not abandoned.is_set():
+            self.state["risk_mna_cache"] = "miss"
+        # Only cache complete answers (kept even if the run failed meanwhile, they were paid for);
+        # an unparseable reply is retried on the next run
+        if all(_rating_value(parsed_rating[part]) is not None for part in ("risk_factors", "mna")):
+            cache.put(*key, parsed_rating)
+        return parsed_rating
+
+    # (name, model, prompt version) of cached risk/MD&A ratings; large sections are condensed first,
+    # and delta prompts differ from full ones, so both settings are part of the prompt version
+    def _risk_cache_key(self):
+        version = f"{RISK_PROMPT_VERSION}-{self.token_budget}" + ("-delta" if self.risk_delta else "")
+        return "risk_mna", f"{RATING_MODEL}+{SUMMARY_MODEL}", version
+
+    # Risk factors and MD&A are rated by two concurrent calls; None if the run was abandoned before them
+    def _rate_risks_mna(self, cik: str, abandoned: threading.Event):
+        # The target covers the whole step, including the section fetch and the prior 10-K diff
+        started = time.monotonic()
+        deadline = started + self.latency_target
+        risks, mna = self._timed("sections", fetch_risks_mna, cik)
+
+        risk_label, risk_text, changes = "risk factors", risks, None
+        if self.risk_delta:
+            changes = self._timed("risk_diff", self._get_risk_changes, cik)
+            if changes is not None:
+                risk_label = "risk factors (changes since the prior 10-K)"
+                risk_text = _risk_delta_text(changes, self._prior_risk_rating(changes["prior_accession"]))
+
+        if abandoned.is_set():
+            print(f"SEC run for CIK {cik} failed; skipping the risk/MD&A rating calls")
+            return None
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            risk_future = pool.submit(self._rate_section, risk_label, risk_text, deadline)
+            mna_future = pool.submit(self._rate_section, "management discussion and analysis", mna, deadline)
+            risk_rating, mna_rating = risk_future.result(), mna_future.result()
+
+        ratings = [r for r in (_rating_value(risk_rating), _rating_value(mna_rating)) if r is not None]
+        parsed_rating = {
+            "rating": round(sum(ratings) / len(ratings), 1) if ratings else None,
+            "rationale": f"Risk factors: {_rationale(risk_rating)} MD&A: {_rationale(mna_rating)}",
+            "risk_factors": risk_rating,
+            "mna": mna_rating,
+        }
+        if changes is not None:
+            parsed_rating["risk_changes"] = {
+                "prior_accession": changes["prior_accession"],
+                **{kind: len(changes[kind]) for kind in ("new", "changed", "removed", "unchanged")},
+            }
+        elapsed = time.monotonic() - started
+        if elapsed > self.latency_target:
+            print(f"[Warning] Risk/MD&A analysis took {elapsed:.1f}s (target {self.latency_target:.0f}s)")
+        return parsed_rating
+
+    # Paragraph diff of Item 1A against the prior 10-K; None falls back to rating the full section
+    def _get_risk_changes(self, cik: str):
+        try:
+            return fetch_risk_changes(cik)
+        except Exception as e:
+            print(f"[Warning] Risk factor diff unavailable for CIK {cik}: {e}")
+            return None
+
+    # The prior filing's risk factor rating, if it was analyzed before with the current settings
+    def _prior_risk_rating(self, prior_accession: str):
+        if not self.use_cache:
+            return None
+        name, model, version = self._risk_cache_key()
+        prior = get_llm_cache().get(prior_accession, name, model, version)
+        return prior.get("risk_factors") if isinstance(prior, dict) else None
+
+    # Rate one section; text over the token budget is condensed by chunk summaries first (map-reduce)
+    def _rate_section(self, label: str, text: str, deadline: float):
+        map_deadline = deadline - (1 - MAP_SHARE) * self.latency_target
+        digest, coverage = self._condense(label, text, map_deadline)
+        if digest is text:
+            source = f"{label}: {digest}"
+        else:
+            partial = f" (covering {coverage:.0%} of the section)" if coverage < 1 else ""
+            source = f"{label}, condensed from summaries of consecutive parts of the section{partial}: {digest}"
 
         response = self.client.chat.completions.create(
-            model="gpt-5",
+            model=RATING_MODEL,
             messages=[
                 {"role": "system", "content": "You are a financial analysis expert."},
                 {
                     "role": "user",
                     "content": (
                         "Provide a rating from 1 'sell', 2 'underperform', 3 'hold', "
-                        "4 'outperform', 5 'strong buy' for the following based on risk factors: "
-                        f"{risks} and management discussion and analysis: {mna}. "
+                        f"4 'outperform', 5 'strong buy' for the following based on {source}. "
                         "Respond with JSON only like {'rating': 4, 'rationale': 'text'}."
                     ),
                 },
             ],
+            timeout=max(MIN_CALL_TIMEOUT, _time_left(deadline)),
         )
+        return _parse_section_rating(response.choices[0].message.content)
 
-        parsed_rating = _safe_parse_json(response.choices[0].message.content)
-        self.state["risk_mna_rating"] = parsed_rating
-        return parsed_rating
+    # Returns (text within the token budget, share of the section it covers)
+    def _condense(self, label: str, text: str, deadline: float) -> Tuple[str, float]:
+        total = count_tokens(text)
+        if total <= self.token_budget:
+            return text, 1.0
+
+        if _time_left(deadline) <= 0:
+            print(f"[Warning] No time left to summarize {label}; truncating the section")
+            return truncate_to_tokens(text, self.token_budget), self.token_budget / total
+
+        chunks = chunk_text(text, self.token_budget)
+        summaries = self._summarize_chunks(label, chunks, deadline)
+        done = [s for s in summaries if s]
+        if not done:
+            print(f"[Warning] No {label} summaries finished in time; truncating the section")
+            return truncate_to_tokens(text, self.token_budget), self.token_budget / total
+        coverage = len(done) / len(chunks)
+
+        # Very long sections can produce more summary text than one call allows; reduce again,
+        # at most MAX_REDUCE_ROUNDS times and only while the map deadline hasn't passed
+        digest = "\n\n".join(done)
+        rounds = 0
+        while count_tokens(digest) > self.token_budget:
+            if rounds == MAX_REDUCE_ROUNDS or _time_left(deadline) <= 0:
+                return truncate_to_tokens(digest, self.token_budget), coverage
+            rounds += 1
+            parts = chunk_text(digest, self.token_budget)
+            summaries = [s for s in self._summarize_chunks(label, parts, deadline) if s]
+            if len(summaries) < len(parts):
+                return truncate_to_tokens(digest, self.token_budget), coverage
+            digest = "\n\n".join(summaries)
+        return digest, coverage
+
+    # Map step: summarize chunks concurrently with the small model; unfinished chunks come back as None
+    def _summarize_chunks(self, label: str, chunks: List[str], deadline: float) -> List[Optional[str]]:
+        pool = ThreadPoolExecutor(max_workers=max(1, min(self.map_concurrency, len(chunks))))
+        futures = [
+            pool.submit(self._summarize_chunk, label, chunk, i, len(chunks), deadline)
+            for i, chunk in enumerate(chunks)
+        ]
+        wait(futures, timeout=max(0.0, _time_left(deadline)))
+        # Don't block on stragglers; whatever has not started is dropped
+        pool.shutdown(wait=False, cancel_futures=True)
+
+        summaries = []
+        for i, future in enumerate(futures):
+            if not future.done() or future.cancelled():
+                summaries.append(None)
+            elif future.exception() is not None:
+                print(f"[Warning] Summary of {label} part {i + 1} failed: {future.exception()}")
+                summaries.append(None)
+            else:
+                summaries.append(future.result())
+        return summaries
+
+    def _summarize_chunk(self, label: str, chunk: str, i: int, n: int, deadline: float) -> str:
+        response = self.client.chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=[
+                {"role": "system", "content": "You are a financial analysis expert."},
+                {
+                    "role": "user",
+                    "content": (
+                        f"Summarize part {i + 1} of {n} of a 10-K's {label} section for an equity rating. "
+                        "Keep material facts, figures, trends and risks, and leave out boilerplate. "
+                        f"Use at most {SUMMARY_WORDS} words. Text: {chunk}"
+                    ),
+                },
+            ],
+            timeout=max(MIN_CALL_TIMEOUT, _time_left(deadline)),
+        )
+        return response.choices[0].message.content
+
+    # Final score with the fixed final_rating weights; None if the risk rating is unusable
+    def _score_locally(self, financial_ratings, risk_mna_rating):
+        risk = _rating_value(risk_mna_rating)
+        if risk is None:
+            print("[Warning] Risk/MNA rating has no numeric rating, using the LLM final report")
+            return None
+
+        components = {key: _component_rating(financial_ratings[key]) for key in _COMPONENT_WEIGHTS}
+        score, recommendation = final_rating(
+            risk, components["yoy"], components["profit"], components["debt"], components["income"]
+        )
+        lines = [
+            _describe_component(financial_ratings[key], FINAL_RATING_WEIGHTS[weight])
+            for key, weight in _COMPONENT_WEIGHTS.items()
+        ]
+        lines.append(
+            f"Risk factors and MD&A (rating {risk:.1f}/5, weight {FINAL_RATING_WEIGHTS['risk']:.0%}): "
+            f"{_rationale(risk_mna_rating)}"
+        )
+        return {
+            "rating": round(score, 2),
+            "recommendation": recommendation,
+            "rationale": f"Weighted score {score:.2f} ({recommendation}). " + " ".join(f"{line.rstrip('.')}." for line in lines),
+            "components": {**components, "risk": risk},
+        }
+
+    # Optional prose explanation of a locally computed score; the score itself is not changed
+    def _get_narrative(self, final_report, financial_ratings, risk_mna_rating, history=None):
+        history_context = (
+            f"Multi-period fundamentals: {json.dumps(history)}. " if history is not None else ""
+        )
+        response = self.client.chat.completions.create(
+            model="gpt-5-mini",
+            messages=[
+                {"role": "system", "content": "You are a financial analysis expert."},
+                {
+                    "role": "user",
+                    "content": (
+                        f"The company received a weighted SEC filing score of {final_report['rating']} "
+                        f"out of 5 ({final_report['recommendation']}). "
+                        f"Financial ratings: {financial_ratings}. "
+                        f"Risk/MNA rating: {risk_mna_rating}. "
+                        f"{history_context}"
+                        "Explain this score for an investor in one short paragraph. Do not change the score."
+                    ),
+                },
+            ],
+        )
+        return response.choices[0].message.content
 
-    # Get final report
-    def _get_final_report(self, financial_ratings, risk_mna_rating):
+    # Get final report from the LLM (local_scoring=False, or no usable risk rating)
+    def _get_final_report(self, financial_ratings, risk_mna_rating, history=None):
+        history_context = (
+            f"Multi-period fundamentals (supporting context for the YoY, profit and debt components): {json.dumps(history)}. "
+            if history is not None else ""
+        )
         response = self.client.chat.completions.create(
             model="gpt-5",
             messages=[
@@ -137,6 +556,7 @@ class SECFilingAnalysis:
                         "4 'outperform', 5 'strong buy' based on the following context. "
                         f"Financial ratings: {financial_ratings}. "
                         f"Risk/MNA rating: {risk_mna_rating}. "
+                        f"{history_context}"
                         "Respond with JSON only like {'rating': 4, 'rationale': 'text'}. "
                         "Give 20% weight for YoY, 20% for profit, 15% for debt, "
                         "15% for income, 30% for risk/mna."
@@ -151,7 +571,16 @@ class SECFilingAnalysis:
 # run SEC Filing Analysis as an Agent
 def run_sec_filing_agent(inputs: dict):
     ticker = inputs.get("ticker")
-    analyzer = SECFilingAnalysis()
+    analyzer = SECFilingAnalysis(
+        include_history=inputs.get("history", False),
+        token_budget=inputs.get("token_budget", SECTION_TOKEN_BUDGET),
+        latency_target=inputs.get("latency_target", LATENCY_TARGET_SECONDS),
+        refresh_cache=inputs.get("refresh_cache", False),
+        local_scoring=inputs.get("local_scoring", True),
+        narrative=inputs.get("narrative", False),
+        include_peers=inputs.get("peers", False),
+        risk_delta=inputs.get("risk_delta", True),
+    )
     result = analyzer.run(ticker)
     return result
 
@@ -1,8 +1,9 @@
 # YahooFinanceAgent v2 
 
 import json
-import time
+import os
 from datetime import datetime, timedelta
+from pathlib import Path
 from dateutil import parser as date_parser
 
 import numpy as np
@@ -15,17 +16,47 @@ try:
 except Exception:
     RSIIndicator = None
 
-# Simple in-memory cache for fetched data
-_YF_CACHE = {}
-def _cache_get(key):
-    v = _YF_CACHE.get(key)
-    if v and (time.time() - v["ts"]) < 300:
-        return v["value"]
-    return None
+try:
+    from tools.ttl_cache import TtlLruCache
+    from tools.price_store import PriceStore
+    from tools.indicators import StreamingIndicators, indicator_columns, indicator_kernel
+except ImportError:
+    # Fallback import if tools is not a package
+    from researchers.tools.ttl_cache import TtlLruCache  # type: ignore
+    from researchers.tools.price_store import PriceStore  # type: ignore
+    from researchers.tools.indicators import StreamingIndicators, indicator_columns, indicator_kernel  # type: ignore
+
+# Seconds each kind of Yahoo data is reused for
+YF_CACHE_TTLS = {
+    "prices": 300,                 # intraday bars move
+    "fundamentals": 6 * 3600,      # info fields change at most daily
+    "earnings_dates": 12 * 3600,   # calendar changes a few times a year
+}
+
+# Bounded in-memory cache for fetched data (YF_CACHE_MAX_MB caps its estimated size)
+_YF_CACHE = TtlLruCache(int(float(os.getenv("YF_CACHE_MAX_MB", 256)) * 1024 * 1024), YF_CACHE_TTLS)
+
+# Daily bars kept on disk per symbol, so reruns only download the bars added since the last run
+YF_PRICE_STORE_DIR = Path(os.getenv("YF_PRICE_STORE_DIR", Path.home() / ".cache" / "yahoo_prices"))
+_PRICE_STORE = PriceStore(YF_PRICE_STORE_DIR)
+
+# Download one symbol's bars for [start, end)
+def _download_prices(symbol, start, end):
+    # set auto_adjust explicitly to avoid FutureWarning
+    df = yf.download(symbol, start=start.isoformat(), end=end.isoformat(),
+                     progress=False, threads=False, auto_adjust=True)
+    return df if df is not None else pd.DataFrame()
 
-# set cache value
-def _cache_set(key, value):
-    _YF_CACHE[key] = {"ts": time.time(), "value": value}
+# Download many symbols' bars for [start, end) in one batched request: {symbol: frame}
+def _download_prices_many(symbols, start, end):
+    df = yf.download(list(symbols), start=start.isoformat(), end=end.isoformat(),
+                     progress=False, threads=True, auto_adjust=True, group_by="ticker")
+    if df is None or df.empty:
+        return {}
+    if not isinstance(df.columns, pd.MultiIndex):
+        return {symbols[0]: df}
+    tickers = set(df.columns.get_level_values(0))
+    return {s: df[s] for s in symbols if s in tickers}
 
 # Yahoo Finance Analysis Agent
 class YahooFinanceAgent:
@@ -36,30 +67,39 @@ class YahooFinanceAgent:
 
     # Fetch price history from Yahoo Finance
     def _fetch_price_history(self, symbol, period_days=365):
-        key = f"prices::{symbol}::{period_days}"
-        cached = _cache_get(key)
+        key = (symbol, period_days)
+        cached = _YF_CACHE.get("prices", key)
         if cached is not None:
             return cached
         end = datetime.now().date()
         start = end - timedelta(days=period_days + 7)
-        # set auto_adjust explicitly to avoid FutureWarning
-        df = yf.download(symbol, start=start.isoformat(), end=end.isoformat(),
-                         progress=False, threads=False, auto_adjust=True)
-        if df is None or df.empty:
+        # only the bars missing from the local store are downloaded
+        df = _PRICE_STORE.get(symbol, start, end, _download_prices)
+        if df.empty:
             raise ValueError(f"No price data fetched for {symbol}")
-        df = df.reset_index().rename(columns={"Date": "date"})
-        df["date"] = pd.to_datetime(df["date"])
-        _cache_set(key, df)
+        _YF_CACHE.set("prices", key, df)
         return df
-    # Fetch ticker object from yfinance
-    def _fetch_ticker(self, symbol):
-        key = f"ticker::{symbol}"
-        cached = _cache_get(key)
+    # Fetch closing prices of many symbols in one batched download: (dates, dates x symbols array)
+    def _fetch_close_matrix(self, symbols, period_days=365):
+        key = (tuple(symbols), period_days)
+        cached = _YF_CACHE.get("prices", key)
         if cached is not None:
             return cached
-        t = yf.Ticker(symbol)
-        _cache_set(key, t)
-        return t
+        end = datetime.now().date()
+        start = end - timedelta(days=period_days + 7)
+        frames = _PRICE_STORE.get_many(symbols, start, end, _download_prices_many)
+        if all(f.empty for f in frames.values()):
+            raise ValueError(f"No price data fetched for {', '.join(symbols)}")
+        close = pd.concat({s: f.set_index("date")["Close"] for s, f in frames.items()}, axis=1)
+        # symbols Yahoo doesn't know come back as all-NaN columns
+        close = close.reindex(columns=list(symbols)).sort_index()
+        result = (pd.DatetimeIndex(pd.to_datetime(close.index)), close.to_numpy(dtype=np.float64))
+        _YF_CACHE.set("prices", key, result)
+        return result
+
+    # Fetch ticker object from yfinance (cheap to create; the data read from it is cached instead)
+    def _fetch_ticker(self, symbol):
+        return yf.Ticker(symbol)
 
     # Safe attribute getter
     def _safe_get(self, obj, attr, default=None):
@@ -68,124 +108,124 @@ class YahooFinanceAgent:
         except Exception:
             return default
 
-    # Compute technical indicators from price DataFrame
-    def _compute_indicators(self, price_df):
-        out = {}
-        # Ensure DataFrame and locate Close column whether columns are single-level or multi-level
-        df = price_df.copy().set_index("date").sort_index()
-        cols = df.columns
+    # Dates and float64 closes of a price DataFrame, in date order
+    def _close_and_dates(self, price_df):
+        # Locate Close column whether columns are single-level or multi-level
+        cols = price_df.columns
         # detect MultiIndex columns like ('Close','AAPL') or single-level 'Close'
         if isinstance(cols, pd.MultiIndex):
             # find first level name 'Close' (case-sensitive)
             close_cols = [c for c in cols if c[0] == "Close"]
             if not close_cols:
                 raise ValueError("Price DataFrame missing 'Close' column (multiindex)")
-            close_series = df[close_cols[0]]
+            close_series = price_df[close_cols[0]]
         else:
-            if "Close" not in df.columns:
+            if "Close" not in cols:
                 # try lowercase fallback
-                low = [c for c in df.columns if str(c).lower() == "close"]
+                low = [c for c in cols if str(c).lower() == "close"]
                 if not low:
                     raise ValueError("Price DataFrame missing 'Close' column")
-                close_series = df[low[0]]
+                close_series = price_df[low[0]]
             else:
-                close_series = df["Close"]
-    
-        # convert to numeric 1-D array and drop NaNs
-        close_vals = pd.to_numeric(close_series, errors="coerce").to_numpy()
-        # if close_series came from a DataFrame column (multiindex extraction) it may be 2-D; ensure 1-D
-        if close_vals.ndim > 1:
-            # if shape (n,1) flatten
-            close_vals = close_vals.reshape(-1)
-        mask = ~np.isnan(close_vals)
-        close_vals = close_vals[mask]
-        n = len(close_vals)
-        if n == 0:
-            raise ValueError("Empty close series after cleaning")
-    
-        # scalar-safe access using numpy indices
-        latest = float(close_vals[-1])
-        out["latest_close"] = latest
-    
-        # first/last dates from df index (after cleaning mask we approximate using original index)
-        try:
-            out["first_date"] = df.index[0].isoformat()
-            out["last_date"] = df.index[-1].isoformat()
-        except Exception:
-            out["first_date"] = None
-            out["last_date"] = None
-    
-        def pct_by_indices(latest_idx, prior_idx):
-            if prior_idx < 0 or latest_idx < 0 or prior_idx >= n or latest_idx >= n:
-                return None
-            prior = close_vals[prior_idx]
-            latest_v = close_vals[latest_idx]
-            if prior == 0:
-                return None
-            return float((latest_v / prior) - 1)
-    
-        # Calculate returns over various periods
-        out["7d_return"] = pct_by_indices(n - 1, n - 8) if n >= 8 else None
-        out["30d_return"] = pct_by_indices(n - 1, n - 31) if n >= 31 else None
-        out["90d_return"] = pct_by_indices(n - 1, n - 91) if n >= 91 else None
-        out["1y_return"] = pct_by_indices(n - 1, 0) if n >= 252 else None
-    
-        # Use pandas Series built from the cleaned numpy array for rolling ops
-        close_series_clean = pd.Series(close_vals)
-    
-        # Simple Moving Averages and related indicators
-        out["sma_20"] = float(close_series_clean.rolling(window=20, min_periods=1).mean().iat[-1])
-        out["sma_50"] = float(close_series_clean.rolling(window=50, min_periods=1).mean().iat[-1])
-        out["sma_200"] = float(close_series_clean.rolling(window=200, min_periods=1).mean().iat[-1])
-        out["price_vs_sma20"] = 1 if out["latest_close"] > out["sma_20"] else -1
-        out["volatility_30d"] = float(close_series_clean.pct_change().rolling(window=21, min_periods=1).std().iat[-1])
-    
-        # max drawdown
-        roll_max = close_series_clean.cummax()
-        drawdown = (close_series_clean - roll_max) / roll_max
-        out["max_drawdown"] = float(drawdown.min())
-    
-        # RSI 14 (safe fallback if ta not installed)
+                close_series = price_df["Close"]
+
+        # one float64 array of closes in date order (the kernel drops NaNs)
+        dates = pd.to_datetime(price_df["date"]).to_numpy()
+        close_vals = pd.to_numeric(close_series, errors="coerce").to_numpy(dtype=np.float64).reshape(-1)
+        if len(dates) > 1 and not (dates[1:] >= dates[:-1]).all():
+            order = np.argsort(dates, kind="stable")
+            dates, close_vals = dates[order], close_vals[order]
+        return dates, close_vals
+
+    # Compute technical indicators from price DataFrame
+    def _compute_indicators(self, price_df):
+        dates, close_vals = self._close_and_dates(price_df)
+        out = indicator_kernel(close_vals, wilder_rsi=RSIIndicator is not None)
+        # first/last dates of the whole frame
         try:
-            if RSIIndicator is not None:
-                rsi = RSIIndicator(close_series_clean, window=14)
-                out["rsi_14"] = float(rsi.rsi().iat[-1])
-            else:
-                delta = close_series_clean.diff().dropna()
-                up = delta.where(delta > 0, 0).rolling(14).mean()
-                down = -delta.where(delta < 0, 0).rolling(14).mean()
-                rs = up / down.replace(0, np.nan)
-                last_rs = rs.iat[-1] if len(rs) > 0 else np.nan
-                out["rsi_14"] = float(100 - (100 / (1 + last_rs))) if not np.isnan(last_rs) else None
+            first_date, last_date = pd.Timestamp(dates[0]).isoformat(), pd.Timestamp(dates[-1]).isoformat()
         except Exception:
-            out["rsi_14"] = None
-    
-        return out
+            first_date = last_date = None
+        # same key order as before: latest_close, first_date, last_date, then the indicators
+        return {"latest_close": out.pop("latest_close"), "first_date": first_date, "last_date": last_date, **out}
+
+    # Same indicators as _compute_indicators for every column of a dates x symbols close array (None for empty columns)
+    def _compute_indicators_many(self, dates, close):
+        close = np.asarray(close, dtype=np.float64)
+        valid = ~np.isnan(close)
+        first_row = np.argmax(valid, axis=0)
+        last_row = len(close) - 1 - np.argmax(valid[::-1], axis=0)
+        results = []
+        for j, out in enumerate(indicator_columns(close, wilder_rsi=RSIIndicator is not None)):
+            if out is not None:
+                # each symbol's own first/last priced bar
+                out = {"latest_close": out.pop("latest_close"),
+                       "first_date": dates[first_row[j]].isoformat(),
+                       "last_date": dates[last_row[j]].isoformat(), **out}
+            results.append(out)
+        return results
 
     # Fetch fundamental data from ticker object
     def _fetch_fundamentals(self, ticker_obj):
+        symbol = self._safe_get(ticker_obj, "ticker")
+        cached = _YF_CACHE.get("fundamentals", symbol) if symbol else None
+        if cached is not None:
+            return dict(cached)
         out = {}
+        failed = False
         try:
             info = ticker_obj.info or {}
         except Exception:
             info = {}
+            failed = True
         # common fields, may be missing
         out["market_cap"] = info.get("marketCap")
         out["trailing_pe"] = info.get("trailingPE")
         out["forward_pe"] = info.get("forwardPE")
         out["peg_ratio"] = info.get("pegRatio")
         out["beta"] = info.get("beta")
+        # a failed lookup isn't cached, so the next call asks Yahoo again
+        if symbol and not failed:
+            _YF_CACHE.set("fundamentals", symbol, dict(out))
         return out
 
     # Compute returns around last earnings event
     def _earnings_event_returns(self, ticker_obj, price_df):
-        # attempt to fetch last earnings calendar and compute 7d pre/post returns around the last earnings date
+        # compute 7d pre/post returns around the last earnings date
+        event = self._last_earnings_date(ticker_obj)
+        if event is None:
+            return {"last_earnings_date": None, "pre7_return": None, "post7_return": None}
+        event_date = pd.to_datetime(event).date()
+        df = price_df.copy().set_index("date").sort_index()
+        try:
+            # compute pre and post 7-day returns
+            pre_start = event_date - timedelta(days=10)
+            pre_end = event_date - timedelta(days=1)
+            post_start = event_date + timedelta(days=1)
+            post_end = event_date + timedelta(days=10)
+            pre = df.loc[(df.index.date >= pre_start) & (df.index.date <= pre_end)]["Close"]
+            post = df.loc[(df.index.date >= post_start) & (df.index.date <= post_end)]["Close"]
+            pre7 = float((pre.iloc[-1] / pre.iloc[0]) - 1) if len(pre) >= 2 else None
+            post7 = float((post.iloc[-1] / post.iloc[0]) - 1) if len(post) >= 2 else None
+            return {"last_earnings_date": event_date.isoformat(), "pre7_return": pre7, "post7_return": post7}
+        except Exception:
+            return {"last_earnings_date": event_date.isoformat(), "pre7_return": None, "post7_return": None}
+
+    # Last earnings date from the ticker's earnings calendar (None when Yahoo has none)
+    def _last_earnings_date(self, ticker_obj):
+        symbol = self._safe_get(ticker_obj, "ticker")
+        cached = _YF_CACHE.get("earnings_dates", symbol) if symbol else None
+        if cached is not None:
+            return cached[0]
+        failed = False
+        # attempt to fetch last earnings calendar
         try:
             cal = ticker_obj.calendar
             # calendar may have nextEarningsDate etc; fallback to earnings_dates from history if available
             earnings = ticker_obj.get_earnings_dates(limit=5) if hasattr(ticker_obj, "get_earnings_dates") else None
         except Exception:
             earnings = None
+            failed = True
         # fallback: attempt to read earnings from history property
         if earnings is None:
             try:
@@ -193,6 +233,7 @@ class YahooFinanceAgent:
                 earnings = eht
             except Exception:
                 earnings = None
+                failed = True
         # convert to list of datetimes if possible
         event = None
         if isinstance(earnings, (list, tuple)) and len(earnings) > 0:
@@ -214,24 +255,12 @@ class YahooFinanceAgent:
                     event = cal.loc["Earnings Date"].values[0]
             except Exception:
                 event = None
-        # compute returns if we have event and prices
-        if event is None:
-            return {"last_earnings_date": None, "pre7_return": None, "post7_return": None}
-        event_date = pd.to_datetime(event).date()
-        df = price_df.copy().set_index("date").sort_index()
-        try:
-            # compute pre and post 7-day returns
-            pre_start = event_date - timedelta(days=10)
-            pre_end = event_date - timedelta(days=1)
-            post_start = event_date + timedelta(days=1)
-            post_end = event_date + timedelta(days=10)
-            pre = df.loc[(df.index.date >= pre_start) & (df.index.date <= pre_end)]["Close"]
-            post = df.loc[(df.index.date >= post_start) & (df.index.date <= post_end)]["Close"]
-            pre7 = float((pre.iloc[-1] / pre.iloc[0]) - 1) if len(pre) >= 2 else None
-            post7 = float((post.iloc[-1] / post.iloc[0]) - 1) if len(post) >= 2 else None
-            return {"last_earnings_date": event_date.isoformat(), "pre7_return": pre7, "post7_return": post7}
-        except Exception:
-            return {"last_earnings_date": event_date.isoformat(), "pre7_return": None, "post7_return": None}
+                failed = True
+        if symbol and not failed:
+            # a missing date is cached too when Yahoo answered without one, so tickers without
+            # earnings aren't asked again every run; failed lookups are retried on the next call
+            _YF_CACHE.set("earnings_dates", symbol, [event])
+        return event
 
     # Score and confidence calculation
     def _score_and_confidence(self, indicators, fundamentals, earnings_event):
@@ -315,21 +344,69 @@ class YahooFinanceAgent:
         try:
             prices = self._fetch_price_history(symbol, period_days)
         except Exception as e:
-            return {
-                "symbol": symbol,
-                "rating": 3,
-                "confidence": 0.12,
-                #"timestamp": datetime.utcnow().isoformat() + "Z",
-                "timestamp": start_ts.isoformat() + "Z",
-                "source": self.SOURCE,
-                "context": {"error": f"price_fetch_failed: {str(e)}"}
-            }
+            return self._error_payload(symbol, start_ts, f"price_fetch_failed: {str(e)}")
 
         # Gather data
         ticker = self._fetch_ticker(symbol)
         indicators = self._compute_indicators(prices)
         fundamentals = self._fetch_fundamentals(ticker)
         earnings_event = self._earnings_event_returns(ticker, prices)
+        return self._payload(symbol, start_ts, indicators, fundamentals, earnings_event)
+
+    # Streaming indicators for intraday re-scoring, seeded once from the price history;
+    # feed prices with stream.update(price) and persist with stream.to_dict()
+    def start_stream(self, symbol, period_days=365):
+        dates, close_vals = self._close_and_dates(self._fetch_price_history(symbol, period_days))
+        return StreamingIndicators.from_history(close_vals, dates, wilder_rsi=RSIIndicator is not None)
+
+    # Re-score from a stream's current indicators: (rating, confidence, evidence)
+    def score_stream(self, stream, fundamentals=None, earnings_event=None):
+        return self._score_and_confidence(stream.indicators(), fundamentals or {}, earnings_event or {})
+
+    def analyze_many(self, symbols, period_days=365, include_fundamentals=False):
+        """
+        Analyze many symbols from one batched price download, with the indicators
+        computed column-wise over a dates x symbols matrix. Returns {symbol: payload}
+        with the same payload as analyze(). Ratings use price data only unless
+        include_fundamentals is set, which adds one fundamentals and earnings lookup
+        per symbol (as analyze() does).
+        """
+        start_ts = datetime.now()
+        symbols = list(dict.fromkeys(symbols))
+        try:
+            dates, close = self._fetch_close_matrix(symbols, period_days)
+        except Exception as e:
+            return {s: self._error_payload(s, start_ts, f"price_fetch_failed: {str(e)}") for s in symbols}
+
+        indicators = self._compute_indicators_many(dates, close)
+        results = {}
+        for j, symbol in enumerate(symbols):
+            if indicators[j] is None:
+                results[symbol] = self._error_payload(symbol, start_ts, f"price_fetch_failed: No price data fetched for {symbol}")
+                continue
+            fundamentals, earnings_event = {}, {}
+            if include_fundamentals:
+                ticker = self._fetch_ticker(symbol)
+                fundamentals = self._fetch_fundamentals(ticker)
+                prices = pd.DataFrame({"date": dates, "Close": close[:, j]}).dropna()
+                earnings_event = self._earnings_event_returns(ticker, prices)
+            results[symbol] = self._payload(symbol, start_ts, indicators[j], fundamentals, earnings_event)
+        return results
+
+    # Payload when no prices could be fetched
+    def _error_payload(self, symbol, start_ts, error):
+        return {
+            "symbol": symbol,
+            "rating": 3,
+            "confidence": 0.12,
+            #"timestamp": datetime.utcnow().isoformat() + "Z",
+            "timestamp": start_ts.isoformat() + "Z",
+            "source": self.SOURCE,
+            "context": {"error": error}
+        }
+
+    # Score the gathered data and build the payload
+    def _payload(self, symbol, start_ts, indicators, fundamentals, earnings_event):
         rating, confidence, evidence = self._score_and_confidence(indicators, fundamentals, earnings_event)
 
         # Create rationale
@@ -364,8 +441,11 @@ class YahooFinanceAgent:
 
 # run Yahoo Finance Analysis as an Agent
 def run_yahoo_finance_agent(inputs: dict) -> dict:
-    symbol = inputs.get("ticker")
     agent = YahooFinanceAgent()
+    # a list of tickers is analyzed in one batch ({symbol: payload})
+    if inputs.get("tickers"):
+        return agent.analyze_many(inputs["tickers"], include_fundamentals=inputs.get("fundamentals", False))
+    symbol = inputs.get("ticker")
     result = agent.analyze(symbol)
     return result
 
@@ -0,0 +1,228 @@
+"""
+bulk_store.py - Random access by CIK into SEC's nightly companyfacts.zip / submissions.zip
+
+Ingest once from src/ (reads only the zip central directory, nothing is extracted):
+    python -m researchers.tools.bulk_store ~/Downloads/companyfacts.zip ~/Downloads/submissions.zip
+"""
+
+import argparse
+import io
+import json
+import os
+import re
+import struct
+import threading
+import time
+import zipfile
+import zlib
+from datetime import timedelta
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+# Bulk archive members are named CIK##########.json (submissions also has CIK##########-submissions-NNN.json pages)
+_MEMBER_NAME = re.compile(r"^CIK(\d{10})\.json$")
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_LOCAL_HEADER_SIGNATURE = 0x04034B50
+KINDS = ("companyfacts", "submissions")
+
+
+class _MemberReader(io.RawIOBase):
+    """Streams one stored or deflated member straight from the archive file, checking its CRC at the end."""
+
+    def __init__(self, f: BinaryIO, compress_size: int, method: int, crc: int):
+        self._f = f
+        self._left = compress_size
+        self._inflate = zlib.decompressobj(-zlib.MAX_WBITS) if method == zipfile.ZIP_DEFLATED else None
+        self._expected_crc = crc
+        self._crc = 0
+        self._buffer = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer and self._left:
+            raw = self._f.read(min(self._left, 256 * 1024))
+            if not raw:
+                raise ValueError("Bulk archive member is truncated")
+            self._left -= len(raw)
+            data = self._inflate.decompress(raw) if self._inflate else raw
+            if self._inflate and not self._left:
+                data += self._inflate.flush()
+            self._crc = zlib.crc32(data, self._crc)
+            if not self._left and self._crc != self._expected_crc:
+                raise ValueError("Bulk archive member failed its CRC check")
+            self._buffer = data
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+
+class BulkArchive:
+    """
+    CIK -> member location inside one SEC bulk zip. The index is built from the
+    central directory alone and saved next to the store, so later processes open a
+    company's JSON with one seek instead of re-reading the (~20k entry) directory.
+    The archive stays where it was downloaded; the index records its size and
+    modification time and is rebuilt if the file changes. built_at is when SEC
+    built the archive (its newest member's timestamp), which dates the data.
+    """
+
+    def __init__(self, kind: str, archive: Path, entries: Dict[str, list], size: int, mtime: float,
+                 built_at: Optional[float] = None):
+        self.kind = kind
+        self.archive = Path(archive)
+        self.entries = entries  # cik -> [header_offset, compress_size, method, crc]
+        self.size = size
+        self.mtime = mtime
+        self.built_at = built_at or mtime
+
+    def __contains__(self, cik: str) -> bool:
+        return cik.zfill(10) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def build(cls, kind: str, archive: Path) -> "BulkArchive":
+        archive = Path(archive).resolve()
+        entries = {}
+        newest = None
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                m = _MEMBER_NAME.match(info.filename)
+                if not m:
+                    continue
+                if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                    raise ValueError(f"Unsupported compression {info.compress_type} for {info.filename}")
+                entries[m.group(1)] = [info.header_offset, info.compress_size, info.compress_type, info.CRC]
+                newest = max(newest or info.date_time, info.date_time)
+        stat = archive.stat()
+        # Member timestamps are local time without a zone; the file's mtime bounds them from above
+        built_at = min(time.mktime(newest + (0, 0, -1)), stat.st_mtime) if newest else stat.st_mtime
+        return cls(kind, archive, entries, stat.st_size, stat.st_mtime, built_at)
+
+    def age(self) -> timedelta:
+        return timedelta(seconds=time.time() - self.built_at)
+
+    def is_current(self) -> bool:
+        try:
+            stat = self.archive.stat()
+        except OSError:
+            return False
+        return stat.st_size == self.size and stat.st_mtime == self.mtime
+
+    def open(self, cik: str) -> Optional[BinaryIO]:
+        """Binary stream over the decompressed JSON of one CIK, or None if the archive has no such member."""
+        entry = self.entries.get(cik.zfill(10))
+        if entry is None:
+            return None
+        header_offset, compress_size, method, crc = entry
+        f = open(self.archive, "rb")
+        try:
+            f.seek(header_offset)
+            header = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+            if header[0] != _LOCAL_HEADER_SIGNATURE:
+                raise ValueError(f"Bad local header for CIK {cik} in {self.archive}")
+            # Skip the member's file name and extra field
+            f.seek(header[9] + header[10], os.SEEK_CUR)
+        except Exception:
+            f.close()
+            raise
+        return io.BufferedReader(_MemberReader(f, compress_size, method, crc), 1024 * 1024)
+
+    # === Persistence ===
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"kind": self.kind, "archive": str(self.archive), "size": self.size,
+                       "mtime": self.mtime, "built_at": self.built_at, "entries": self.entries}, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "BulkArchive":
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["kind"], Path(data["archive"]), data["entries"], data["size"], data["mtime"],
+                   data.get("built_at"))
+
+
+class BulkStore:
+    """The ingested archives of a store directory, one BulkArchive per kind."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.archives: Dict[str, BulkArchive] = {}
+        for kind in KINDS:
+            path = self._index_path(kind)
+            if not path.exists():
+                continue
+            try:
+                archive = BulkArchive.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[Warning] Ignoring unreadable bulk index {path}: {e}")
+                continue
+            if not archive.is_current():
+                # The archive was re-downloaded (or moved); re-read its central directory
+                try:
+                    archive = BulkArchive.build(kind, archive.archive)
+                    archive.save(path)
+                except (OSError, ValueError, zipfile.BadZipFile) as e:
+                    print(f"[Warning] Bulk {kind} archive {archive.archive} is unavailable: {e}")
+                    continue
+            self.archives[kind] = archive
+
+    def _index_path(self, kind: str) -> Path:
+        return self.directory / f"{kind}.index.json"
+
+    def ingest(self, archive: Path, kind: Optional[str] = None) -> BulkArchive:
+        kind = kind or guess_kind(archive)
+        bulk = BulkArchive.build(kind, archive)
+        bulk.save(self._index_path(kind))
+        self.archives[kind] = bulk
+        return bulk
+
+    def open(self, kind: str, cik: str, max_age: Optional[timedelta] = None) -> Optional[BinaryIO]:
+        """The CIK's JSON from the kind's archive; None if it isn't there or the archive is older than max_age."""
+        archive = self.archives.get(kind)
+        if archive is None or (max_age is not None and archive.age() > max_age):
+            return None
+        return archive.open(cik)
+
+    def has(self, kind: str, cik: str) -> bool:
+        archive = self.archives.get(kind)
+        return archive is not None and cik in archive
+
+
+def guess_kind(archive: Path) -> str:
+    name = Path(archive).name.lower()
+    for kind in KINDS:
+        if kind in name:
+            return kind
+    raise ValueError(f"Cannot tell whether {archive} is companyfacts or submissions; pass the kind explicitly")
+
+
+if __name__ == "__main__":
+    try:
+        from tools.sec_tools import BULK_STORE_DIR
+    except ImportError:
+        from researchers.tools.sec_tools import BULK_STORE_DIR
+
+    parser = argparse.ArgumentParser(description="Index SEC bulk archives for offline use by the SEC tools.")
+    parser.add_argument("archives", nargs="+", help="companyfacts.zip and/or submissions.zip")
+    parser.add_argument("--kind", choices=KINDS, help="archive kind, if the file name does not say")
+    parser.add_argument("--store", default=str(BULK_STORE_DIR), help="store directory (default: %(default)s)")
+    args = parser.parse_args()
+
+    store = BulkStore(Path(args.store))
+    for path in args.archives:
+        bulk = store.ingest(Path(path), args.kind)
+        print(f"Indexed {len(bulk):,} companies from {bulk.archive} ({bulk.kind}, built {time.ctime(bulk.built_at)})")
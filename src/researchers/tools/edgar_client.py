@@ -0,0 +1,112 @@
+"""
+edgar_client.py - Pooled, rate-limited HTTP client for SEC EDGAR (fair-access policy)
+"""
+
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# SEC asks for at most 10 requests per second and a User-Agent naming the requester and a contact email
+SEC_MAX_RATE = 10.0
+DEFAULT_USER_AGENT = "Your Name (your.email@example.com)"
+RETRY_STATUSES = (429, 503)
+DEFAULT_TIMEOUT = (5, 30)  # (connect, read) seconds
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Each acquire() reserves the next free slot under the
+    lock and sleeps outside it, so concurrent callers are spaced rate per second in
+    arrival order. pause() holds every caller back, e.g. after a 429.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._blocked_until)
+            self._tokens = min(self.capacity, self._tokens + (start - self._updated) * self.rate)
+            self._updated = start
+            # A negative balance is a reservation in the future
+            self._tokens -= 1
+            wait = start - now + max(0.0, -self._tokens / self.rate)
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class EdgarClient:
+    """
+    One keep-alive session for every EDGAR request in the process, sharing a
+    TokenBucket across threads. 429 and 503 answers are retried with exponential
+    backoff (or the server's Retry-After), and the whole client pauses meanwhile.
+    get() has the requests.Session.get signature, so it can stand in for a session
+    (e.g. in SecHttpCache).
+    """
+
+    def __init__(self, user_agent: Optional[str] = None, rate: float = SEC_MAX_RATE, burst: float = 1.0,
+                 timeout=DEFAULT_TIMEOUT, max_retries: int = 5, backoff: float = 1.0, pool_size: int = 32):
+        self.user_agent = user_agent or os.getenv("SEC_USER_AGENT") or DEFAULT_USER_AGENT
+        if self.user_agent == DEFAULT_USER_AGENT:
+            print("[Warning] SEC_USER_AGENT is not set; SEC may block the placeholder User-Agent")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.limiter = TokenBucket(rate, burst)
+        self.stats = {"requests": 0, "retries": 0}
+        self._stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"User-Agent": self.user_agent, "Accept-Encoding": "gzip, deflate"})
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, timeout=None, **kwargs) -> requests.Response:
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            self._count("requests")
+            response = self.session.get(url, headers=headers, timeout=timeout or self.timeout, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+
+            delay = self._retry_after(response) or self.backoff * 2 ** attempt
+            response.close()
+            print(f"[Warning] SEC answered {response.status_code} for {url}, retrying in {delay:.1f}s")
+            self._count("retries")
+            self.limiter.pause(delay)
+            attempt += 1
+
+    @staticmethod
+    def _retry_after(response: requests.Response) -> Optional[float]:
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self.stats[stat] += 1
@@ -0,0 +1,177 @@
+"""
+edgar_index.py - Local mirror of the EDGAR full-index / daily-index files
+
+Build once from src/ (downloads each quarter's master.idx since --start-year):
+    python -m researchers.tools.edgar_index --start-year 2023
+Later updates only fetch the daily index files published since the last run.
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+EDGAR_ARCHIVES = "https://www.sec.gov/Archives/edgar"
+MIRROR_FORMS = ("10-K", "10-Q", "10-K/A", "10-Q/A")
+
+
+def _quarter(d: date) -> Tuple[int, int]:
+    return d.year, (d.month - 1) // 3 + 1
+
+
+def _quarters(start: Tuple[int, int], stop: Tuple[int, int]):
+    year, qtr = start
+    while (year, qtr) <= stop:
+        yield year, qtr
+        year, qtr = (year, qtr + 1) if qtr < 4 else (year + 1, 1)
+
+
+class FilingIndexMirror:
+    """
+    Filings of the mirrored form types, keyed by CIK and form type:
+    filings[cik][form] = [[accession, filed, company], ...], newest first.
+    Completed quarters come from full-index/<year>/QTR<n>/master.idx and are never
+    fetched again; the current quarter is filled in from the daily master files.
+    """
+
+    def __init__(self, path: Path, forms=MIRROR_FORMS, start_year: Optional[int] = None):
+        self.path = Path(path)
+        self.forms = tuple(forms)
+        self.start_year = start_year or date.today().year - 2
+        self.filings: Dict[str, Dict[str, list]] = {}
+        self.quarters_done: List[str] = []   # "2024Q3" once its full-index file is loaded
+        self.days_done: List[str] = []       # "20241015" daily files loaded for unfinished quarters
+        self.updated_at = 0.0
+
+    # === Lookups ===
+
+    def filings_for(self, cik: str, form: str) -> List[dict]:
+        rows = self.filings.get(str(int(cik)), {}).get(form, [])
+        return [{"accession": a, "filed": f, "company": c} for a, f, c in rows]
+
+    def latest(self, cik: str, form: str) -> Optional[dict]:
+        rows = self.filings.get(str(int(cik)), {}).get(form)
+        if not rows:
+            return None
+        accession, filed, company = rows[0]
+        return {"accession": accession, "filed": filed, "company": company}
+
+    def __len__(self):
+        return sum(len(rows) for forms in self.filings.values() for rows in forms.values())
+
+    # === Updating ===
+
+    def update(self, client, today: Optional[date] = None) -> int:
+        """
+        Fetch what is missing: full-index files of completed quarters not loaded yet,
+        then the current quarter's daily files not loaded yet. client needs a
+        requests-style get() (the EDGAR client). Returns the number of new filings.
+        """
+        today = today or date.today()
+        current = _quarter(today)
+        added = 0
+        for year, qtr in _quarters((self.start_year, 1), current):
+            key = f"{year}Q{qtr}"
+            if (year, qtr) < current:
+                if key in self.quarters_done:
+                    continue
+                added += self._load_index(client, f"{EDGAR_ARCHIVES}/full-index/{year}/QTR{qtr}/master.idx")
+                self.quarters_done.append(key)
+                # Daily files of a finished quarter are covered by its full index now
+                self.days_done = [d for d in self.days_done if _quarter(datetime.strptime(d, "%Y%m%d").date()) > (year, qtr)]
+            else:
+                added += self._load_daily(client, year, qtr)
+        self.updated_at = time.time()
+        return added
+
+    def _load_daily(self, client, year: int, qtr: int) -> int:
+        listing = client.get(f"{EDGAR_ARCHIVES}/daily-index/{year}/QTR{qtr}/index.json")
+        if listing.status_code == 404:
+            return 0  # nothing published yet this quarter
+        listing.raise_for_status()
+        names = [item["name"] for item in listing.json()["directory"]["item"]]
+        added = 0
+        for name in sorted(names):
+            if not (name.startswith("master.") and name.endswith(".idx")):
+                continue
+            day = name.split(".")[1]
+            if day in self.days_done:
+                continue
+            added += self._load_index(client, f"{EDGAR_ARCHIVES}/daily-index/{year}/QTR{qtr}/{name}")
+            self.days_done.append(day)
+        return added
+
+    def _load_index(self, client, url: str) -> int:
+        """Add the mirrored forms from one master index file (CIK|Company|Form|Date|Filename)."""
+        added = 0
+        touched = set()
+        with client.get(url, stream=True) as response:
+            response.raise_for_status()
+            in_body = False
+            for raw in response.iter_lines():
+                line = raw.decode("latin-1")
+                if not in_body:
+                    # Rows start after the dashed separator under the header
+                    in_body = line.startswith("---")
+                    continue
+                parts = line.split("|")
+                if len(parts) != 5 or parts[2] not in self.forms:
+                    continue
+                cik, company, form, filed, filename = parts
+                if len(filed) == 8:
+                    filed = f"{filed[:4]}-{filed[4:6]}-{filed[6:]}"
+                accession = filename.rsplit("/", 1)[-1].removesuffix(".txt")
+                rows = self.filings.setdefault(cik, {}).setdefault(form, [])
+                if any(row[0] == accession for row in rows):
+                    continue
+                rows.append([accession, filed, company])
+                touched.add((cik, form))
+                added += 1
+        for cik, form in touched:
+            self.filings[cik][form].sort(key=lambda row: (row[1], row[0]), reverse=True)
+        return added
+
+    # === Persistence ===
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"forms": self.forms, "start_year": self.start_year, "filings": self.filings,
+                       "quarters_done": self.quarters_done, "days_done": self.days_done,
+                       "updated_at": self.updated_at}, f)
+        os.replace(tmp, self.path)
+
+    @classmethod
+    def load(cls, path: Path) -> "FilingIndexMirror":
+        with open(path) as f:
+            data = json.load(f)
+        mirror = cls(path, data["forms"], data["start_year"])
+        mirror.filings = data["filings"]
+        mirror.quarters_done = data["quarters_done"]
+        mirror.days_done = data["days_done"]
+        mirror.updated_at = data["updated_at"]
+        return mirror
+
+
+if __name__ == "__main__":
+    try:
+        from tools.sec_tools import FILING_INDEX_PATH, edgar_client
+    except ImportError:
+        from researchers.tools.sec_tools import FILING_INDEX_PATH, edgar_client
+
+    parser = argparse.ArgumentParser(description="Build or update the local EDGAR filing index mirror.")
+    parser.add_argument("--start-year", type=int, help="first year to mirror (default: two years ago)")
+    parser.add_argument("--path", default=str(FILING_INDEX_PATH), help="mirror file (default: %(default)s)")
+    args = parser.parse_args()
+
+    path = Path(args.path)
+    mirror = FilingIndexMirror.load(path) if path.exists() else FilingIndexMirror(path, start_year=args.start_year)
+    if args.start_year and args.start_year < mirror.start_year:
+        mirror.start_year = args.start_year
+    added = mirror.update(edgar_client())
+    mirror.save()
+    print(f"Added {added:,} filings; {len(mirror):,} {'/'.join(mirror.forms)} filings of {len(mirror.filings):,} companies mirrored")
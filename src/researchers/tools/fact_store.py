@@ -0,0 +1,337 @@
+"""
+fact_store.py - Columnar XBRL fact table backed by NumPy arrays
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Column name -> dtype. Strings are dictionary-encoded into the *_id columns
+COLUMNS = {
+    "concept_id": np.int32,
+    "unit_id": np.int16,
+    "start": "datetime64[D]",  # NaT for instant (balance sheet) facts
+    "end": "datetime64[D]",
+    "value": np.float64,
+    "accn_id": np.int32,
+    "form_id": np.int16,
+    "filed": "datetime64[D]",
+}
+
+PERIODIC_FORMS = ("10-Q", "10-K")
+_SWAP_LOCK = threading.Lock()
+
+
+class FactTable:
+    """
+    XBRL facts as parallel NumPy columns (one row per fact) plus the dictionaries
+    that decode concept, unit, accession and form ids. Rows keep the order of the
+    companyfacts document. Tables loaded with mmap=True share pages across processes.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], concepts: List[str], units: List[str],
+                 accns: List[str], forms: List[str]):
+        self.columns = columns
+        self.concepts = concepts
+        self.units = units
+        self.accns = accns
+        self.forms = forms
+        self.meta = {}
+        self._concepts_lower = None
+
+    def __len__(self):
+        return len(self.columns["value"])
+
+    # Column shortcuts
+    @property
+    def concept_id(self): return self.columns["concept_id"]
+    @property
+    def unit_id(self): return self.columns["unit_id"]
+    @property
+    def start(self): return self.columns["start"]
+    @property
+    def end(self): return self.columns["end"]
+    @property
+    def value(self): return self.columns["value"]
+    @property
+    def accn_id(self): return self.columns["accn_id"]
+    @property
+    def form_id(self): return self.columns["form_id"]
+    @property
+    def filed(self): return self.columns["filed"]
+
+    # === Construction ===
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "FactTable":
+        """Build from get_recent_facts-style dicts (concept, unit, value, end_date, form, accn)."""
+        builder = _FactTableBuilder()
+        for r in records:
+            builder.add(r["concept"], r["unit"], r.get("value"), r.get("start_date"), r.get("end_date"),
+                        r.get("accn"), r.get("form"), r.get("filed"))
+        return builder.build()
+
+    @classmethod
+    def from_companyfacts(cls, concepts) -> "FactTable":
+        """Build from (concept_name, concept) pairs under companyfacts facts.us-gaap."""
+        builder = _FactTableBuilder()
+        for concept_name, concept in concepts:
+            for unit_name, unit_facts in (concept.get("units") or {}).items():
+                for fact in unit_facts:
+                    builder.add(concept_name, unit_name, fact.get("val"), fact.get("start"), fact.get("end"),
+                                fact.get("accn"), fact.get("form"), fact.get("filed"))
+        return builder.build()
+
+    # === Selection ===
+
+    def take(self, rows) -> "FactTable":
+        """Subset by boolean mask or index array; dictionaries are shared."""
+        return FactTable({name: col[rows] for name, col in self.columns.items()},
+                         self.concepts, self.units, self.accns, self.forms)
+
+    def concept_ids(self, predicate: Callable[[str], bool]) -> np.ndarray:
+        """Ids of concepts whose lower-cased name satisfies predicate (evaluated on the dictionary only)."""
+        if self._concepts_lower is None:
+            self._concepts_lower = [c.lower() for c in self.concepts]
+        return np.array([i for i, name in enumerate(self._concepts_lower) if predicate(name)], dtype=np.int32)
+
+    def concept_mask(self, predicate: Callable[[str], bool]) -> np.ndarray:
+        return np.isin(self.concept_id, self.concept_ids(predicate))
+
+    def latest_filing(self) -> "FactTable":
+        """
+        Facts of the most recently filed 10-Q or 10-K. Ties on the filed date go
+        to the accession that appears first, matching get_recent_facts.
+        """
+        form_ids = [i for i, f in enumerate(self.forms) if f in PERIODIC_FORMS]
+        eligible = np.flatnonzero(np.isin(self.form_id, form_ids) & ~np.isnat(self.filed))
+        if len(eligible) == 0:
+            return self.take(np.zeros(len(self), dtype=bool))
+        filed = self.filed[eligible]
+        first_latest = eligible[np.argmax(filed == filed.max())]
+        return self.take(self.accn_id == self.accn_id[first_latest])
+
+    def to_records(self) -> List[dict]:
+        """Back to get_recent_facts-style dicts."""
+        return [
+            {
+                "concept": self.concepts[c],
+                "unit": self.units[u],
+                "value": float(v),
+                "end_date": None if np.isnat(e) else str(e),
+                "form": self.forms[f],
+                "accn": self.accns[a],
+            }
+            for c, u, e, v, a, f in zip(self.concept_id, self.unit_id, self.end, self.value, self.accn_id, self.form_id)
+        ]
+
+    # === Persistence ===
+
+    def save(self, directory: Path, **extra_meta):
+        """
+        Write one .npy file per column plus meta.json with the dictionaries.
+        The directory is written under a temporary name and swapped in at the end.
+        """
+        directory = Path(directory)
+        tmp = directory.with_name(f"{directory.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for name, col in self.columns.items():
+            np.save(tmp / f"{name}.npy", np.ascontiguousarray(col))
+        meta = {"concepts": self.concepts, "units": self.units, "accns": self.accns,
+                "forms": self.forms, "rows": len(self), "built_at": time.time(), **extra_meta}
+        with open(tmp / "meta.json", "w") as f:
+            json.dump(meta, f)
+        # Threads may save the same table at once; the remove-and-rename swap must not interleave
+        with _SWAP_LOCK:
+            shutil.rmtree(directory, ignore_errors=True)
+            os.replace(tmp, directory)
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "FactTable":
+        directory = Path(directory)
+        with open(directory / "meta.json") as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        columns = {name: np.load(directory / f"{name}.npy", mmap_mode=mode) for name in COLUMNS}
+        table = cls(columns, meta["concepts"], meta["units"], meta["accns"], meta["forms"])
+        table.meta = meta
+        return table
+
+
+def as_fact_table(facts) -> FactTable:
+    """Accept either a FactTable or a list of get_recent_facts dicts."""
+    if isinstance(facts, FactTable):
+        return facts
+    return FactTable.from_records(facts)
+
+
+class FactGroup:
+    """Rows of a FactIndex lookup, with their end-date range precomputed."""
+
+    def __init__(self, label: str, rows: np.ndarray, end: np.ndarray, value: np.ndarray,
+                 latest_end=None, earliest_end=None):
+        self.label = label
+        self.rows = rows
+        self.end = end
+        self.value = value
+        self._latest_end = latest_end
+        self._earliest_end = earliest_end
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def latest_end(self):
+        if self._latest_end is None:
+            raise ValueError(f"No facts found for {self.label}")
+        return self._latest_end
+
+    @property
+    def earliest_end(self):
+        if self._earliest_end is None:
+            raise ValueError(f"No facts found for {self.label}")
+        return self._earliest_end
+
+    def values_at(self, end) -> np.ndarray:
+        return self.value[self.end == end]
+
+    def sum_at(self, end) -> float:
+        return float(self.values_at(end).sum())
+
+
+class FactIndex:
+    """
+    Groups a filing's facts by lower-cased concept name in one pass, with the latest
+    and earliest end date of every concept precomputed. Exact, prefix and substring
+    lookups resolve against the concept dictionary and are memoized, so each ratio
+    reads only the rows of the concepts it uses instead of rescanning every fact.
+    """
+
+    def __init__(self, facts):
+        table = as_fact_table(facts)
+        self.table = table
+        n = len(table)
+        self._groups: Dict[str, tuple] = {}
+        self._lookups: Dict[tuple, FactGroup] = {}
+        if n == 0:
+            return
+
+        # Sort rows by concept once; each concept becomes a contiguous slice of `order`
+        order = np.argsort(table.concept_id, kind="stable")
+        sorted_ids = table.concept_id[order]
+        starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+        stops = np.r_[starts[1:], n]
+
+        # Per-concept latest/earliest end; NaT is skipped by pushing it past the other extreme
+        end_days = table.end[order].view(np.int64)
+        missing = np.isnat(table.end[order])
+        nat = np.iinfo(np.int64).min
+        latest = np.maximum.reduceat(np.where(missing, nat, end_days), starts)
+        earliest = np.minimum.reduceat(np.where(missing, np.iinfo(np.int64).max, end_days), starts)
+
+        for start, stop, cid, hi, lo in zip(starts, stops, sorted_ids[starts], latest, earliest):
+            name = table.concepts[cid].lower()
+            rows = order[start:stop]
+            hi = None if hi == nat else np.int64(hi).view("datetime64[D]")
+            lo = None if hi is None else np.int64(lo).view("datetime64[D]")
+            if name in self._groups:
+                # Concepts that differ only by case share a group
+                prev_rows, prev_hi, prev_lo = self._groups[name]
+                rows = np.sort(np.r_[prev_rows, rows])
+                hi = max((d for d in (hi, prev_hi) if d is not None), default=None)
+                lo = min((d for d in (lo, prev_lo) if d is not None), default=None)
+            self._groups[name] = (rows, hi, lo)
+
+    # === Lookups ===
+
+    def concept(self, name: str) -> FactGroup:
+        """Facts of one concept (case-insensitive exact match)."""
+        return self._lookup("concept", name.lower(), lambda concept: concept == name.lower())
+
+    def prefix(self, prefix: str) -> FactGroup:
+        """Facts of every concept whose name starts with prefix (case-insensitive)."""
+        return self._lookup("prefix", prefix.lower(), lambda concept: concept.startswith(prefix.lower()))
+
+    def contains(self, substring: str) -> FactGroup:
+        """Facts of every concept whose name contains substring (case-insensitive)."""
+        return self._lookup("contains", substring.lower(), lambda concept: substring.lower() in concept)
+
+    def _lookup(self, kind: str, key: str, predicate: Callable[[str], bool]) -> FactGroup:
+        cached = self._lookups.get((kind, key))
+        if cached is not None:
+            return cached
+
+        matches = [group for name, group in self._groups.items() if predicate(name)]
+        if len(matches) == 1:
+            rows = matches[0][0]
+        elif matches:
+            rows = np.sort(np.concatenate([group[0] for group in matches]))
+        else:
+            rows = np.empty(0, dtype=np.intp)
+        latest = max((group[1] for group in matches if group[1] is not None), default=None)
+        earliest = min((group[2] for group in matches if group[2] is not None), default=None)
+
+        group = FactGroup(f"{kind} '{key}'", rows, self.table.end[rows], self.table.value[rows], latest, earliest)
+        self._lookups[(kind, key)] = group
+        return group
+
+
+def as_fact_index(facts) -> FactIndex:
+    """Accept a FactIndex, a FactTable or a list of get_recent_facts dicts."""
+    if isinstance(facts, FactIndex):
+        return facts
+    return FactIndex(facts)
+
+
+# Accumulates rows straight into typed NumPy buffers (grown by doubling, one column at a time) with
+# dictionary encoding, so a cold build peaks near the size of the final columns
+class _FactTableBuilder:
+    def __init__(self, capacity: int = 4096):
+        self._dicts = {"concept": {}, "unit": {}, "accn": {}, "form": {}}
+        self._columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._size = 0
+
+    def _intern(self, kind: str, value: Optional[str]) -> int:
+        d = self._dicts[kind]
+        key = value if value is not None else ""
+        idx = d.get(key)
+        if idx is None:
+            idx = d[key] = len(d)
+        return idx
+
+    def _grow(self):
+        for name, column in self._columns.items():
+            grown = np.empty(2 * len(column), dtype=column.dtype)
+            grown[:len(column)] = column
+            self._columns[name] = grown
+
+    def add(self, concept, unit, value, start, end, accn, form, filed):
+        i = self._size
+        if i == len(self._columns["value"]):
+            self._grow()
+        columns = self._columns
+        columns["concept_id"][i] = self._intern("concept", concept)
+        columns["unit_id"][i] = self._intern("unit", unit)
+        columns["start"][i] = start or "NaT"
+        columns["end"][i] = end or "NaT"
+        columns["value"][i] = np.nan if value is None else value
+        columns["accn_id"][i] = self._intern("accn", accn)
+        columns["form_id"][i] = self._intern("form", form)
+        columns["filed"][i] = filed or "NaT"
+        self._size = i + 1
+
+    def build(self) -> FactTable:
+        # Trim one column at a time so the spare capacity is released as we go
+        columns = self._columns
+        for name in COLUMNS:
+            columns[name] = columns[name][:self._size].copy()
+        self._columns = {}
+        concepts, units, accns, forms = (list(self._dicts[k]) for k in ("concept", "unit", "accn", "form"))
+        return FactTable(columns, concepts, units, accns, forms)
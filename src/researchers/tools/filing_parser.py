@@ -0,0 +1,99 @@
+"""
+filing_parser.py - Process pool for the CPU-bound filing work (HTML to text, item search, paragraph diffs)
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable
+
+from bs4 import BeautifulSoup
+
+try:
+    from tools.filing_text import SectionIndex, build_section_index, stream_section_index
+except ImportError:
+    from researchers.tools.filing_text import SectionIndex, build_section_index, stream_section_index
+
+# Worker processes for filing parsing (SEC_PARSE_WORKERS overrides). The default 0 parses in the
+# calling thread, which can stop reading a 10-K at Item 8; a pool ships whole documents to the
+# workers and pays off only when many flows parse at once (min(4, os.cpu_count()) is a good size)
+DEFAULT_PARSE_WORKERS = 0
+PARSE_CHUNK_CHARS = 256 * 1024
+
+
+# === Work done in the worker processes (module level, so it pickles by reference) ===
+
+def index_html_document(html: str, stop_item: str = "8") -> SectionIndex:
+    """Section index of a primary 10-K document; conversion stops once stop_item's heading is found."""
+    chunks = (html[i:i + PARSE_CHUNK_CHARS] for i in range(0, len(html), PARSE_CHUNK_CHARS))
+    index, _ = stream_section_index(chunks, stop_item)
+    return index
+
+
+def index_full_submission(txt: str) -> SectionIndex:
+    """Section index of a full submission text file (every document and exhibit concatenated)."""
+    soup = BeautifulSoup(txt, "html.parser")
+    return build_section_index(soup.get_text(separator=' ', strip=True))
+
+
+class FilingParser:
+    """
+    Runs parsing functions in a pool of worker processes, so a thread parsing a
+    large filing waits on a future (without holding the GIL) while other threads
+    keep their network calls going. The pool uses the spawn start method, which is
+    safe in a process that already runs threads, and is created on first use. If a
+    worker dies the pool is dropped, the call is retried in the calling thread, and
+    the next call starts a fresh pool.
+    """
+
+    def __init__(self, workers: int = DEFAULT_PARSE_WORKERS):
+        self.workers = max(0, workers)
+        self.stats = {"submitted": 0, "inline": 0, "pool_failures": 0}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        pool = self._get_pool()
+        if pool is None:
+            future = Future()
+            self._count("inline")
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self._count("submitted")
+        return pool.submit(fn, *args)
+
+    def run(self, fn: Callable, *args):
+        """Submit fn(*args) and wait for its result."""
+        try:
+            return self.submit(fn, *args).result()
+        except BrokenProcessPool as e:
+            print(f"[Warning] Filing parser pool failed ({e}), parsing in this thread")
+            self._count("pool_failures")
+            self._discard_pool()
+            self._count("inline")
+            return fn(*args)
+
+    def shutdown(self):
+        self._discard_pool()
+
+    def _get_pool(self):
+        if not self.workers:
+            return None
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _discard_pool(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
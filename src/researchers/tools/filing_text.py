@@ -0,0 +1,341 @@
+"""
+filing_text.py - Incremental HTML-to-text conversion and 10-K section extraction
+"""
+
+import difflib
+import html
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Markup whose content is never visible text (ix:header holds the hidden inline XBRL contexts)
+_SKIP_OPEN = re.compile(r"<(script|style|ix:header|head)\b", re.IGNORECASE)
+_TAG = re.compile(r"<!--.*?-->|<![^>]*>|<\?[^>]*\?>|</?[a-zA-Z][^>]*>", re.DOTALL)
+# Block-level tags end a paragraph; everything else is inline
+_BLOCK_BREAK = re.compile(r"<(?:/?(?:p|div|li|tr|table|h[1-6]|ul|ol|section|blockquote)|br)\b[^>]*>", re.IGNORECASE)
+_INLINE_SPACE = re.compile(r"[^\S\n]+")
+_LINE_BREAK = re.compile(r"\s*\n\s*")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z])")
+
+# 10-K items in document order, with the first words of each item's title
+ITEM_TITLES = {
+    "1": "business",
+    "1A": "risk factors",
+    "1B": "unresolved staff",
+    "1C": "cybersecurity",
+    "2": "properties",
+    "3": "legal proceedings",
+    "4": "mine safety",
+    "5": "market for",
+    "6": "selected financial",
+    "7": "management",
+    "7A": "quantitative and",
+    "8": "financial statements",
+    "9": "changes in and",
+    "9A": "controls and",
+    "9B": "other information",
+    "9C": "disclosure regarding",
+    "10": "directors",
+    "11": "executive compensation",
+    "12": "security ownership",
+    "13": "certain relationships",
+    "14": "principal account",
+    "15": "exhibits",
+    "16": "form 10-k summary",
+}
+ITEM_RANK = {item: rank for rank, item in enumerate(ITEM_TITLES)}
+
+# One pattern for every item heading; candidates are then filtered in _heading_candidates
+_ITEM_HEADING = re.compile(r"\bitem\s*(1[0-6]|[1-9][a-c]?)\b", re.IGNORECASE)
+_HEADING_PUNCT = re.compile(r"\s*[.:\u2013\u2014-]")
+# Words right before "Item N" that mark a cross-reference rather than a heading
+_XREF_BEFORE = re.compile(r"(?:\bsee|\bin|\bunder|\band|\bof|\bto|\bwithin|\balso|,|[\"\u201c\u2018'(])\s*$", re.IGNORECASE)
+_ITEM_8_HINT = re.compile(r"item\s*8", re.IGNORECASE)
+
+# A table of contents is a run of at least TOC_MIN_ENTRIES headings in item order, each close to the next
+TOC_MIN_ENTRIES = 5
+TOC_MAX_GAP = 600
+
+
+class HtmlTextStream:
+    """
+    Converts HTML to whitespace-normalized text chunk by chunk. Block-level tags
+    (p, div, li, br, ...) become line breaks, so each paragraph is one line; other
+    tags become single spaces. Entities are unescaped and script/style/head/ix:header
+    content is dropped. Markup cut off at a chunk boundary is held back until the
+    next feed(), and whitespace at the boundary is only emitted once the next text
+    arrives, so the output does not depend on how the input was chunked.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._gap = ""        # whitespace owed before the next text: "", " " or "\n"
+        self._started = False
+
+    def feed(self, chunk: str) -> str:
+        return self._convert(self._pending + chunk, final=False)
+
+    def close(self) -> str:
+        return self._convert(self._pending, final=True)
+
+    def _convert(self, data: str, final: bool) -> str:
+        self._pending = ""
+
+        # Drop invisible blocks; hold back one that has not closed yet
+        parts = []
+        pos = 0
+        while True:
+            m = _SKIP_OPEN.search(data, pos)
+            if not m:
+                break
+            close = re.search(rf"</{re.escape(m.group(1))}\s*>", data[m.end():], re.IGNORECASE)
+            if close is None:
+                if not final:
+                    self._pending = data[m.start():]
+                    data = data[:m.start()]
+                break
+            parts.append(data[pos:m.start()])
+            pos = m.end() + close.end()
+        parts.append(data[pos:])
+        data = " ".join(parts)
+
+        # Hold back a tag or entity that is cut off at the end of the chunk
+        if not final:
+            lt = data.rfind("<")
+            if lt != -1 and data.find(">", lt) == -1:
+                self._pending = data[lt:] + self._pending
+                data = data[:lt]
+            amp = data.rfind("&")
+            if amp != -1 and amp > len(data) - 12 and ";" not in data[amp:]:
+                self._pending = data[amp:] + self._pending
+                data = data[:amp]
+
+        text = html.unescape(_TAG.sub(" ", _BLOCK_BREAK.sub("\n", data)))
+        text = _LINE_BREAK.sub("\n", _INLINE_SPACE.sub(" ", text))
+
+        # Merge whitespace at the chunk edges with what the previous chunk left over
+        core = text.strip()
+        leading = text[:len(text) - len(text.lstrip())]
+        gap = self._gap
+        if leading:
+            gap = "\n" if "\n" in leading or gap == "\n" else " "
+        if not core:
+            self._gap = gap
+            return ""
+        out = (gap if self._started else "") + core
+        self._started = True
+        trailing = text[len(text.rstrip()):]
+        self._gap = ("\n" if "\n" in trailing else " ") if trailing else ""
+        return out
+
+
+class SectionIndex:
+    """
+    Offsets of the 10-K item headings in a document's text. Each section runs from
+    its heading to the next indexed heading. complete is False when the text was cut
+    off (e.g. streaming stopped at Item 8), in which case the last section is open.
+    """
+
+    def __init__(self, text: str, headings: Dict[str, int], toc_span: Optional[Tuple[int, int]] = None,
+                 complete: bool = True):
+        self.text = text
+        self.headings = dict(sorted(headings.items(), key=lambda kv: kv[1]))
+        self.toc_span = toc_span
+        self.complete = complete
+
+    def items(self) -> List[str]:
+        return list(self.headings)
+
+    def span(self, item: str) -> Optional[Tuple[int, int]]:
+        start = self.headings.get(item)
+        if start is None:
+            return None
+        end = next((pos for pos in self.headings.values() if pos > start), None)
+        if end is None:
+            if not self.complete:
+                return None
+            end = len(self.text)
+        return start, end
+
+    def section(self, item: str) -> Optional[str]:
+        span = self.span(item)
+        return self.text[span[0]:span[1]] if span else None
+
+    # Offsets only, so the text can be stored separately
+    def to_dict(self) -> dict:
+        return {"headings": self.headings, "toc_span": self.toc_span, "complete": self.complete}
+
+    @classmethod
+    def from_dict(cls, text: str, data: dict) -> "SectionIndex":
+        toc = tuple(data["toc_span"]) if data.get("toc_span") else None
+        return cls(text, data["headings"], toc, data.get("complete", True))
+
+
+# Every "Item N" occurrence that looks like a heading: (position, item)
+def _heading_candidates(text: str) -> List[Tuple[int, str]]:
+    candidates = []
+    for m in _ITEM_HEADING.finditer(text):
+        item = m.group(1).upper()
+        if item not in ITEM_RANK:
+            continue
+        if _XREF_BEFORE.search(text, max(0, m.start() - 12), m.start()):
+            continue
+        # A heading is followed by punctuation or by the item's title
+        after = text[m.end():m.end() + 40]
+        title = ITEM_TITLES[item]
+        if not (_HEADING_PUNCT.match(after) or after.lstrip(" \n.:-\u2013\u2014").lower().startswith(title)):
+            continue
+        candidates.append((m.start(), item))
+    return candidates
+
+
+# First run of TOC_MIN_ENTRIES+ headings in increasing item order with small gaps, starting at Item 1/1A
+def _find_toc(candidates: List[Tuple[int, str]]) -> Optional[Tuple[int, int]]:
+    run_start = 0
+    for i in range(1, len(candidates) + 1):
+        in_run = (
+            i < len(candidates)
+            and candidates[i][0] - candidates[i - 1][0] <= TOC_MAX_GAP
+            and ITEM_RANK[candidates[i][1]] > ITEM_RANK[candidates[i - 1][1]]
+        )
+        if in_run:
+            continue
+        run = candidates[run_start:i]
+        if len(run) >= TOC_MIN_ENTRIES and ITEM_RANK[run[0][1]] <= ITEM_RANK["1A"]:
+            return run[0][0], run[-1][0] + 1
+        run_start = i
+    return None
+
+
+def build_section_index(text: str, complete: bool = True) -> SectionIndex:
+    """
+    Index every item heading of a 10-K's text in one scan with a single pattern.
+
+    Candidates that read like cross-references are dropped, the table of contents is
+    detected and skipped, and among the remaining headings the chain in item order
+    covering the most text is kept (so stray "Item 7." references inside another
+    section lose to the real heading). Ties go to the earliest occurrence.
+    """
+    candidates = _heading_candidates(text)
+    toc = _find_toc(candidates)
+    if toc:
+        candidates = [c for c in candidates if c[0] >= toc[1]]
+
+    # Weight = text until the next candidate; pick the increasing-item chain with the largest total weight
+    n = len(candidates)
+    positions = [pos for pos, _ in candidates]
+    ranks = [ITEM_RANK[item] for _, item in candidates]
+    weights = [(positions[i + 1] if i + 1 < n else len(text)) - positions[i] for i in range(n)]
+    best = list(weights)
+    prev = [-1] * n
+    for i in range(n):
+        for j in range(i):
+            if ranks[j] < ranks[i] and best[j] + weights[i] > best[i]:
+                best[i] = best[j] + weights[i]
+                prev[i] = j
+
+    headings = {}
+    if n:
+        i = max(range(n), key=lambda k: (best[k], -k))
+        while i != -1:
+            headings[candidates[i][1]] = positions[i]
+            i = prev[i]
+    return SectionIndex(text, headings, toc, complete)
+
+
+def stream_section_index(chunks: Iterable[str], stop_item: str = "8") -> Tuple[SectionIndex, int]:
+    """
+    Feed HTML chunks through HtmlTextStream and build the section index, stopping as
+    soon as the stop_item heading is found after the table of contents. The index is
+    only rebuilt when the newest text mentions Item 8 (or the end is reached), so
+    the scan stays close to linear in the document size.
+    Returns (index, number of characters consumed).
+    """
+    converter = HtmlTextStream()
+    text_parts = []
+    consumed = 0
+    tail = ""
+    hint = _ITEM_8_HINT if stop_item == "8" else re.compile(rf"item\s*{re.escape(stop_item)}", re.IGNORECASE)
+    for chunk in chunks:
+        consumed += len(chunk)
+        piece = converter.feed(chunk)
+        text_parts.append(piece)
+        # Headings can straddle chunks, so check the new text together with a short tail
+        if hint.search(tail + piece):
+            index = build_section_index("".join(text_parts), complete=False)
+            # Done once the stop heading follows a real (non-TOC-sized) section
+            stop_pos = index.headings.get(stop_item)
+            earlier = [pos for pos in index.headings.values() if pos < (stop_pos or 0)]
+            if stop_pos is not None and earlier and stop_pos - max(earlier) > TOC_MAX_GAP:
+                return index, consumed
+        tail = (tail + piece)[-16:]
+
+    text_parts.append(converter.close())
+    return build_section_index("".join(text_parts)), consumed
+
+
+# === Paragraph diff between two versions of a section ===
+
+MIN_PARAGRAPH_CHARS = 40   # shorter lines are page numbers, running headers and similar
+CHANGED_SIMILARITY = 0.5   # word-level similarity above which a paragraph counts as an edit of an old one
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Paragraphs of section text (one per line); text without line breaks is split into sentences."""
+    lines = text.split("\n") if "\n" in text else _SENTENCE_END.split(text)
+    return [line.strip() for line in lines if len(line.strip()) >= MIN_PARAGRAPH_CHARS]
+
+
+def _paragraph_key(paragraph: str) -> str:
+    return " ".join(paragraph.lower().split())
+
+
+def diff_paragraphs(old_text: str, new_text: str) -> dict:
+    """
+    Compare two versions of a section paragraph by paragraph. Paragraphs found
+    verbatim (ignoring case and spacing) anywhere in the old text are unchanged, so
+    reordering is not a change. Each remaining new paragraph is matched to the most
+    similar unmatched old one: above CHANGED_SIMILARITY it is "changed", otherwise
+    "new". Old paragraphs left over are "removed".
+    Returns {"new", "changed": [{"text", "previous", "similarity"}], "removed", "unchanged"} (lists of
+    paragraphs) and "total", the number of paragraphs in the new text.
+    """
+    old = split_paragraphs(old_text)
+    new = split_paragraphs(new_text)
+    old_keys = {_paragraph_key(p): p for p in old}
+
+    unchanged, matched_old, candidates = [], set(), []
+    for paragraph in new:
+        key = _paragraph_key(paragraph)
+        if key in old_keys:
+            unchanged.append(paragraph)
+            matched_old.add(key)
+        else:
+            candidates.append((paragraph, key))
+    unmatched_old = [(key, key.split()) for key in old_keys if key not in matched_old]
+
+    added, changed = [], []
+    for paragraph, key in candidates:
+        matcher = difflib.SequenceMatcher(None, autojunk=False)
+        matcher.set_seq2(key.split())
+        best, best_ratio = None, 0.0
+        for i, (_, old_words) in enumerate(unmatched_old):
+            matcher.set_seq1(old_words)
+            # Cheap upper bounds first; the full ratio only for plausible matches
+            if matcher.real_quick_ratio() <= best_ratio or matcher.quick_ratio() <= best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio > best_ratio:
+                best, best_ratio = i, ratio
+        if best is not None and best_ratio >= CHANGED_SIMILARITY:
+            old_key, _ = unmatched_old.pop(best)
+            changed.append({"text": paragraph, "previous": old_keys[old_key], "similarity": round(best_ratio, 3)})
+        else:
+            added.append(paragraph)
+
+    return {
+        "new": added,
+        "changed": changed,
+        "removed": [old_keys[key] for key, _ in unmatched_old],
+        "unchanged": unchanged,
+        "total": len(new),
+    }
@@ -3,47 +3,51 @@ fred_tools.py - Core FRED analysis functionality
 """
 
 import os
+import threading
 from datetime import datetime, timedelta
 import pandas as pd
 from fredapi import Fred
 import openai
 from typing import Dict, Any, Optional
 
-def get_fred_data(ticker: str, api_key: Optional[str] = None) -> Dict[str, Any]:
+# Core economic indicators
+INDICATORS = {
+    'CPIAUCSL': 'Consumer Price Index',
+    'UNRATE': 'Unemployment Rate',
+    'FEDFUNDS': 'Federal Funds Rate',
+    'GDP': 'Gross Domestic Product',
+    'INDPRO': 'Industrial Production Index'
+}
+
+# Process-wide cache of fetched indicators keyed by (api key, day), shared by batch runs
+_ECONOMIC_DATA_CACHE: Dict[tuple, Dict[str, Any]] = {}
+_ECONOMIC_DATA_LOCK = threading.Lock()
+
+def fetch_economic_data(fred_key: str) -> Dict[str, Any]:
     """
-    Fetch and analyze economic indicators from FRED that might impact the given ticker.
+    Fetch the latest values of the core FRED indicators over the past year.
+    
+    Results are cached for the current day, and concurrent callers wait for a
+    single fetch instead of each hitting the FRED API.
     
     Args:
-        ticker (str): The stock symbol to analyze
-        api_key (str, optional): FRED API key. If not provided, will try to get from environment.
+        fred_key (str): FRED API key
         
     Returns:
-        dict: Analysis results with rating and context
+        dict: Indicator summaries keyed by FRED series id
     """
-    # Initialize FRED API
-    fred_key = api_key or os.getenv('FRED_API_KEY')
-    if not fred_key:
-        raise ValueError("FRED API key must be provided or set in FRED_API_KEY environment variable")
-        
-    fred = Fred(api_key=fred_key)
-    
-    # Core economic indicators
-    indicators = {
-        'CPIAUCSL': 'Consumer Price Index',
-        'UNRATE': 'Unemployment Rate',
-        'FEDFUNDS': 'Federal Funds Rate',
-        'GDP': 'Gross Domestic Product',
-        'INDPRO': 'Industrial Production Index'
-    }
-    
     end_date = datetime.now()
-    start_date = end_date - timedelta(days=365)
-    
-    economic_data = {}
-    
-    try:
+    cache_key = (fred_key, end_date.strftime('%Y-%m-%d'))
+    with _ECONOMIC_DATA_LOCK:
+        if cache_key in _ECONOMIC_DATA_CACHE:
+            return _ECONOMIC_DATA_CACHE[cache_key]
+        
+        fred = Fred(api_key=fred_key)
+        start_date = end_date - timedelta(days=365)
+        economic_data = {}
+        
         # Fetch economic indicators
-        for series_id, description in indicators.items():
+        for series_id, description in INDICATORS.items():
             series = fred.get_series(
                 series_id,
                 observation_start=start_date.strftime('%Y-%m-%d'),
@@ -63,6 +67,29 @@ def get_fred_data(ticker: str, api_key: Optional[str] = None) -> Dict[str, Any]:
                     'last_updated': series.index[-1].strftime('%Y-%m-%d')
                 }
         
+        _ECONOMIC_DATA_CACHE[cache_key] = economic_data
+        return economic_data
+
+def get_fred_data(ticker: str, api_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Fetch and analyze economic indicators from FRED that might impact the given ticker.
+    
+    Args:
+        ticker (str): The stock symbol to analyze
+        api_key (str, optional): FRED API key. If not provided, will try to get from environment.
+        
+    Returns:
+        dict: Analysis results with rating and context
+    """
+    # Initialize FRED API
+    fred_key = api_key or os.getenv('FRED_API_KEY')
+    if not fred_key:
+        raise ValueError("FRED API key must be provided or set in FRED_API_KEY environment variable")
+        
+    try:
+        # Macro indicators are identical for every ticker, so they are fetched once per day
+        economic_data = fetch_economic_data(fred_key)
+        
         # Generate analysis using OpenAI
         return analyze_economic_data(economic_data, ticker)
         
@@ -0,0 +1,186 @@
+"""
+fundamentals.py - Multi-period fundamental time series built from the XBRL fact table
+"""
+
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+try:
+    from tools.fact_store import as_fact_table
+except ImportError:
+    from researchers.tools.fact_store import as_fact_table
+
+# metric -> us-gaap concepts in priority order; for each period the first one reported wins
+METRIC_CONCEPTS = {
+    "revenue": [
+        "Revenues",
+        "RevenueFromContractWithCustomerExcludingAssessedTax",
+        "RevenueFromContractWithCustomerIncludingAssessedTax",
+        "SalesRevenueNet",
+    ],
+    "net_income": ["NetIncomeLoss"],
+    "long_term_debt_noncurrent": ["LongTermDebtNoncurrent"],
+    "long_term_debt_current": ["LongTermDebtCurrent"],
+    "short_term_borrowings": ["ShortTermBorrowings"],
+    "equity": ["StockholdersEquity"],
+}
+# Debt is the same three components calc_debt_to_equity adds up
+DEBT_COMPONENTS = ["long_term_debt_noncurrent", "long_term_debt_current", "short_term_borrowings"]
+
+FILING_FORMS = ("10-Q", "10-K", "10-Q/A", "10-K/A")
+QUARTER_DAYS = (80, 100)
+YEAR_DAYS = (350, 380)
+YEAR_AGO_TOLERANCE = pd.Timedelta(days=10)
+
+
+def fundamental_series(facts) -> Dict[str, pd.DataFrame]:
+    """
+    Build quarterly and annual series of revenue, net income, debt and equity from
+    every 10-K/10-Q fact in a company's history (a FactTable from load_fact_table).
+
+    Each period keeps the most recently filed value, so restatements win. Flow
+    metrics come from facts spanning ~3 or ~12 months; debt and equity from the
+    balance sheet at the same period end. Growth, margin and leverage columns are
+    computed column-wise over the whole history.
+
+    Returns {"quarterly": DataFrame, "annual": DataFrame}, each indexed by period end.
+    """
+    table = as_fact_table(facts)
+    metrics = list(METRIC_CONCEPTS)
+
+    # Concept id -> metric code and priority, applied to all rows with one gather
+    metric_lut = np.full(len(table.concepts), -1, dtype=np.int16)
+    priority_lut = np.zeros(len(table.concepts), dtype=np.int16)
+    concept_pos = {name: i for i, name in enumerate(table.concepts)}
+    for code, metric in enumerate(metrics):
+        for priority, concept in enumerate(METRIC_CONCEPTS[metric]):
+            if concept in concept_pos:
+                metric_lut[concept_pos[concept]] = code
+                priority_lut[concept_pos[concept]] = priority
+
+    form_ok = np.isin(table.form_id, [i for i, f in enumerate(table.forms) if f in FILING_FORMS])
+    unit_ok = np.isin(table.unit_id, [i for i, u in enumerate(table.units) if u == "USD"])
+    metric_code = metric_lut[table.concept_id]
+    rows = np.flatnonzero((metric_code >= 0) & form_ok & unit_ok & ~np.isnat(table.end))
+
+    df = pd.DataFrame({
+        "metric": metric_code[rows],
+        "priority": priority_lut[table.concept_id[rows]],
+        "start": table.start[rows],
+        "end": table.end[rows],
+        "filed": table.filed[rows],
+        "value": table.value[rows],
+    })
+
+    # Classify every fact as a quarter, a year or a point-in-time balance
+    days = (df["end"] - df["start"]).dt.days
+    df["freq"] = np.select(
+        [df["start"].isna(), days.between(*QUARTER_DAYS), days.between(*YEAR_DAYS)],
+        ["I", "Q", "A"],
+        default="",
+    )
+    df = df[df["freq"] != ""]
+
+    # One value per (metric, freq, end): highest-priority concept, then latest filing
+    df = df.sort_values(["metric", "freq", "end", "priority", "filed"], ascending=[True, True, True, False, True])
+    df = df.drop_duplicates(["metric", "freq", "end"], keep="last")
+    df["metric"] = np.asarray(metrics, dtype=object)[df["metric"].to_numpy()]
+
+    wide = df.pivot_table(index=["freq", "end"], columns="metric", values="value", aggfunc="last")
+    wide = wide.reindex(columns=metrics)
+    instants = wide.xs("I", level="freq") if "I" in wide.index.get_level_values("freq") else wide.iloc[0:0].droplevel("freq")
+
+    return {
+        "quarterly": _with_trends(_period_frame(wide, "Q", instants)),
+        "annual": _with_trends(_period_frame(wide, "A", instants)),
+    }
+
+
+# Flow metrics for one frequency joined with balance-sheet values at the same period ends
+def _period_frame(wide: pd.DataFrame, freq: str, instants: pd.DataFrame) -> pd.DataFrame:
+    if freq in wide.index.get_level_values("freq"):
+        flows = wide.xs(freq, level="freq")[["revenue", "net_income"]]
+    else:
+        flows = pd.DataFrame(columns=["revenue", "net_income"], index=pd.DatetimeIndex([], name="end"), dtype=float)
+    balances = instants.reindex(flows.index)
+    frame = flows.copy()
+    frame.columns.name = None
+    frame["debt"] = balances[DEBT_COMPONENTS].sum(axis=1, min_count=1)
+    frame["equity"] = balances["equity"]
+    return frame.sort_index()
+
+
+# Add margin, leverage and year-over-year growth columns in one vectorized pass
+def _with_trends(frame: pd.DataFrame) -> pd.DataFrame:
+    frame = frame.copy()
+    frame["net_margin"] = frame["net_income"] / frame["revenue"]
+    frame["debt_to_equity"] = frame["debt"] / frame["equity"].where(frame["equity"] != 0)
+    if frame.empty:
+        for col in ("revenue_yoy", "net_income_yoy", "net_margin_change_yoy", "debt_to_equity_change_yoy"):
+            frame[col] = pd.Series(dtype=float)
+        return frame
+
+    # Match each period to the one ending a year earlier (quarters can be missing, so no shift(4))
+    current = frame.reset_index()
+    prior = current.rename(columns=lambda c: f"{c}_prior" if c != "end" else c)
+    prior["end"] = prior["end"] + pd.DateOffset(years=1)
+    matched = pd.merge_asof(current[["end"]], prior.sort_values("end"), on="end",
+                            direction="nearest", tolerance=YEAR_AGO_TOLERANCE)
+    matched.index = frame.index
+
+    frame["revenue_yoy"] = frame["revenue"] / matched["revenue_prior"] - 1
+    frame["net_income_yoy"] = frame["net_income"] / matched["net_income_prior"].abs() - np.sign(matched["net_income_prior"])
+    frame["net_margin_change_yoy"] = frame["net_margin"] - matched["net_margin_prior"]
+    frame["debt_to_equity_change_yoy"] = frame["debt_to_equity"] - matched["debt_to_equity_prior"]
+    return frame.replace([np.inf, -np.inf], np.nan)
+
+
+def _slopes(frame: pd.DataFrame, columns) -> Dict[str, Any]:
+    """Least-squares slope per year of each column, all columns at once, ignoring gaps."""
+    if len(frame) < 2:
+        return {col: None for col in columns}
+    years = ((frame.index - frame.index[0]).days / 365.25).to_numpy()[:, None]
+    y = frame[list(columns)].to_numpy(dtype=float)
+    mask = ~np.isnan(y)
+    n = mask.sum(axis=0)
+    x = np.where(mask, years, 0.0)
+    y0 = np.where(mask, y, 0.0)
+    x_mean = x.sum(axis=0) / np.maximum(n, 1)
+    y_mean = y0.sum(axis=0) / np.maximum(n, 1)
+    cov = (np.where(mask, (years - x_mean) * (y - y_mean), 0.0)).sum(axis=0)
+    var = (np.where(mask, (years - x_mean) ** 2, 0.0)).sum(axis=0)
+    slopes = np.where((n >= 2) & (var > 0), cov / np.where(var > 0, var, 1), np.nan)
+    return {col: (None if np.isnan(v) else float(v)) for col, v in zip(columns, slopes)}
+
+
+def _records(frame: pd.DataFrame) -> list:
+    out = frame.reset_index()
+    out["end"] = out["end"].dt.strftime("%Y-%m-%d")
+    return out.astype(object).where(out.notna(), None).to_dict("records")
+
+
+def summarize_fundamentals(series: Dict[str, pd.DataFrame], quarters: int = 8, years: int = 5) -> Dict[str, Any]:
+    """
+    JSON-friendly summary for prompts and reports: the most recent quarters and years,
+    plus per-year slopes of margin and leverage and the annual revenue CAGR.
+    """
+    quarterly = series["quarterly"].tail(quarters)
+    annual = series["annual"].tail(years)
+
+    revenue = annual["revenue"].dropna()
+    cagr = None
+    if len(revenue) >= 2 and revenue.iloc[0] > 0 and revenue.iloc[-1] > 0:
+        span = (revenue.index[-1] - revenue.index[0]).days / 365.25
+        cagr = float((revenue.iloc[-1] / revenue.iloc[0]) ** (1 / span) - 1) if span > 0 else None
+
+    return {
+        "quarterly": _records(quarterly),
+        "annual": _records(annual),
+        "trends": {
+            "revenue_cagr": cagr,
+            "quarterly_slope_per_year": _slopes(quarterly, ["net_margin", "debt_to_equity"]),
+            "annual_slope_per_year": _slopes(annual, ["net_margin", "debt_to_equity"]),
+        },
+    }
@@ -0,0 +1,452 @@
+"""
+indicators.py - NumPy kernel for the Yahoo branch's technical indicators
+
+Benchmark against the pandas implementation it replaced, from src/:
+    python -m researchers.tools.indicators --days 252 --repeat 2000
+"""
+
+import argparse
+import math
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+RETURN_WINDOWS = {"7d_return": 7, "30d_return": 30, "90d_return": 90}
+SMA_WINDOWS = (20, 50, 200)
+VOLATILITY_WINDOW = 21   # trading days, reported as volatility_30d
+RSI_WINDOW = 14
+YEAR_BARS = 252
+
+
+def _opt(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+def right_align(values, valid=None):
+    """
+    Each column's valid values (non-NaN by default) in their original order, moved down
+    to end on the last row and padded with NaN on top, plus the count per column.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if valid is None:
+        valid = ~np.isnan(values)
+    counts = valid.sum(axis=0)
+    T = values.shape[0]
+    if (counts == T).all():
+        return values, counts
+    # stable sort puts each column's valid rows first, in their original order
+    order = np.argsort(~valid, axis=0, kind="stable")
+    packed = np.take_along_axis(values, order, axis=0)
+    src = np.arange(T)[:, None] - (T - counts)[None, :]
+    return np.where(src >= 0, np.take_along_axis(packed, np.clip(src, 0, T - 1), axis=0), np.nan), counts
+
+
+def indicator_columns(close, wilder_rsi: bool = True) -> List[Optional[Dict[str, Optional[float]]]]:
+    """
+    Every price indicator of YahooFinanceAgent._compute_indicators for each column of
+    a 2-D (bars x series) array of closes, in one vectorized pass (NaNs are dropped
+    per column; None for a column without prices): returns, SMAs, the 21-bar
+    volatility of daily returns, max drawdown and RSI-14. wilder_rsi selects ta's
+    Wilder-smoothed RSI (NaN with under 14 prices) over the plain 14-bar average
+    fallback (None with under 15 prices), matching whichever the agent would use.
+    """
+    a, n = right_align(np.asarray(close, dtype=np.float64).reshape(len(close), -1))
+    T, N = a.shape
+    rows = np.arange(T)[:, None]
+    held = rows >= T - n            # rows holding a column's prices
+    latest = a[-1]
+    out = {}
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        def ret(prior, enough):
+            return np.where(enough & (prior != 0), latest / prior - 1, np.nan)
+
+        for name, days in RETURN_WINDOWS.items():
+            out[name] = ret(a[-1 - days], n > days) if days < T else np.full(N, np.nan)
+        first = a[np.clip(T - n, 0, T - 1), np.arange(N)]
+        out["1y_return"] = ret(first, n >= YEAR_BARS)
+
+        # SMAs (min_periods=1) summed over the offsets from the latest close, which keeps the rounding
+        # small and makes a flat window's SMA exactly the price (price_vs_sma20 compares the two)
+        offsets = np.where(held, a - latest, 0.0)
+        for w in SMA_WINDOWS:
+            out[f"sma_{w}"] = latest + offsets[-w:].sum(axis=0) / np.maximum(np.minimum(n, w), 1)
+
+        # Sample std of the last 21 daily returns (NaN with fewer than two)
+        pct = (a[1:] / a[:-1] - 1)[-VOLATILITY_WINDOW:]
+        pct_held = held[1:][-VOLATILITY_WINDOW:] & held[:-1][-VOLATILITY_WINDOW:]
+        k = pct_held.sum(axis=0)
+        mean = np.where(pct_held, pct, 0.0).sum(axis=0) / np.maximum(k, 1)
+        sq = np.where(pct_held, (pct - mean) ** 2, 0.0).sum(axis=0)
+        out["volatility_30d"] = np.where(k >= 2, np.sqrt(sq / np.maximum(k - 1, 1)), np.nan)
+
+        peak = np.maximum.accumulate(np.where(held, a, -np.inf), axis=0)
+        out["max_drawdown"] = np.min((a - peak) / peak, axis=0, where=held, initial=np.inf)
+
+        delta = np.diff(a, axis=0)
+        gains = np.where(delta > 0, delta, 0.0)
+        losses = np.where(delta < 0, -delta, 0.0)
+        if wilder_rsi:
+            # ewm(alpha=1/14, adjust=False) seeded with 0 for the first price; only the last value is needed,
+            # which is a dot product with geometrically decaying weights (the padding adds zeros)
+            alpha = 1 / RSI_WINDOW
+            weights = alpha * (1 - alpha) ** np.arange(T - 2, -1, -1, dtype=np.float64)
+            avg_up, avg_down = weights @ gains, weights @ losses
+            rsi = np.where(avg_down == 0, 100.0, 100 - 100 / (1 + avg_up / avg_down))
+            out["rsi_14"] = np.where(n >= RSI_WINDOW, rsi, np.nan)
+        else:
+            up, down = gains[-RSI_WINDOW:].mean(axis=0), losses[-RSI_WINDOW:].mean(axis=0)
+            out["rsi_14"] = np.where((n > RSI_WINDOW) & (down != 0), 100 - 100 / (1 + up / down), np.nan)
+
+    results = []
+    for j in range(N):
+        if not n[j]:
+            results.append(None)
+            continue
+        row = {"latest_close": float(latest[j])}
+        for name in (*RETURN_WINDOWS, "1y_return"):
+            row[name] = _opt(out[name][j])
+        for w in SMA_WINDOWS:
+            row[f"sma_{w}"] = float(out[f"sma_{w}"][j])
+        row["price_vs_sma20"] = 1 if row["latest_close"] > row["sma_20"] else -1
+        row["volatility_30d"] = float(out["volatility_30d"][j])
+        row["max_drawdown"] = float(out["max_drawdown"][j])
+        # ta's RSI gives NaN for short histories, the fallback None
+        row["rsi_14"] = float(out["rsi_14"][j]) if wilder_rsi else _opt(out["rsi_14"][j])
+        results.append(row)
+    return results
+
+
+def indicator_kernel(close, wilder_rsi: bool = True) -> Dict[str, Optional[float]]:
+    """indicator_columns for one series of closes."""
+    c = np.asarray(close, dtype=np.float64).reshape(-1)
+    out = indicator_columns(c[~np.isnan(c)].reshape(-1, 1), wilder_rsi)[0] if len(c) else None
+    if out is None:
+        raise ValueError("Empty close series after cleaning")
+    return out
+
+
+# === Streaming indicators ===
+
+class _Window:
+    """The last size values with their running sum; the newest value can be revised in place."""
+
+    def __init__(self, size: int, values: Iterable[float] = ()):
+        self.size = size
+        self.values = deque(values, maxlen=size)
+        self.total = math.fsum(self.values)
+        self.nonzero = sum(1 for v in self.values if v != 0)
+        self._changes = 0
+
+    def push(self, x: float):
+        if len(self.values) == self.size:
+            old = self.values[0]
+            self.total -= old
+            self.nonzero -= old != 0
+        self.values.append(x)
+        self.total += x
+        self.nonzero += x != 0
+        self._changed()
+
+    def replace_last(self, x: float):
+        old = self.values[-1]
+        self.total += x - old
+        self.nonzero += (x != 0) - (old != 0)
+        self.values[-1] = x
+        self._changed()
+
+    def _changed(self):
+        # Re-sum exactly once per window length of updates, so rounding can't build up
+        self._changes += 1
+        if self._changes >= self.size:
+            self.total = math.fsum(self.values)
+            self._changes = 0
+
+    def __len__(self):
+        return len(self.values)
+
+
+class StreamingIndicators:
+    """
+    indicator_kernel's outputs maintained incrementally. Seed once from the price
+    history, then call update(price) for each new bar (or update(price,
+    new_bar=False) to revise the current bar, e.g. on every intraday tick); both
+    are O(1). Every state is bounded by the longest window (200 bars), and
+    to_dict()/from_dict() round-trip it through JSON. indicators() returns the
+    dict _score_and_confidence reads, equal to indicator_kernel over the same
+    prices within rounding.
+    """
+
+    def __init__(self, wilder_rsi: bool = True):
+        self.wilder_rsi = wilder_rsi
+        self.n = 0
+        self.first = None
+        self.first_date = None
+        self.last_date = None
+        self._flat_run = 0                                   # bars at the end equal to the latest price
+        self._flat_run_before = 0
+        self._recent = deque(maxlen=max(RETURN_WINDOWS.values()) + 1)
+        self._sma = {w: _Window(w) for w in SMA_WINDOWS}
+        self._returns = _Window(VOLATILITY_WINDOW)
+        self._returns_sq = _Window(VOLATILITY_WINDOW)
+        self._gains = _Window(RSI_WINDOW)                    # rolling-mean RSI fallback
+        self._losses = _Window(RSI_WINDOW)
+        # Drawdown and Wilder averages as of the bar before the latest, so the latest can be revised
+        self._peak_before = -math.inf
+        self._drawdown_before = 0.0
+        self._up_before = 0.0
+        self._down_before = 0.0
+
+    @classmethod
+    def from_history(cls, close, dates=None, wilder_rsi: bool = True) -> "StreamingIndicators":
+        stream = cls(wilder_rsi)
+        close = np.asarray(close, dtype=np.float64).reshape(-1)
+        for i, price in enumerate(close):
+            stream.update(price, dates[i] if dates is not None else None)
+        if dates is not None and len(dates):
+            # Like _compute_indicators, the dates span the whole history (bars without a close included)
+            stream.first_date = _iso(dates[0])
+            stream.last_date = _iso(dates[-1])
+        return stream
+
+    # === Updates ===
+
+    def update(self, price: float, when=None, new_bar: bool = True):
+        """Add a bar closing at price (new_bar=False revises the latest bar instead). NaN prices are ignored."""
+        price = float(price)
+        if math.isnan(price):
+            return
+        if when is not None:
+            self.last_date = _iso(when)
+        if not new_bar and self.n:
+            self._revise(price)
+            return
+
+        if self.n:
+            # The latest bar is final now: fold it into the state the next bar builds on
+            latest = self._recent[-1]
+            self._peak_before = max(self._peak_before, latest)
+            self._drawdown_before = self._drawdown(latest)
+            self._up_before, self._down_before = self._wilder_averages()
+            self._flat_run_before = self._flat_run
+            change = price - latest
+            ret = price / latest - 1 if latest != 0 else math.nan
+        else:
+            self.first = price
+            self.first_date = self.first_date or self.last_date
+            change = ret = math.nan
+
+        self.n += 1
+        self._recent.append(price)
+        for window in self._sma.values():
+            window.push(price)
+        self._flat_run = self._flat_run_before + 1 if self.n > 1 and change == 0 else 1
+        if not math.isnan(ret):
+            self._returns.push(ret)
+            self._returns_sq.push(ret * ret)
+        if not math.isnan(change):
+            self._gains.push(max(change, 0.0))
+            self._losses.push(max(-change, 0.0))
+
+    def _revise(self, price: float):
+        previous = self._recent[-2] if self.n > 1 else None
+        self._recent[-1] = price
+        if self.n == 1:
+            self.first = price
+        for window in self._sma.values():
+            window.replace_last(price)
+        if previous is not None:
+            change = price - previous
+            self._flat_run = self._flat_run_before + 1 if change == 0 else 1
+            if previous != 0:
+                ret = price / previous - 1
+                self._returns.replace_last(ret)
+                self._returns_sq.replace_last(ret * ret)
+            self._gains.replace_last(max(change, 0.0))
+            self._losses.replace_last(max(-change, 0.0))
+
+    # === Current values ===
+
+    def _drawdown(self, price: float) -> float:
+        peak = max(self._peak_before, price)
+        return min(self._drawdown_before, (price - peak) / peak if peak != 0 else math.nan)
+
+    def _wilder_averages(self):
+        # ewm(alpha=1/14, adjust=False) seeded with 0 for the first price, as in indicator_kernel
+        if self.n < 2:
+            return 0.0, 0.0
+        alpha = 1 / RSI_WINDOW
+        change = self._recent[-1] - self._recent[-2]
+        return ((1 - alpha) * self._up_before + alpha * max(change, 0.0),
+                (1 - alpha) * self._down_before + alpha * max(-change, 0.0))
+
+    def indicators(self) -> Dict[str, Optional[float]]:
+        if not self.n:
+            raise ValueError("Empty close series after cleaning")
+        latest = self._recent[-1]
+        out = {"latest_close": latest, "first_date": self.first_date, "last_date": self.last_date}
+
+        def ret(prior):
+            return float(latest / prior - 1) if prior != 0 else None
+
+        for name, days in RETURN_WINDOWS.items():
+            out[name] = ret(self._recent[-1 - days]) if self.n > days else None
+        out["1y_return"] = ret(self.first) if self.n >= YEAR_BARS else None
+
+        for w, window in self._sma.items():
+            # A window of identical prices averages to exactly that price (price_vs_sma20 compares the two)
+            out[f"sma_{w}"] = latest if self._flat_run >= len(window) else window.total / len(window)
+        out["price_vs_sma20"] = 1 if latest > out["sma_20"] else -1
+
+        k = len(self._returns)
+        if k >= 2:
+            mean = self._returns.total / k
+            out["volatility_30d"] = math.sqrt(max(0.0, (self._returns_sq.total - k * mean * mean) / (k - 1)))
+        else:
+            out["volatility_30d"] = float("nan")
+
+        out["max_drawdown"] = float(self._drawdown(latest))
+
+        if self.wilder_rsi:
+            if self.n < RSI_WINDOW:
+                out["rsi_14"] = float("nan")
+            else:
+                up, down = self._wilder_averages()
+                out["rsi_14"] = 100.0 if down == 0 else float(100 - 100 / (1 + up / down))
+        elif self.n <= RSI_WINDOW or not self._losses.nonzero:
+            out["rsi_14"] = None
+        else:
+            up, down = self._gains.total / RSI_WINDOW, self._losses.total / RSI_WINDOW
+            out["rsi_14"] = _opt(100 - 100 / (1 + up / down))
+        return out
+
+    # === Persistence ===
+
+    def to_dict(self) -> dict:
+        return {
+            "version": 1, "wilder_rsi": self.wilder_rsi, "n": self.n, "first": self.first,
+            "first_date": self.first_date, "last_date": self.last_date,
+            "flat_run": self._flat_run, "flat_run_before": self._flat_run_before,
+            "recent": list(self._recent),
+            "sma": {str(w): list(window.values) for w, window in self._sma.items()},
+            "returns": list(self._returns.values), "returns_sq": list(self._returns_sq.values),
+            "gains": list(self._gains.values), "losses": list(self._losses.values),
+            "peak_before": self._peak_before if self._peak_before != -math.inf else None,
+            "drawdown_before": self._drawdown_before,
+            "up_before": self._up_before, "down_before": self._down_before,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StreamingIndicators":
+        stream = cls(data["wilder_rsi"])
+        stream.n = data["n"]
+        stream.first = data["first"]
+        stream.first_date = data["first_date"]
+        stream.last_date = data["last_date"]
+        stream._flat_run = data["flat_run"]
+        stream._flat_run_before = data["flat_run_before"]
+        stream._recent.extend(data["recent"])
+        stream._sma = {w: _Window(w, data["sma"][str(w)]) for w in SMA_WINDOWS}
+        stream._returns = _Window(VOLATILITY_WINDOW, data["returns"])
+        stream._returns_sq = _Window(VOLATILITY_WINDOW, data["returns_sq"])
+        stream._gains = _Window(RSI_WINDOW, data["gains"])
+        stream._losses = _Window(RSI_WINDOW, data["losses"])
+        stream._peak_before = data["peak_before"] if data["peak_before"] is not None else -math.inf
+        stream._drawdown_before = data["drawdown_before"]
+        stream._up_before = data["up_before"]
+        stream._down_before = data["down_before"]
+        return stream
+
+
+def _iso(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    import pandas as pd
+    return pd.Timestamp(value).isoformat()
+
+
+# === Benchmark ===
+
+def _pandas_indicators(close, wilder_rsi: bool) -> Dict[str, Optional[float]]:
+    """The pandas rolling chain indicator_kernel replaced, kept as the benchmark and equivalence reference."""
+    import pandas as pd
+
+    s = pd.Series(np.asarray(close, dtype=np.float64)).dropna().reset_index(drop=True)
+    n = len(s)
+    vals = s.to_numpy()
+    out = {"latest_close": float(vals[-1])}
+
+    def pct(latest_idx, prior_idx):
+        return None if vals[prior_idx] == 0 else float(vals[latest_idx] / vals[prior_idx] - 1)
+
+    out["7d_return"] = pct(n - 1, n - 8) if n >= 8 else None
+    out["30d_return"] = pct(n - 1, n - 31) if n >= 31 else None
+    out["90d_return"] = pct(n - 1, n - 91) if n >= 91 else None
+    out["1y_return"] = pct(n - 1, 0) if n >= 252 else None
+    out["sma_20"] = float(s.rolling(window=20, min_periods=1).mean().iat[-1])
+    out["sma_50"] = float(s.rolling(window=50, min_periods=1).mean().iat[-1])
+    out["sma_200"] = float(s.rolling(window=200, min_periods=1).mean().iat[-1])
+    out["price_vs_sma20"] = 1 if out["latest_close"] > out["sma_20"] else -1
+    out["volatility_30d"] = float(s.pct_change().rolling(window=21, min_periods=1).std().iat[-1])
+    roll_max = s.cummax()
+    out["max_drawdown"] = float(((s - roll_max) / roll_max).min())
+    delta = s.diff()
+    if wilder_rsi:
+        # ta.momentum.RSIIndicator(s, window=14).rsi()
+        up = delta.where(delta > 0, 0.0).ewm(alpha=1 / 14, min_periods=14, adjust=False).mean()
+        down = (-delta.where(delta < 0, 0.0)).ewm(alpha=1 / 14, min_periods=14, adjust=False).mean()
+        out["rsi_14"] = float(np.where(down == 0, 100, 100 - (100 / (1 + up / down)))[-1])
+    else:
+        delta = delta.dropna()
+        up = delta.where(delta > 0, 0).rolling(14).mean()
+        down = -delta.where(delta < 0, 0).rolling(14).mean()
+        rs = up / down.replace(0, np.nan)
+        last_rs = rs.iat[-1] if len(rs) > 0 else np.nan
+        out["rsi_14"] = float(100 - (100 / (1 + last_rs))) if not np.isnan(last_rs) else None
+    return out
+
+
+def _max_difference(a: dict, b: dict) -> float:
+    worst = 0.0
+    for key in a:
+        x, y = a[key], b[key]
+        if x is None or y is None or np.isnan(x) or np.isnan(y):
+            if not (x is y or (x is not None and y is not None and np.isnan(x) and np.isnan(y))):
+                return float("inf")
+            continue
+        worst = max(worst, abs(x - y) / max(1.0, abs(x)))
+    return worst
+
+
+def benchmark(days: int = 252, repeat: int = 1000, seed: int = 0) -> dict:
+    """Time both implementations on random walks and check they agree (largest relative difference)."""
+    rng = np.random.default_rng(seed)
+    series = [100 * np.exp(np.cumsum(rng.normal(0, 0.02, days))) for _ in range(repeat)]
+    result = {"days": days, "repeat": repeat}
+    for wilder in (True, False):
+        t0 = time.perf_counter()
+        fast = [indicator_kernel(c, wilder) for c in series]
+        t1 = time.perf_counter()
+        slow = [_pandas_indicators(c, wilder) for c in series]
+        t2 = time.perf_counter()
+        label = "wilder_rsi" if wilder else "rolling_rsi"
+        result[label] = {
+            "numpy_us": round((t1 - t0) / repeat * 1e6, 1),
+            "pandas_us": round((t2 - t1) / repeat * 1e6, 1),
+            "speedup": round((t2 - t1) / (t1 - t0), 1),
+            "max_rel_diff": max(_max_difference(a, b) for a, b in zip(slow, fast)),
+        }
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the NumPy indicator kernel against the pandas chain.")
+    parser.add_argument("--days", type=int, default=252, help="bars per series (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1000, help="series per run (default: %(default)s)")
+    args = parser.parse_args()
+    for key, value in benchmark(args.days, args.repeat).items():
+        print(f"{key}: {value}")
@@ -0,0 +1,91 @@
+"""
+llm_cache.py - Persistent cache of LLM results for filings, keyed by accession number
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+
+class LlmResultCache:
+    """
+    Stores one JSON file per (accession, name, model, prompt version) under
+    directory/<accession>/. A filing never changes once filed, so entries do not
+    expire; changing the model or bumping the prompt version simply misses, and
+    invalidate() drops entries explicitly.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "invalidations": 0}
+        self._lock = threading.Lock()
+
+    # === Public API ===
+
+    def get(self, accession: str, name: str, model: str, prompt_version: str) -> Optional[Any]:
+        path = self._path(accession, name, model, prompt_version)
+        try:
+            with open(path) as f:
+                result = json.load(f)["result"]
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[Warning] Ignoring unreadable LLM cache entry {path}: {e}")
+            self._count("misses")
+            return None
+        self._count("hits")
+        return result
+
+    def put(self, accession: str, name: str, model: str, prompt_version: str, result: Any):
+        path = self._path(accession, name, model, prompt_version)
+        entry = {
+            "accession": accession,
+            "name": name,
+            "model": model,
+            "prompt_version": prompt_version,
+            "stored_at": time.time(),
+            "result": result,
+        }
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[Warning] Could not store LLM result for {accession}: {e}")
+            return
+        self._count("writes")
+
+    def invalidate(self, accession: Optional[str] = None, name: Optional[str] = None):
+        """Drop the entries of one accession (optionally only one name), or everything when accession is None."""
+        if accession is None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+        elif name is None:
+            shutil.rmtree(self.directory / accession, ignore_errors=True)
+        else:
+            for path in (self.directory / accession).glob("*.json"):
+                try:
+                    with open(path) as f:
+                        stored_name = json.load(f).get("name")
+                except (OSError, ValueError):
+                    stored_name = name
+                if stored_name == name:
+                    path.unlink(missing_ok=True)
+        self._count("invalidations")
+
+    # === Internals ===
+
+    def _path(self, accession: str, name: str, model: str, prompt_version: str) -> Path:
+        key = hashlib.sha256(f"{name}\0{model}\0{prompt_version}".encode()).hexdigest()
+        return self.directory / accession / f"{key[:32]}.json"
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
@@ -0,0 +1,255 @@
+"""
+peer_stats.py - Cross-sectional peer percentiles built from the XBRL frames API
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+try:
+    from tools.fundamentals import DEBT_COMPONENTS, METRIC_CONCEPTS
+    from tools.sec_tools import SEC_CACHE_DIR, get_frame, get_sic_code
+except ImportError:
+    from researchers.tools.fundamentals import DEBT_COMPONENTS, METRIC_CONCEPTS
+    from researchers.tools.sec_tools import SEC_CACHE_DIR, get_frame, get_sic_code
+
+PEER_STATS_DIR = SEC_CACHE_DIR / "peers"
+PEER_STATS_MAX_AGE = timedelta(days=7)  # late filers keep adding to recent frames
+MIN_PEERS = 10
+
+# Same measures (and units) as calc_yoy_rev, calc_profit and calc_debt_to_equity
+PEER_METRICS = ("revenue_growth", "net_margin", "debt_to_equity")
+GROUP_LEVELS = ("sic4", "sic2", "all")
+
+_PEER_STATS: Dict[int, "PeerStats"] = {}
+# _PEER_LOCK guards the two dicts only; each year's load or build runs under that year's own lock
+_PEER_LOCK = threading.Lock()
+_PEER_YEAR_LOCKS: Dict[int, threading.Lock] = {}
+
+
+class PeerStats:
+    """
+    One calendar year of peer metrics for every filer in the frames, as arrays
+    aligned on sorted CIKs. For each metric and grouping level (4-digit SIC,
+    2-digit SIC major group, all filers) the values are pre-sorted by (group, value),
+    so a company's percentile is a few binary searches.
+    Percentiles are plain ranks: a high debt_to_equity percentile means more leverage.
+    """
+
+    def __init__(self, year: int, ciks: np.ndarray, sic: np.ndarray, metrics: Dict[str, np.ndarray],
+                 built_at: Optional[float] = None):
+        order = np.argsort(ciks)
+        self.year = year
+        self.ciks = np.asarray(ciks, dtype=np.int64)[order]
+        self.sic = np.asarray(sic, dtype=np.int32)[order]  # 0 = unknown
+        self.metrics = {name: np.asarray(values, dtype=np.float64)[order] for name, values in metrics.items()}
+        self.built_at = built_at or time.time()
+
+        self._sorted: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+        for name, values in self.metrics.items():
+            ok = np.isfinite(values)
+            for level in GROUP_LEVELS:
+                keys = self._group_keys(self.sic, level)[ok]
+                vals = values[ok]
+                by_group = np.lexsort((vals, keys))
+                self._sorted[(name, level)] = (keys[by_group], vals[by_group])
+
+    @staticmethod
+    def _group_keys(sic, level: str):
+        if level == "sic4":
+            return sic
+        if level == "sic2":
+            return sic // 100
+        return np.zeros_like(sic)
+
+    # === Lookups ===
+
+    def value(self, cik: int, metric: str) -> Optional[float]:
+        i = np.searchsorted(self.ciks, cik)
+        if i == len(self.ciks) or self.ciks[i] != cik:
+            return None
+        v = self.metrics[metric][i]
+        return float(v) if np.isfinite(v) else None
+
+    def group_size(self, metric: str, sic: int, level: str) -> int:
+        keys, _ = self._sorted[(metric, level)]
+        key = int(self._group_keys(np.int32(sic), level))
+        return int(np.searchsorted(keys, key, "right") - np.searchsorted(keys, key, "left"))
+
+    def percentile(self, metric: str, value: float, sic: int = 0, level: str = "all") -> Optional[float]:
+        """Mid-rank percentile (0-100) of value among the metric's values in the sic's group."""
+        keys, vals = self._sorted[(metric, level)]
+        key = int(self._group_keys(np.int32(sic), level))
+        lo, hi = np.searchsorted(keys, key, "left"), np.searchsorted(keys, key, "right")
+        if hi == lo:
+            return None
+        group = vals[lo:hi]
+        below = np.searchsorted(group, value, "left")
+        at_or_below = np.searchsorted(group, value, "right")
+        return float((below + (at_or_below - below) / 2) / (hi - lo) * 100)
+
+    def company_percentiles(self, cik: int, sic: Optional[int] = None, min_peers: int = MIN_PEERS) -> Dict[str, dict]:
+        """
+        Each metric's value and percentile for one company. The peer group is its
+        4-digit SIC industry, widened to the 2-digit major group and then to all
+        filers when it has fewer than min_peers companies with data.
+        """
+        if sic is None:
+            i = np.searchsorted(self.ciks, cik)
+            sic = int(self.sic[i]) if i < len(self.ciks) and self.ciks[i] == cik else 0
+
+        result = {}
+        for metric in self.metrics:
+            value = self.value(cik, metric)
+            if value is None:
+                result[metric] = {"value": None, "percentile": None, "peer_group": None, "peers": 0}
+                continue
+            levels = GROUP_LEVELS if sic else ("all",)
+            level = next(l for l in levels if l == "all" or self.group_size(metric, sic, l) >= min_peers)
+            result[metric] = {
+                "value": value,
+                "percentile": self.percentile(metric, value, sic, level),
+                "peer_group": {"sic4": f"SIC {sic:04d}", "sic2": f"SIC {sic // 100:02d}xx", "all": "all filers"}[level],
+                "peers": self.group_size(metric, sic, level),
+            }
+        return result
+
+    # === Persistence ===
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, year=self.year, built_at=self.built_at, ciks=self.ciks, sic=self.sic,
+                 **{f"metric_{name}": values for name, values in self.metrics.items()})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "PeerStats":
+        with np.load(path) as data:
+            metrics = {key[len("metric_"):]: data[key] for key in data.files if key.startswith("metric_")}
+            return cls(int(data["year"]), data["ciks"], data["sic"], metrics, float(data["built_at"]))
+
+
+def default_peer_year(today: Optional[date] = None) -> int:
+    # Most 10-Ks are filed by the end of March, so last year's frames are filled in by April
+    today = today or date.today()
+    return today.year - 1 if today.month >= 4 else today.year - 2
+
+
+# cik -> value from the first concept (in priority order) each company reported for the period
+def _frame_values(concepts: Iterable[str], period: str) -> Dict[int, float]:
+    values: Dict[int, float] = {}
+    for concept in concepts:
+        for row in get_frame(concept, period):
+            values.setdefault(int(row["cik"]), float(row["val"]))
+    return values
+
+
+def _aligned(values: Dict[int, float], ciks: np.ndarray) -> np.ndarray:
+    return np.array([values.get(int(c), np.nan) for c in ciks], dtype=np.float64)
+
+
+# SIC codes for peers come from the ingested submissions archive (bulk_store.py) and are kept in sic.json;
+# without the archive peers have no industry and percentiles are taken across all filers
+def _peer_sic_codes(ciks: np.ndarray) -> np.ndarray:
+    path = PEER_STATS_DIR / "sic.json"
+    try:
+        with open(path) as f:
+            known = json.load(f)
+    except (OSError, ValueError):
+        known = {}
+
+    # Only real codes are persisted: a CIK without one is looked up again next time,
+    # since a later submissions ingest may supply it
+    codes = dict(known)
+    missing = [str(c) for c in ciks if str(c) not in known]
+    for cik in missing:
+        try:
+            codes[cik] = get_sic_code(cik, offline_only=True) or 0
+        except (OSError, ValueError) as e:
+            print(f"[Warning] Could not read SIC code for CIK {cik}: {e}")
+            codes[cik] = 0
+    found = {cik: codes[cik] for cik in missing if codes[cik]}
+    if found:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump({**known, **found}, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[Warning] Could not persist SIC codes: {e}")
+    return np.array([codes[str(c)] for c in ciks], dtype=np.int32)
+
+
+def build_peer_stats(year: int) -> PeerStats:
+    """Pull the frames behind the calc_* ratios for one calendar year (about a dozen requests)."""
+    revenue = _frame_values(METRIC_CONCEPTS["revenue"], f"CY{year}")
+    revenue_prev = _frame_values(METRIC_CONCEPTS["revenue"], f"CY{year - 1}")
+    net_income = _frame_values(METRIC_CONCEPTS["net_income"], f"CY{year}")
+    equity = _frame_values(METRIC_CONCEPTS["equity"], f"CY{year}Q4I")
+    debt_parts = [_frame_values(METRIC_CONCEPTS[part], f"CY{year}Q4I") for part in DEBT_COMPONENTS]
+
+    ciks = np.array(sorted(set(revenue) | set(net_income) | set(equity)), dtype=np.int64)
+    rev, prev, ni, eq = (_aligned(v, ciks) for v in (revenue, revenue_prev, net_income, equity))
+    parts = np.vstack([_aligned(v, ciks) for v in debt_parts])
+    # Missing debt components count as zero, as long as one of them is reported
+    debt = np.where(np.isnan(parts).all(axis=0), np.nan, np.nansum(parts, axis=0))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics = {
+            "revenue_growth": np.where(prev > 0, (rev - prev) / prev * 100, np.nan),
+            "net_margin": np.where(rev > 0, ni / rev * 100, np.nan),
+            "debt_to_equity": np.where(eq != 0, debt / eq, np.nan),
+        }
+    return PeerStats(year, ciks, _peer_sic_codes(ciks), metrics)
+
+
+def load_peer_stats(year: Optional[int] = None, refresh: bool = False,
+                    max_age: timedelta = PEER_STATS_MAX_AGE) -> PeerStats:
+    """Peer statistics for a calendar year, from memory, then PEER_STATS_DIR, then the frames API."""
+    year = year or default_peer_year()
+
+    def fresh(stats):
+        return stats is not None and time.time() - stats.built_at < max_age.total_seconds()
+
+    with _PEER_LOCK:
+        stats = _PEER_STATS.get(year)
+        if not refresh and fresh(stats):
+            return stats
+        year_lock = _PEER_YEAR_LOCKS.setdefault(year, threading.Lock())
+
+    # Concurrent callers for the same year wait for one build; other years (and warm ones) don't
+    with year_lock:
+        with _PEER_LOCK:
+            current = _PEER_STATS.get(year)
+        if current is not stats and fresh(current):
+            # Another caller (re)built it while this one waited
+            return current
+
+        path = PEER_STATS_DIR / f"CY{year}.npz"
+        if not refresh and path.exists():
+            try:
+                stats = PeerStats.load(path)
+                if fresh(stats):
+                    with _PEER_LOCK:
+                        _PEER_STATS[year] = stats
+                    return stats
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[Warning] Rebuilding unreadable peer stats {path}: {e}")
+
+        stats = build_peer_stats(year)
+        try:
+            stats.save(path)
+        except OSError as e:
+            print(f"[Warning] Could not persist peer stats for CY{year}: {e}")
+        with _PEER_LOCK:
+            _PEER_STATS[year] = stats
+        return stats
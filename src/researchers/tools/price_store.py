@@ -0,0 +1,209 @@
+"""
+price_store.py - Incremental per-symbol OHLCV store, so daily reruns only download the new bars
+"""
+
+import json
+import os
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+# Overlapping closes further apart than this mean Yahoo re-adjusted the history (split or dividend)
+ADJUSTMENT_RTOL = 1e-4
+
+# download(symbol, start, end) / download_many(symbols, start, end): end exclusive, as in yf.download
+Download = Callable[[str, date, date], pd.DataFrame]
+DownloadMany = Callable[[list, date, date], Dict[str, pd.DataFrame]]
+
+
+class PriceStore:
+    """
+    One compressed .npz file of column arrays per symbol (dates as datetime64[D],
+    then Open/High/Low/Close/Volume), with the covered date range kept alongside. A
+    request for a window downloads only what the store lacks: the days since the
+    last stored bar (re-reading that bar to check nothing was re-adjusted), and any
+    days before the first. If the overlapping close changed, the whole window is
+    downloaded again and replaces the symbol's history.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.stats = {"hits": 0, "partial": 0, "full": 0, "readjusted": 0, "bars_downloaded": 0}
+        self._lock = threading.Lock()
+
+    # === Public API ===
+
+    def get(self, symbol: str, start: date, end: date, download: Download) -> pd.DataFrame:
+        """Bars with start <= date < end, fetching the missing ones first."""
+        stored = self._read(symbol)
+        fetch = self.missing_range(stored, start, end)
+        if fetch is not None:
+            frame = download(symbol, *fetch)
+            self._count("bars_downloaded", len(frame))
+            stored = self._merge(symbol, stored, frame, fetch, start, end)
+            if stored is None:
+                frame = download(symbol, start, end)
+                self._count("bars_downloaded", len(frame))
+                stored = self._replace(symbol, frame, start, end)
+        else:
+            self._count("hits")
+        return self._window(stored, start, end)
+
+    def get_many(self, symbols: Iterable[str], start: date, end: date,
+                 download_many: DownloadMany) -> Dict[str, pd.DataFrame]:
+        """
+        get() for many symbols, with one batched download per distinct missing range, so
+        a new symbol's full window doesn't widen the incremental fetch of all the others.
+        """
+        stored = {s: self._read(s) for s in symbols}
+        batches: Dict[Tuple[date, date], list] = {}
+        for s in stored:
+            fetch = self.missing_range(stored[s], start, end)
+            if fetch is not None:
+                batches.setdefault(fetch, []).append(s)
+        self._count("hits", len(stored) - sum(len(needed) for needed in batches.values()))
+        readjusted = []
+        for fetch, needed in batches.items():
+            frames = download_many(needed, *fetch)
+            for s in needed:
+                frame = frames.get(s, _empty_frame())
+                self._count("bars_downloaded", len(frame))
+                merged = self._merge(s, stored[s], frame, fetch, start, end)
+                if merged is None:
+                    readjusted.append(s)
+                else:
+                    stored[s] = merged
+        if readjusted:
+            frames = download_many(readjusted, start, end)
+            for s in readjusted:
+                frame = frames.get(s, _empty_frame())
+                self._count("bars_downloaded", len(frame))
+                stored[s] = self._replace(s, frame, start, end)
+        return {s: self._window(stored[s], start, end) for s in stored}
+
+    @staticmethod
+    def missing_range(stored: Optional[dict], start: date, end: date) -> Optional[Tuple[date, date]]:
+        """The (start, end) to download for the window, or None if the store already covers it."""
+        if stored is None:
+            return start, end
+        covered_from, covered_to = stored["covered_from"], stored["covered_to"]
+        need_back, need_forward = start < covered_from, end > covered_to
+        if not (need_back or need_forward):
+            return None
+        if not len(stored["date"]):
+            # Yahoo had no bars for the covered range (e.g. an unknown symbol); only ask about the days outside it
+            return (start if need_back else covered_to), (end if need_forward else covered_from)
+        first_bar = _to_date(stored["date"][0])
+        last_bar = _to_date(stored["date"][-1])
+        # Each range includes one stored bar, to check the history wasn't re-adjusted
+        fetch_start = start if need_back else min(last_bar, covered_to)
+        fetch_end = end if need_forward else first_bar + timedelta(days=1)
+        return fetch_start, fetch_end
+
+    def last_date(self, symbol: str) -> Optional[date]:
+        stored = self._read(symbol)
+        return _to_date(stored["date"][-1]) if stored is not None and len(stored["date"]) else None
+
+    # === Internals ===
+
+    def _path(self, symbol: str) -> Path:
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in symbol.upper())
+        return self.directory / f"{safe}.npz"
+
+    def _read(self, symbol: str) -> Optional[dict]:
+        path = self._path(symbol)
+        if not path.exists():
+            return None
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data["meta"]))
+                stored = {name: data[name] for name in ("date",) + PRICE_COLUMNS}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[Warning] Ignoring unreadable price store {path}: {e}")
+            return None
+        stored["covered_from"] = date.fromisoformat(meta["covered_from"])
+        stored["covered_to"] = date.fromisoformat(meta["covered_to"])
+        return stored
+
+    def _merge(self, symbol: str, stored: Optional[dict], frame: pd.DataFrame, fetch: Tuple[date, date],
+               start: date, end: date) -> Optional[dict]:
+        """Stored history plus the downloaded bars (new bars win), or None if the overlap shows a re-adjustment."""
+        new = _frame_arrays(frame)
+        if stored is None:
+            self._count("full")
+            return self._write(symbol, new, start, end)
+
+        shared, old_i, new_i = np.intersect1d(stored["date"], new["date"], return_indices=True)
+        if len(shared) and not np.allclose(stored["Close"][old_i], new["Close"][new_i], rtol=ADJUSTMENT_RTOL, equal_nan=True):
+            self._count("readjusted")
+            return None
+        self._count("partial")
+        keep = ~np.isin(stored["date"], new["date"])
+        merged = {}
+        for name in ("date",) + PRICE_COLUMNS:
+            merged[name] = np.concatenate([stored[name][keep], new[name]])
+        order = np.argsort(merged["date"], kind="stable")
+        merged = {name: values[order] for name, values in merged.items()}
+        covered_from = min(stored["covered_from"], fetch[0])
+        covered_to = max(stored["covered_to"], fetch[1])
+        return self._write(symbol, merged, covered_from, covered_to)
+
+    def _replace(self, symbol: str, frame: pd.DataFrame, start: date, end: date) -> dict:
+        self._count("full")
+        return self._write(symbol, _frame_arrays(frame), start, end)
+
+    def _write(self, symbol: str, arrays: dict, covered_from: date, covered_to: date) -> dict:
+        stored = dict(arrays, covered_from=covered_from, covered_to=covered_to)
+        path = self._path(symbol)
+        meta = json.dumps({"symbol": symbol, "covered_from": covered_from.isoformat(),
+                           "covered_to": covered_to.isoformat()})
+        try:
+            with self._lock:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp.npz")
+                np.savez_compressed(tmp, meta=np.array(meta), **arrays)
+                os.replace(tmp, path)
+        except OSError as e:
+            print(f"[Warning] Could not persist prices for {symbol}: {e}")
+        return stored
+
+    @staticmethod
+    def _window(stored: dict, start: date, end: date) -> pd.DataFrame:
+        dates = stored["date"]
+        lo = np.searchsorted(dates, np.datetime64(start, "D"), "left")
+        hi = np.searchsorted(dates, np.datetime64(end, "D"), "left")
+        frame = pd.DataFrame({name: stored[name][lo:hi] for name in PRICE_COLUMNS})
+        frame.insert(0, "date", pd.to_datetime(dates[lo:hi]))
+        return frame
+
+    def _count(self, stat: str, amount: int = 1):
+        with self._lock:
+            self.stats[stat] += amount
+
+
+def _to_date(value: np.datetime64) -> date:
+    return pd.Timestamp(value).date()
+
+
+def _empty_frame() -> pd.DataFrame:
+    return pd.DataFrame(columns=PRICE_COLUMNS, index=pd.DatetimeIndex([]))
+
+
+# Date-indexed OHLCV frame (as yf.download returns for one symbol) -> sorted column arrays without empty bars
+def _frame_arrays(frame: pd.DataFrame) -> dict:
+    if isinstance(frame.columns, pd.MultiIndex):
+        frame = frame.droplevel(list(range(1, frame.columns.nlevels)), axis=1)
+    frame = frame.sort_index()
+    frame = frame[~frame.index.duplicated(keep="last")]
+    if "Close" in frame:
+        frame = frame[frame["Close"].notna()]
+    arrays = {"date": pd.DatetimeIndex(frame.index).tz_localize(None).to_numpy().astype("datetime64[D]")}
+    for name in PRICE_COLUMNS:
+        values = frame[name] if name in frame else pd.Series(np.nan, index=frame.index)
+        arrays[name] = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+    return arrays
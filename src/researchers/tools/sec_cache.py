@@ -0,0 +1,184 @@
+"""
+sec_cache.py - Persistent, gzip-compressed HTTP cache for SEC EDGAR requests
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+import requests
+
+# Filing documents live under .../Archives/edgar/data/<cik>/<18-digit accession>/ and never change
+_IMMUTABLE_URL = re.compile(r"/Archives/edgar/data/\d+/\d{18}/")
+# Cache key suffix of a stored document prefix (e.g. a 10-K read only up to Item 8)
+_PARTIAL = "#partial"
+# Seconds to wait on a plain requests.Session, which has no timeout of its own
+FALLBACK_TIMEOUT = 30
+
+
+class SecHttpCache:
+    """
+    On-disk cache keyed by URL. Each entry is a gzip body plus a JSON metadata file
+    holding the ETag / Last-Modified validators. Entries younger than fresh_for are
+    served without touching the network; older ones are revalidated with a
+    conditional GET, so an unchanged resource costs a 304 instead of a full download.
+    Accession-addressed filing documents are immutable and never revalidated.
+    """
+
+    def __init__(self, directory: Path, fresh_for: timedelta = timedelta(hours=1)):
+        self.directory = Path(directory)
+        self.fresh_for = fresh_for
+        self.stats = {"hits": 0, "revalidated": 0, "downloads": 0, "stale_fallbacks": 0}
+        self._lock = threading.Lock()
+
+    # === Public API ===
+
+    def open(self, session: requests.Session, url: str, headers: Optional[Dict[str, str]] = None) -> BinaryIO:
+        """Returns a binary file object over the (decompressed) body of url."""
+        body_path, _ = self._fetch(session, url, headers or {})
+        return gzip.open(body_path, "rb")
+
+    def get_bytes(self, session: requests.Session, url: str, headers: Optional[Dict[str, str]] = None) -> bytes:
+        with self.open(session, url, headers) as f:
+            return f.read()
+
+    # Decode like requests' Response.text, using the encoding recorded when the body was stored
+    def get_text(self, session: requests.Session, url: str, headers: Optional[Dict[str, str]] = None) -> str:
+        body_path, meta = self._fetch(session, url, headers or {})
+        with gzip.open(body_path, "rb") as f:
+            return f.read().decode(meta.get("encoding") or "utf-8", errors="replace")
+
+    def peek_text(self, url: str, allow_partial: bool = False) -> Optional[str]:
+        """
+        Text of url if the cache can serve it without a request (immutable or still
+        fresh), else None. allow_partial also accepts a stored prefix (see put_bytes).
+        """
+        for key in (url, url + _PARTIAL) if allow_partial else (url,):
+            body_path, meta_path = self._paths(key)
+            meta = self._read_meta(meta_path, body_path)
+            if meta is None:
+                continue
+            if meta.get("immutable") or time.time() - meta["stored_at"] < self.fresh_for.total_seconds():
+                self._count("hits")
+                with gzip.open(body_path, "rb") as f:
+                    return f.read().decode(meta.get("encoding") or "utf-8", errors="replace")
+        return None
+
+    def put_bytes(self, url: str, body: bytes, encoding: Optional[str], partial: bool = False):
+        """
+        Store a body read elsewhere (e.g. while streaming). A partial body is the
+        leading part of the document; it is kept apart from the full entry and only
+        served by peek_text(url, allow_partial=True).
+        """
+        key = url + _PARTIAL if partial else url
+        body_path, meta_path = self._paths(key)
+        body_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_body = body_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp_body, "wb", compresslevel=5) as out:
+            out.write(body)
+        os.replace(tmp_body, body_path)
+        self._write_meta(meta_path, {"url": url, "partial": partial, "etag": None, "last_modified": None,
+                                     "encoding": encoding, "immutable": self.is_immutable(url),
+                                     "stored_at": time.time()})
+
+    def invalidate(self, url: str):
+        body_path, meta_path = self._paths(url)
+        for path in (meta_path, body_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def is_immutable(url: str) -> bool:
+        return bool(_IMMUTABLE_URL.search(url))
+
+    # === Internals ===
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        folder = self.directory / key[:2]
+        return folder / f"{key}.gz", folder / f"{key}.json"
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _read_meta(self, meta_path: Path, body_path: Path) -> Optional[dict]:
+        if not (meta_path.exists() and body_path.exists()):
+            return None
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _fetch(self, session: requests.Session, url: str, headers: Dict[str, str]):
+        body_path, meta_path = self._paths(url)
+        meta = self._read_meta(meta_path, body_path)
+
+        if meta is not None:
+            if meta.get("immutable") or time.time() - meta["stored_at"] < self.fresh_for.total_seconds():
+                self._count("hits")
+                return body_path, meta
+            # Conditional request: the server answers 304 if our copy is still current
+            if meta.get("etag"):
+                headers = {**headers, "If-None-Match": meta["etag"]}
+            if meta.get("last_modified"):
+                headers = {**headers, "If-Modified-Since": meta["last_modified"]}
+
+        # An EdgarClient applies its own (connect, read) timeouts; a plain session gets the flat fallback
+        timeout = getattr(session, "timeout", FALLBACK_TIMEOUT)
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if meta is not None and response.status_code == 304:
+                    meta["stored_at"] = time.time()
+                    self._write_meta(meta_path, meta)
+                    self._count("revalidated")
+                    return body_path, meta
+                response.raise_for_status()
+                meta = self._store(response, url, body_path, meta_path)
+                self._count("downloads")
+                return body_path, meta
+        except requests.RequestException as e:
+            # Serve a stale copy rather than failing when SEC is unreachable
+            if meta is not None:
+                print(f"[Warning] Using cached copy of {url}: {e}")
+                self._count("stale_fallbacks")
+                return body_path, meta
+            raise
+
+    # Stream the body straight into a compressed temp file, then swap it in atomically
+    def _store(self, response: requests.Response, url: str, body_path: Path, meta_path: Path) -> dict:
+        body_path.parent.mkdir(parents=True, exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp_body = body_path.with_suffix(suffix)
+        response.raw.decode_content = True
+        with gzip.open(tmp_body, "wb", compresslevel=5) as out:
+            shutil.copyfileobj(response.raw, out, 1024 * 1024)
+        os.replace(tmp_body, body_path)
+
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "encoding": response.encoding,
+            "immutable": self.is_immutable(url),
+            "stored_at": time.time(),
+        }
+        self._write_meta(meta_path, meta)
+        return meta
+
+    def _write_meta(self, meta_path: Path, meta: dict):
+        tmp_meta = meta_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, meta_path)
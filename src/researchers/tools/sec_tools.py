@@ -1,5 +1,5 @@
+import codecs
 import os
-import pandas as pd
 from dotenv import load_dotenv
 from openai import OpenAI
 
@@ -8,106 +8,370 @@ load_dotenv()
 from pathlib import Path
 from sec_cik_mapper import StockMapper
 
-from bs4 import BeautifulSoup
 import re
 import requests
 import json
-from datetime import datetime
-
-def ticker_to_cik(ticker: str) -> str:
-    mapper = StockMapper()
-    if ticker.upper() in mapper.ticker_to_cik:
-        print(f"Ticker {ticker} CIK={mapper.ticker_to_cik[ticker]}")
-        CIK = mapper.ticker_to_cik[ticker]
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+try:
+    from tools.sec_cache import SecHttpCache
+    from tools.edgar_client import EdgarClient
+    from tools.bulk_store import BulkStore
+    from tools.llm_cache import LlmResultCache
+    from tools.fact_store import FactTable, as_fact_index
+    from tools.filing_text import SectionIndex, diff_paragraphs, stream_section_index
+    from tools.filing_parser import DEFAULT_PARSE_WORKERS, FilingParser, index_full_submission, index_html_document
+    from tools.section_archive import SectionArchive
+    from tools.edgar_index import FilingIndexMirror
+except ImportError:
+    from researchers.tools.sec_cache import SecHttpCache
+    from researchers.tools.edgar_client import EdgarClient
+    from researchers.tools.bulk_store import BulkStore
+    from researchers.tools.llm_cache import LlmResultCache
+    from researchers.tools.fact_store import FactTable, as_fact_index
+    from researchers.tools.filing_text import SectionIndex, diff_paragraphs, stream_section_index
+    from researchers.tools.filing_parser import DEFAULT_PARSE_WORKERS, FilingParser, index_full_submission, index_html_document
+    from researchers.tools.section_archive import SectionArchive
+    from researchers.tools.edgar_index import FilingIndexMirror
+
+# optional incremental JSON parser for large companyfacts payloads
+try:
+    import ijson
+except Exception:
+    ijson = None
+
+# Document table rows of a filing's -index.htm page
+_INDEX_ROW = re.compile(r"<tr[^>]*>(.*?)</tr>", re.IGNORECASE | re.DOTALL)
+_INDEX_CELL = re.compile(r"<td[^>]*>(.*?)</td>", re.IGNORECASE | re.DOTALL)
+_INDEX_TAG = re.compile(r"<[^>]+>")
+
+# Errors that can surface while downloading or decoding a streamed payload
+_STREAM_ERRORS = (requests.RequestException, OSError, ValueError) + ((ijson.JSONError,) if ijson is not None else ())
+
+# Local directory for persisted SEC data (override with SEC_CACHE_DIR)
+SEC_CACHE_DIR = Path(os.getenv("SEC_CACHE_DIR", Path.home() / ".cache" / "sec_tools"))
+
+# Shared across every flow in the process so batch runs reuse connections and the ticker mapping
+_SHARED_LOCK = threading.Lock()
+_EDGAR_CLIENT = None
+_SEC_CACHE = None
+_LLM_CACHE = None
+_BULK_STORE = None
+_FILING_PARSER = None
+
+# Pooled, rate-limited client used for all SEC requests (User-Agent from SEC_USER_AGENT)
+def edgar_client() -> EdgarClient:
+    global _EDGAR_CLIENT
+    with _SHARED_LOCK:
+        if _EDGAR_CLIENT is None:
+            _EDGAR_CLIENT = EdgarClient(rate=float(os.getenv("SEC_RATE_LIMIT", 10)))
+        return _EDGAR_CLIENT
+
+# Use a specific client (e.g. another User-Agent or a lower rate) for every later SEC request
+def configure_edgar_client(client: EdgarClient):
+    global _EDGAR_CLIENT
+    with _SHARED_LOCK:
+        _EDGAR_CLIENT = client
+
+# Process pool for filing parsing (see filing_parser.py); SEC_PARSE_WORKERS=0 parses in the calling thread
+def filing_parser() -> FilingParser:
+    global _FILING_PARSER
+    with _SHARED_LOCK:
+        if _FILING_PARSER is None:
+            _FILING_PARSER = FilingParser(int(os.getenv("SEC_PARSE_WORKERS", DEFAULT_PARSE_WORKERS)))
+        return _FILING_PARSER
+
+# Use a different number of parsing processes from now on (the old pool is shut down)
+def configure_filing_parser(workers: int):
+    global _FILING_PARSER
+    with _SHARED_LOCK:
+        old, _FILING_PARSER = _FILING_PARSER, FilingParser(workers)
+    if old is not None:
+        old.shutdown()
+
+# Compressed on-disk cache in front of every SEC download (see sec_cache.py)
+def _sec_cache() -> SecHttpCache:
+    global _SEC_CACHE
+    with _SHARED_LOCK:
+        if _SEC_CACHE is None:
+            _SEC_CACHE = SecHttpCache(SEC_CACHE_DIR / "http")
+        return _SEC_CACHE
+
+# Companyfacts/submissions bulk archives indexed by bulk_store.py; used instead of the API when ingested,
+# as long as the archive is younger than SEC_BULK_MAX_AGE hours (SEC rebuilds them nightly)
+BULK_STORE_DIR = SEC_CACHE_DIR / "bulk"
+BULK_MAX_AGE = timedelta(hours=float(os.getenv("SEC_BULK_MAX_AGE", 36)))
+# Filing lists (latest 10-K, ...) read the submissions archive only inside use_bulk_filings(); a context
+# variable, so it is scoped to the batch that set it (worker threads must run in a copy of its context)
+_BULK_FILINGS: ContextVar[bool] = ContextVar("sec_bulk_filings", default=False)
+
+def bulk_store() -> BulkStore:
+    global _BULK_STORE
+    with _SHARED_LOCK:
+        if _BULK_STORE is None:
+            _BULK_STORE = BulkStore(BULK_STORE_DIR)
+        return _BULK_STORE
+
+# Within the block, filing lookups may read the bulk submissions archive (e.g. while scoring a whole
+# batch or universe); otherwise they go through the HTTP cache, so a new 10-K shows up without re-ingesting
+@contextmanager
+def use_bulk_filings(enabled: bool = True):
+    token = _BULK_FILINGS.set(enabled)
+    try:
+        yield
+    finally:
+        _BULK_FILINGS.reset(token)
+
+# Binary stream over a company's companyfacts or submissions JSON, from the bulk archive if it has the CIK
+# and is younger than max_age (default BULK_MAX_AGE), otherwise from the HTTP cache
+def _open_sec_json(kind: str, CIK: str, url: str, headers: Optional[Dict[str, str]] = None,
+                   max_age: Optional[timedelta] = None):
+    fp = bulk_store().open(kind, CIK, max_age or BULK_MAX_AGE)
+    if fp is not None:
+        return fp
+    return _sec_cache().open(edgar_client(), url, headers)
+
+# LLM results per filing (e.g. risk/MD&A ratings), reused until the company files a new 10-K
+def get_llm_cache() -> LlmResultCache:
+    global _LLM_CACHE
+    with _SHARED_LOCK:
+        if _LLM_CACHE is None:
+            _LLM_CACHE = LlmResultCache(SEC_CACHE_DIR / "llm")
+        return _LLM_CACHE
+
+# === Ticker <-> CIK index ===
+CIK_INDEX_PATH = SEC_CACHE_DIR / "cik_index.json"
+CIK_INDEX_MAX_AGE = timedelta(days=7)  # SEC updates company_tickers.json daily, new listings are rare
+# Own lock: a cold build downloads the ticker file, which must not block the other shared singletons
+_CIK_INDEX_LOCK = threading.Lock()
+_CIK_INDEX = None
+
+class CikIndex:
+    """
+    Two-way ticker <-> CIK lookup built from the SEC ticker mapping.
+    Tickers are stored upper-case and CIKs as 10-digit zero-padded strings.
+    """
+    def __init__(self, ticker_to_cik: Dict[str, str], built_at: Optional[float] = None):
+        self.built_at = built_at or time.time()
+        self.ticker_to_cik = {t.upper(): str(c).zfill(10) for t, c in ticker_to_cik.items()}
+        self.cik_to_tickers: Dict[str, List[str]] = {}
+        for ticker, cik in sorted(self.ticker_to_cik.items()):
+            self.cik_to_tickers.setdefault(cik, []).append(ticker)
+
+    # Build from sec_cik_mapper (downloads the full SEC ticker file)
+    @classmethod
+    def from_stock_mapper(cls) -> "CikIndex":
+        return cls(dict(StockMapper().ticker_to_cik))
+
+    @classmethod
+    def load(cls, path: Path) -> "CikIndex":
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["ticker_to_cik"], built_at=data["built_at"])
+
+    # Write to a temp file first so concurrent readers never see a partial index
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"built_at": self.built_at, "ticker_to_cik": self.ticker_to_cik}, f)
+        os.replace(tmp, path)
+
+    def age(self) -> timedelta:
+        return timedelta(seconds=time.time() - self.built_at)
+
+    def cik(self, ticker: str) -> Optional[str]:
+        return self.ticker_to_cik.get(ticker.strip().upper())
+
+    def tickers(self, cik) -> List[str]:
+        return self.cik_to_tickers.get(str(cik).zfill(10), [])
+
+def get_cik_index(refresh: bool = False, path: Path = CIK_INDEX_PATH, max_age: timedelta = CIK_INDEX_MAX_AGE) -> CikIndex:
+    """
+    Returns the process-wide ticker <-> CIK index, loading it at most once.
+    A persisted index younger than max_age is reused; otherwise (or with refresh=True)
+    it is rebuilt from the SEC ticker mapping and written back to path.
+    """
+    global _CIK_INDEX
+    with _CIK_INDEX_LOCK:
+        if _CIK_INDEX is not None and not refresh and _CIK_INDEX.age() < max_age:
+            return _CIK_INDEX
+
+        index = None
+        if not refresh and path.exists():
+            try:
+                index = CikIndex.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[Warning] Ignoring unreadable CIK index {path}: {e}")
+            if index is not None and index.age() >= max_age:
+                index = None
+
+        if index is None:
+            index = CikIndex.from_stock_mapper()
+            try:
+                index.save(path)
+            except OSError as e:
+                print(f"[Warning] Could not persist CIK index to {path}: {e}")
+
+        _CIK_INDEX = index
+        return index
+
+def ticker_to_cik(ticker: str) -> Optional[str]:
+    CIK = get_cik_index().cik(ticker)
+    if CIK:
+        print(f"Ticker {ticker} CIK={CIK}")
     else:
         print(f"Ticker {ticker} not found")
     return CIK
 
-def get_recent_facts(CIK: str):
-    """
-    Fetches the most recent 10-Q or 10-K filing facts from SEC's companyfacts API.
-    Returns a list of fact entries (concept, unit, value, end_date).
-    """
-    # 1. Configuration
-    URL = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{CIK.zfill(10)}.json"
-    USER_AGENT = "Your Name (your.email@example.com)"  # <-- REQUIRED by SEC
-
-    # 2. Fetch Data
-    try:
-        headers = {"User-Agent": USER_AGENT}
-        response = requests.get(URL, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-    except requests.RequestException as e:
-        print(f"[Error] Could not fetch data for CIK {CIK}: {e}")
-        return []
+# Bulk lookup, returns {ticker: CIK or None} in input order
+def tickers_to_ciks(tickers: Iterable[str]) -> Dict[str, Optional[str]]:
+    index = get_cik_index()
+    return {ticker: index.cik(ticker) for ticker in tickers}
+
+def cik_to_tickers(cik: str) -> List[str]:
+    return get_cik_index().tickers(cik)
+
+# Concepts read by the calc_* ratio functions, usable as get_recent_facts(concept_filter=...)
+def is_ratio_concept(concept_name: str) -> bool:
+    name = concept_name.lower()
+    return (
+        name.startswith("revenue")
+        or "netincome" in name
+        or "longtermdebt" in name
+        or "shorttermborrowings" in name
+        or name == "stockholdersequity"
+    )
 
-    # 3. Identify the most recent 10-Q or 10-K accession number
-    latest_filing_accn = None
-    latest_filed_date = datetime.min
-    latest_form = None
+# Yield (concept_name, concept) pairs under facts.us-gaap one at a time from a binary stream
+def _iter_usgaap_concepts(fp):
+    if ijson is None:
+        # Without ijson fall back to decoding the whole document
+        yield from json.load(fp).get("facts", {}).get("us-gaap", {}).items()
+        return
+    yield from ijson.kvitems(fp, "facts.us-gaap", use_float=True)
 
-    facts = data.get("facts", {}).get("us-gaap", {})
+def _latest_filing_facts(concepts, concept_filter=None):
+    """
+    Single pass over (concept_name, concept) pairs that finds the most recently filed
+    10-Q or 10-K and collects its facts. Only facts of accessions tied for the latest
+    filed date seen so far are kept; ISO dates are compared as strings.
+    Returns (form, accession, filed, facts) or None when no 10-Q/10-K facts exist.
+    """
+    best_filed = ""
+    # accession -> (form, facts); several filings can share a filed date, the first one seen wins
+    candidates = {}
 
-    for concept in facts.values():
-        if "units" not in concept:
+    for concept_name, concept in concepts:
+        units = concept.get("units")
+        if not units:
             continue
-        for unit_facts in concept["units"].values():
+        keep_concept = concept_filter is None or concept_filter(concept_name)
+        for unit_name, unit_facts in units.items():
             for fact in unit_facts:
                 form = fact.get("form", "")
                 # Skip other forms not 10-Q or 10-K
                 if form not in ("10-Q", "10-K"):
                     continue
 
-                filed_date_str = fact.get("filed")
-                if not filed_date_str:
+                filed = fact.get("filed") or ""
+                if len(filed) != 10 or filed < best_filed:
                     continue
+                if filed > best_filed:
+                    best_filed = filed
+                    candidates = {}
+
+                accn = fact.get("accn")
+                entry = candidates.setdefault(accn, (form, []))
+                if keep_concept:
+                    entry[1].append({
+                        "concept": concept_name,
+                        "unit": unit_name,
+                        "value": fact.get("val"),
+                        "end_date": fact.get("end"),
+                        "form": form,
+                        "accn": accn
+                    })
 
-                try:
-                    filed_date = datetime.strptime(filed_date_str, "%Y-%m-%d")
-                except ValueError:
-                    continue
+    if not candidates:
+        return None
+    accn, (form, facts) = next(iter(candidates.items()))
+    return form, accn, best_filed, facts
 
-                if filed_date > latest_filed_date:
-                    latest_filed_date = filed_date
-                    latest_filing_accn = fact.get("accn")
-                    latest_form = form
+def get_recent_facts(CIK: str, concept_filter=None):
+    """
+    Fetches the most recent 10-Q or 10-K filing facts from SEC's companyfacts API.
+    Returns a list of fact entries (concept, unit, value, end_date).
+    The payload is parsed as a stream in one pass, so only the candidate filing's
+    facts are held in memory. Pass concept_filter (e.g. is_ratio_concept) to keep
+    only the concepts you need.
+    """
+    # 1. Configuration
+    URL = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{CIK.zfill(10)}.json"
 
-    if not latest_filing_accn:
-        print(f"[Warning] No 10-Q or 10-K filings found for CIK {CIK}.")
+    # 2. Fetch and scan data (the EDGAR client sends the User-Agent SEC requires)
+    try:
+        with _open_sec_json("companyfacts", CIK, URL) as fp:
+            latest = _latest_filing_facts(_iter_usgaap_concepts(fp), concept_filter)
+    except _STREAM_ERRORS as e:
+        print(f"[Error] Could not fetch data for CIK {CIK}: {e}")
         return []
 
-    print(f"Most recent filing for CIK {CIK}: Form {latest_form}, Accession {latest_filing_accn}, Filed on {latest_filed_date.date()}")
+    if latest is None:
+        print(f"[Warning] No 10-Q or 10-K filings found for CIK {CIK}.")
+        return []
 
-    # 4. Extract all facts from the most recent filing
-    most_recent_facts = []
-    for concept_name, concept in facts.items():
-        if "units" not in concept:
-            continue
-        for unit_name, unit_facts in concept["units"].items():
-            for fact in unit_facts:
-                if fact.get("accn") == latest_filing_accn:
-                    most_recent_facts.append({
-                        "concept": concept_name,
-                        "unit": unit_name,
-                        "value": fact.get("val"),
-                        "end_date": fact.get("end"),
-                        "form": fact.get("form"),
-                        "accn": fact.get("accn")
-                    })
+    latest_form, latest_filing_accn, latest_filed_date, most_recent_facts = latest
+    print(f"Most recent filing for CIK {CIK}: Form {latest_form}, Accession {latest_filing_accn}, Filed on {latest_filed_date}")
     return most_recent_facts
 
+# === Per-CIK columnar fact store ===
+FACT_STORE_DIR = SEC_CACHE_DIR / "facts"
+FACT_STORE_MAX_AGE = timedelta(days=1)
+
+def load_fact_table(CIK: str, refresh: bool = False, max_age: timedelta = FACT_STORE_MAX_AGE) -> FactTable:
+    """
+    Returns every us-gaap fact for a company as a memory-mapped FactTable.
+    The table is built from companyfacts in one streaming pass and saved under
+    FACT_STORE_DIR/CIK##########, so later runs (and other processes) just map the
+    column files. Use .latest_filing() for the facts get_recent_facts returns.
+    """
+    directory = FACT_STORE_DIR / f"CIK{CIK.zfill(10)}"
+    if not refresh and (directory / "meta.json").exists():
+        try:
+            table = FactTable.load(directory)
+            if time.time() - table.meta["built_at"] < max_age.total_seconds():
+                return table
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[Warning] Rebuilding unreadable fact store {directory}: {e}")
+
+    URL = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{CIK.zfill(10)}.json"
+    with _open_sec_json("companyfacts", CIK, URL) as fp:
+        table = FactTable.from_companyfacts(_iter_usgaap_concepts(fp))
+    try:
+        table.save(directory, cik=CIK.zfill(10))
+        return FactTable.load(directory)
+    except OSError as e:
+        print(f"[Warning] Could not persist fact store for CIK {CIK}: {e}")
+        return table
+
+# Each calc_* function accepts a FactIndex (build it once per filing and share it),
+# a FactTable or the list returned by get_recent_facts
+
 # Calculate year-over-year revenue growth
 def calc_yoy_rev(facts):
-    # Filter the data for total revenue
-    revenue_data = [item for item in facts if item['concept'].lower()[:7] == 'revenue']
-
-    curr_end = max([item['end_date'] for item in revenue_data])
-    prev_end = min([item['end_date'] for item in revenue_data])
+    # Total revenue concepts
+    revenue = as_fact_index(facts).prefix('revenue')
 
     # Sum the quarterly values by year
-    revenue_prev = sum(item['value'] for item in revenue_data if item['end_date'] == prev_end)
-    revenue_curr = sum(item['value'] for item in revenue_data if item['end_date'] == curr_end)
+    revenue_prev = revenue.sum_at(revenue.earliest_end)
+    revenue_curr = revenue.sum_at(revenue.latest_end)
 
     # Calculate the YoY growth
     if revenue_prev > 0:
@@ -115,11 +379,6 @@ def calc_yoy_rev(facts):
     else:
         yoy_growth = float('inf') if revenue_curr > 0 else 0
 
-    # # Print the results
-    # print(f"Total Revenue for 2024: ${revenue_prev:,}")
-    # print(f"Total Revenue for 2025: ${revenue_curr:,}")
-    # print(f"Year-over-Year Revenue Growth: {yoy_growth:.2f}%")
-
     # 5 if greater than 15, 1 if less than 5, sliding scale between
     if yoy_growth > 15:
         return_val = 5
@@ -132,22 +391,16 @@ def calc_yoy_rev(facts):
 
 # Calculate profit percent
 def calc_profit(facts):
-    revenue_data = [item for item in facts if item['concept'].lower()[:7] == 'revenue']
-    curr_end = max([item['end_date'] for item in revenue_data])
-    revenue_curr = sum(item['value'] for item in revenue_data if item['end_date'] == curr_end)
-
-    profit_data = [item for item in facts if 'netincome' in item['concept'].lower()]
-    curr_end = max([item['end_date'] for item in profit_data])
+    index = as_fact_index(facts)
+    revenue = index.prefix('revenue')
+    revenue_curr = revenue.sum_at(revenue.latest_end)
 
     # Sum the quarterly values by year
-    net_income = sum(item['value'] for item in profit_data if item['end_date'] == curr_end)
-
-    # print(f"{net_income:,} {revenue_curr:,}")
+    profit = index.contains('netincome')
+    net_income = profit.sum_at(profit.latest_end)
 
     net_profit_margin = (net_income / revenue_curr) * 100
 
-    # print(net_profit_margin)
-
     if net_profit_margin > 10:
         return_val = 5
     elif net_profit_margin < 5:
@@ -155,40 +408,43 @@ def calc_profit(facts):
     else:
         return_val = net_profit_margin / 5
 
-    # print(f"{return_val:.2f}")
     return {'net_profit_margin': net_profit_margin, 'rating': return_val, 'description': "Net profit margin as a percentage"}
 
 # Calculate debt to equity ratio
 def calc_debt_to_equity(facts):
+    index = as_fact_index(facts)
     total_debt = 0
+    curr_end = None
 
     for item_name in ['LongTermDebtNoncurrent', 'LongTermDebtCurrent', 'ShortTermBorrowings']:
-        debt_data = [item for item in facts if (item_name.lower() in item['concept'].lower())]
-        if debt_data:
-            curr_end = max([item['end_date'] for item in debt_data])
-            debt_data = [item for item in facts if (item_name.lower() in item['concept'].lower()) and (item['end_date'] == curr_end)]
+        debt = index.contains(item_name)
+        # Equity is read at the end date of the last debt concept that has data
+        if len(debt):
+            curr_end = debt.latest_end
+            debt_values = debt.values_at(curr_end)
+        else:
+            debt_values = debt.value
 
-        if len(debt_data) == 1:
-            debt_item = debt_data[0]['value']
+        if len(debt_values) == 1:
+            debt_item = float(debt_values[0])
         else:
             debt_item = 0
         total_debt += debt_item
 
-    # print(total_debt)
+    if curr_end is None:
+        raise ValueError("No debt facts found to compute debt to equity")
 
-    se_data = [item for item in facts if ('StockholdersEquity'.lower() == item['concept'].lower()) and (item['end_date'] == curr_end)]
-    curr_end = max([item['end_date'] for item in se_data])
-    se_data = [item for item in facts if ('StockholdersEquity'.lower() == item['concept'].lower()) and (item['end_date'] == curr_end)]
+    se_values = index.concept('StockholdersEquity').values_at(curr_end)
+    if not len(se_values):
+        raise ValueError(f"No StockholdersEquity fact reported for {curr_end}")
 
-    if len(se_data) == 1:
-        se = se_data[0]['value']
+    if len(se_values) == 1:
+        se = float(se_values[0])
     else:
         se = 0
 
     debt_to_equity = total_debt / se
 
-    #print(se)
-
     if debt_to_equity < 0.5:
         return_val = 5
     elif debt_to_equity > 1:
@@ -196,21 +452,12 @@ def calc_debt_to_equity(facts):
     else:
         return_val = (-8 * debt_to_equity) + 9
 
-    # print(f"D_E={debt_to_equity} {return_val}")
     return {'debt_to_equity': debt_to_equity, 'rating': return_val, 'description': "Debt to equity ratio"}
 
 # Calculate if net income is positive
 def calc_positive_netincome(facts):
-    for item_name in ['NetIncomeLoss']:
-        
-        cash_data = [item for item in facts if (item_name.lower() in item['concept'].lower())]
-
-        curr_end = max([item['end_date'] for item in cash_data])
-
-        net_income = sum(item['value'] for item in cash_data if item['end_date'] == curr_end)
-
-        if net_income == None:
-            net_income = 0
+    net_income_facts = as_fact_index(facts).contains('NetIncomeLoss')
+    net_income = net_income_facts.sum_at(net_income_facts.latest_end)
 
     if net_income > 0:
         return_val = 5
@@ -219,28 +466,48 @@ def calc_positive_netincome(facts):
     else:
         return_val = 3
 
-    # print(net_income, return_val)
     return {'net_income': net_income, 'rating': return_val, 'description': "Positive net income"}
 
-def get_latest_10k_text_url(cik: str, user_agent: str):
-    # Step 1: fetch the submissions JSON
+def get_filings(cik: str, form: str = "10-K", user_agent: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+    """
+    Filings of one form type (e.g. "10-K" or "10-Q", amendments excluded), newest
+    first, each with its document URLs and filing date. Served from the local
+    filing index mirror when it has been built and holds the `limit` filings asked
+    for (it only covers recent years, so limit=None always reads the full list),
+    otherwise from the submissions JSON (from the bulk archive only inside
+    use_bulk_filings()). Mirror filings look up their primary document (html_url)
+    only when it is first read.
+    """
+    mirror = filing_index() if user_agent is None and limit is not None else None
+    if mirror is not None:
+        rows = mirror.filings_for(cik, form)[:limit]
+        if len(rows) >= limit:
+            return [_MirrorFiling(cik, row["accession"], row["filed"], form) for row in rows]
+
+    # Step 1: fetch the submissions JSON (user_agent overrides the client's for this request)
     padded = cik.zfill(10)
     submissions_url = f"https://data.sec.gov/submissions/CIK{padded}.json"
-    headers = {"User-Agent": user_agent}
-    resp = requests.get(submissions_url, headers=headers)
-    resp.raise_for_status()
-    data = resp.json()
-    
-    # Step 2: find the latest 10-K filing metadata
-    filings = pd.DataFrame(data['filings']['recent'])
-    # filter by form “10-K” (not “10-K/A”) — you might adapt that logic
-    tenk_rows = filings[filings['form'] == '10-K']
-    if tenk_rows.empty:
-        raise ValueError("No 10-K filings found for this CIK")
-    latest = tenk_rows.iloc[0]
-    accession = latest['accessionNumber']
-    primary_doc = latest['primaryDocument']
-    
+    headers = {"User-Agent": user_agent} if user_agent else None
+    if _BULK_FILINGS.get():
+        fp = _open_sec_json("submissions", padded, submissions_url, headers)
+    else:
+        fp = _sec_cache().open(edgar_client(), submissions_url, headers)
+    with fp:
+        recent = json.load(fp)['filings']['recent']
+
+    # Step 2: find the filing metadata (the arrays are parallel, newest first)
+    rows = [
+        (accession, primary_doc, filed)
+        for accession, primary_doc, filed, row_form in zip(
+            recent['accessionNumber'], recent['primaryDocument'], recent['filingDate'], recent['form'])
+        if row_form == form
+    ][:limit]
+    return [{**_filing_urls(cik, accession, primary_doc), "filed": filed} for accession, primary_doc, filed in rows]
+
+def get_10k_filings(cik: str, user_agent: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+    return get_filings(cik, "10-K", user_agent, limit)
+
+def _filing_urls(cik: str, accession: str, primary_doc: str) -> dict:
     # Step 3: build paths
     accession_nodash = accession.replace('-', '')
     cik_int = int(cik)  # for path part
@@ -265,98 +532,289 @@ def get_latest_10k_text_url(cik: str, user_agent: str):
         "primary_document": primary_doc
     }
 
-# Get risks and MNA from most recent 10-K since these are often not listed in 10-Q
-def get_risks_mna(CIK: str):
-    txt_url = get_latest_10k_text_url(cik=CIK, user_agent="Your Name (your.email@example.com)")["txt_url"]
-    headers = {"User-Agent": "Your Name (your.email@example.com)"}
-
-    #print(txt_url)
-
-    # Step 4: Download and extract Risk Factors section
-    txt = requests.get(txt_url, headers=headers).text
-
-    soup = BeautifulSoup(txt, "html.parser")
-    clean_text = soup.get_text(separator=' ', strip=True)
-
-    # Pattern for locating "Item 1A – Risk Factors" and its next section start
-    pattern_risk_start = re.compile(
-        r"(?i)item\s*1A\.[^a-zA-Z0-9]{0,10}",
-        re.IGNORECASE
-    )
-    pattern_next_section = re.compile(
-        r"(?is)item\s*(1B|2)[^a-zA-Z0-9]{0,10}"
-    )
-
-    # Find all matches (returns Match objects)
-    matches_1a = list(pattern_risk_start.finditer(clean_text))
-    matches_1b2 = list(pattern_next_section.finditer(clean_text))
-
-    match_1a_list = []
-    match_1b2_list = []
-
-    if matches_1a:
-        for i, match in enumerate(matches_1a, start=1):
-            match_1a_list.append(match.start())
-    else:
-        print("No Item 1A – Risk Factors occurrences found.")
-
-    if matches_1b2:
-        for i, match in enumerate(matches_1b2, start=1):
-            match_1b2_list.append(match.start())
-    else:
-        print("No Item 1B or Item 2 occurrences found.")
-
-    # print(match_1a_list)
-    # print(match_1b2_list)
-
-    start_pos = match_1a_list[1]
-
-    for item_pos in match_1b2_list:
-        if item_pos > start_pos:
-            end_pos = item_pos
-            break
-
-    # print(start_pos, end_pos)
-
-    risk_text = clean_text[start_pos:end_pos]
-
-    # Pattern for locating "Item 7" and its next section start
-    pattern_risk_start = re.compile(
-        r"(?i)item\s*7\.[^a-zA-Z0-9]{0,10}"
-    )
-    pattern_next_section = re.compile(
-        r"(?is)item\s*8\.[^a-zA-Z0-9]{0,10}"
-    )
-
-    matches_7 = list(pattern_risk_start.finditer(clean_text))
-    matches_8 = list(pattern_next_section.finditer(clean_text))
-
-    match_7_list = []
-    match_8_list = []
-
-    if matches_7:
-        for i, match in enumerate(matches_1a, start=1):
-            match_7_list.append(match.start())
-    else:
-        print("No Item 7 occurrences found.")
-
-    if matches_8:
-        for i, match in enumerate(matches_8, start=1):
-            match_8_list.append(match.start())
+def get_latest_10k_text_url(cik: str, user_agent: Optional[str] = None):
+    filings = get_10k_filings(cik, user_agent, limit=1)
+    if not filings:
+        raise ValueError("No 10-K filings found for this CIK")
+    return filings[0]
+
+# Accession number of the latest filing of a form; a dictionary lookup when the filing index mirror is built
+def latest_accession(CIK: str, form: str = "10-K") -> str:
+    mirror = filing_index()
+    latest = mirror.latest(CIK, form) if mirror is not None else None
+    if latest is not None:
+        return latest["accession"]
+    filings = get_filings(CIK, form, limit=1)
+    if not filings:
+        raise ValueError(f"No {form} filings found for CIK {CIK}")
+    return filings[0]["accession"]
+
+def latest_10k_accession(CIK: str) -> str:
+    return latest_accession(CIK, "10-K")
+
+# === Local EDGAR filing index mirror (see edgar_index.py) ===
+FILING_INDEX_PATH = SEC_CACHE_DIR / "filing_index.json"
+FILING_INDEX_MAX_AGE = timedelta(days=1)
+_FILING_INDEX_LOCK = threading.Lock()
+_FILING_INDEX = None
+_FILING_INDEX_RETRY_AT = 0.0
+
+def filing_index() -> Optional[FilingIndexMirror]:
+    """
+    The filing index mirror, or None if it was never built. Once a day the first
+    caller applies the daily index files published since the last update.
+    """
+    global _FILING_INDEX, _FILING_INDEX_RETRY_AT
+    with _FILING_INDEX_LOCK:
+        if _FILING_INDEX is None:
+            if not FILING_INDEX_PATH.exists():
+                return None
+            try:
+                _FILING_INDEX = FilingIndexMirror.load(FILING_INDEX_PATH)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[Warning] Ignoring unreadable filing index {FILING_INDEX_PATH}: {e}")
+                return None
+
+        mirror = _FILING_INDEX
+        stale = time.time() - mirror.updated_at > FILING_INDEX_MAX_AGE.total_seconds()
+        if stale and time.time() >= _FILING_INDEX_RETRY_AT:
+            try:
+                added = mirror.update(edgar_client())
+                mirror.save()
+                print(f"Filing index updated with {added:,} new filings")
+            except (requests.RequestException, OSError, ValueError) as e:
+                # Keep serving the mirror as it is; try again in an hour
+                print(f"[Warning] Could not update filing index: {e}")
+                _FILING_INDEX_RETRY_AT = time.time() + 3600
+        return mirror
+
+class _MirrorFiling(dict):
+    """
+    A get_filings entry from the filing index mirror, which doesn't list primary
+    documents: html_url and primary_document are read from the filing's -index.htm
+    page the first time either is accessed, so accession-only callers stay offline.
+    """
+    _LAZY_KEYS = ("html_url", "primary_document")
+
+    def __init__(self, cik: str, accession: str, filed: str, form: str):
+        super().__init__(txt_url=_filing_urls(cik, accession, "")["txt_url"], accession=accession, filed=filed)
+        self._cik = cik
+        self._form = form
+
+    def __missing__(self, key):
+        if key not in self._LAZY_KEYS:
+            raise KeyError(key)
+        self.update(_filing_urls(self._cik, self["accession"], _primary_document(self._cik, self["accession"], self._form)))
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self or key in self._LAZY_KEYS else default
+
+# Primary document of a filing, from its -index.htm page (immutable, so the SEC cache keeps it for good)
+def _primary_document(cik: str, accession: str, form: str) -> str:
+    url = f"https://www.sec.gov/Archives/edgar/data/{int(cik)}/{accession.replace('-', '')}/{accession}-index.htm"
+    page = _sec_cache().get_text(edgar_client(), url)
+    for row in _INDEX_ROW.findall(page):
+        cells = _INDEX_CELL.findall(row)
+        # Columns: Seq | Description | Document | Type | Size
+        if len(cells) >= 4 and _INDEX_TAG.sub("", cells[3]).strip() == form:
+            href = re.search(r'href="([^"]+)"', cells[2])
+            if href:
+                return href.group(1).rsplit("/", 1)[-1]
+    raise ValueError(f"No {form} document listed in {url}")
+
+# === XBRL frames: one concept for every filer in a period ===
+
+def get_frame(concept: str, period: str, unit: str = "USD") -> List[dict]:
+    """
+    Frame rows ({cik, entityName, accn, end, val}) of a us-gaap concept for every
+    filer, e.g. period 'CY2023' (annual), 'CY2023Q4' (quarter) or 'CY2023Q4I'
+    (balance at year end). Empty when SEC publishes no such frame.
+    """
+    url = f"https://data.sec.gov/api/xbrl/frames/us-gaap/{concept}/{unit}/{period}.json"
+    try:
+        with _sec_cache().open(edgar_client(), url) as fp:
+            return json.load(fp).get("data", [])
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return []
+        raise
+
+# Standard Industrial Classification code from the submissions JSON; offline_only reads only the bulk archive
+def get_sic_code(CIK: str, offline_only: bool = False) -> Optional[int]:
+    padded = CIK.zfill(10)
+    if offline_only:
+        fp = bulk_store().open("submissions", padded)
+        if fp is None:
+            return None
     else:
-        print("No Item 8 occurrences found.")
+        fp = _open_sec_json("submissions", padded, f"https://data.sec.gov/submissions/CIK{padded}.json")
+    with fp:
+        if ijson is not None:
+            # "sic" comes before the large "filings" block, so stop as soon as it is read
+            sic = next((value for key, value in ijson.kvitems(fp, "") if key == "sic"), None)
+        else:
+            sic = json.load(fp).get("sic")
+    try:
+        return int(sic) if sic else None
+    except ValueError:
+        return None
+
+# === 10-K sections, archived per CIK and accession ===
+SECTION_ARCHIVE_DIR = SEC_CACHE_DIR / "section_archive"
+# The section archive is the persistent store; only the last few parsed 10-Ks (full text
+# plus heading index) stay in memory, least recently used first
+SECTION_INDEX_MEMORY = 4
+_SECTION_INDEXES: "OrderedDict[str, SectionIndex]" = OrderedDict()
+_SECTION_INDEXES_LOCK = threading.Lock()
+_SECTION_ARCHIVE = None
+
+# Extracted 10-K items, compressed per company with an offset index (see section_archive.py)
+def section_archive() -> SectionArchive:
+    global _SECTION_ARCHIVE
+    with _SHARED_LOCK:
+        if _SECTION_ARCHIVE is None:
+            _SECTION_ARCHIVE = SectionArchive(SECTION_ARCHIVE_DIR)
+        return _SECTION_ARCHIVE
+
+def get_10k_section_index(CIK: str, filing: Optional[dict] = None) -> SectionIndex:
+    """
+    Returns the item heading index of a 10-K (text up to Item 8): the latest one, or
+    filing (an entry of get_10k_filings). The last SECTION_INDEX_MEMORY indexes are kept
+    in memory; the extracted sections are persisted by get_10k_sections. With SEC_PARSE_WORKERS
+    set, parsing runs in the filing parser's worker processes while this thread waits.
+    """
+    filing = filing or get_latest_10k_text_url(cik=CIK)
+    accession = filing["accession"]
 
-    start_pos = match_7_list[1]
+    with _SECTION_INDEXES_LOCK:
+        index = _SECTION_INDEXES.get(accession)
+        if index is not None:
+            _SECTION_INDEXES.move_to_end(accession)
+            return index
 
-    for item_pos in match_8_list:
-        if item_pos > start_pos:
-            end_pos = item_pos
-            break
+    parser = filing_parser()
+    try:
+        if parser.workers:
+            # The document goes to a worker (and the disk cache: filing documents never change);
+            # a prefix cached by an earlier streamed read is enough, as it runs past Item 8
+            cache = _sec_cache()
+            html = cache.peek_text(filing["html_url"], allow_partial=True)
+            if html is None:
+                html = cache.get_text(edgar_client(), filing["html_url"])
+            index = parser.run(index_html_document, html)
+        else:
+            # Parsing in this thread: stream only the primary 10-K document and stop once Item 8 begins
+            index = _stream_primary_document_index(filing["html_url"])
+    except requests.RequestException as e:
+        print(f"[Warning] Could not read {filing['html_url']}: {e}")
+        index = None
+
+    # Fall back to the full submission text (every exhibit included) if the primary document didn't parse
+    if index is None or index.span("1A") is None or index.span("7") is None:
+        print(f"[Warning] Sections not found in primary document for CIK {CIK}, reading full submission")
+        txt = _sec_cache().get_text(edgar_client(), filing["txt_url"])
+        index = parser.run(index_full_submission, txt)
+
+    with _SECTION_INDEXES_LOCK:
+        _SECTION_INDEXES[accession] = index
+        _SECTION_INDEXES.move_to_end(accession)
+        while len(_SECTION_INDEXES) > SECTION_INDEX_MEMORY:
+            _SECTION_INDEXES.popitem(last=False)
+    return index
+
+def get_10k_sections(CIK: str, filing: Optional[dict] = None, items=("1A", "7")) -> Dict[str, str]:
+    """
+    Text of the requested items of a 10-K (the latest unless filing is given). Served
+    from the section archive; on a miss the filing is indexed once, every item found
+    is archived and the requested ones it lacks are recorded as missing, so later
+    lookups of this filing make no document requests.
+    """
+    filing = filing or get_latest_10k_text_url(cik=CIK)
+    accession = filing["accession"]
+    archive = section_archive()
+    sections = archive.get_many(CIK, accession, items)
+    if sections is None:
+        index = get_10k_section_index(CIK, filing)
+        extracted = {item: index.section(item) for item in index.items()}
+        extracted = {item: text for item, text in extracted.items() if text}
+        # Items not found are recorded too, so a filing lacking them isn't indexed on every call
+        not_found = [item for item in items if item not in extracted]
+        try:
+            archive.put(CIK, accession, extracted, missing=not_found,
+                        filed=filing.get("filed"), url=filing["html_url"])
+        except OSError as e:
+            print(f"[Warning] Could not archive sections of {accession}: {e}")
+        sections = {item: extracted[item] for item in items if item in extracted}
+
+    missing = [item for item in items if item not in sections]
+    if missing:
+        raise ValueError(f"Could not locate Item {', '.join(missing)} in 10-K {accession} for CIK {CIK}")
+    return sections
+
+def _stream_primary_document_index(url: str) -> SectionIndex:
+    cache = _sec_cache()
+    cached = cache.peek_text(url, allow_partial=True)
+    if cached is not None:
+        chunks = (cached[i:i + 256 * 1024] for i in range(0, len(cached), 256 * 1024))
+        index, consumed = stream_section_index(chunks)
+        print(f"Read {consumed:,} characters of {url} from cache")
+        return index
+
+    raw, finished = [], []
+    with edgar_client().get(url, stream=True) as response:
+        response.raise_for_status()
+        encoding = response.encoding or "utf-8"
+        try:
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        except LookupError:
+            encoding = "utf-8"
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+
+        # Keep the raw bytes as they're decoded, so what was read can go into the disk cache
+        def chunks():
+            for block in response.iter_content(chunk_size=256 * 1024):
+                raw.append(block)
+                yield decoder.decode(block)
+            yield decoder.decode(b"", final=True)
+            finished.append(True)
+
+        # Closing the response early leaves the rest of the document unread
+        index, consumed = stream_section_index(chunks())
+    print(f"Read {consumed:,} characters of {url}")
+
+    # Filing documents never change: cache the whole document, or the prefix read up to Item 8
+    if cache.is_immutable(url):
+        try:
+            cache.put_bytes(url, b"".join(raw), encoding, partial=not finished)
+        except OSError as e:
+            print(f"[Warning] Could not cache {url}: {e}")
+    return index
 
-    # print(start_pos, end_pos)
+# Get risks and MNA from most recent 10-K since these are often not listed in 10-Q
+def get_risks_mna(CIK: str):
+    sections = get_10k_sections(CIK)
+    return sections["1A"], sections["7"]
 
-    mda_text = clean_text[start_pos:end_pos]
-    return risk_text, mda_text
+def get_risk_factor_changes(CIK: str) -> Optional[dict]:
+    """
+    Paragraph diff (see filing_text.diff_paragraphs) of Item 1A between the latest
+    10-K and the one before it, plus both accession numbers. None when there is no
+    prior 10-K or its risk factors can't be extracted.
+    """
+    filings = get_10k_filings(CIK, limit=2)
+    if len(filings) < 2:
+        return None
+    current = get_10k_sections(CIK, filings[0], ("1A",))["1A"]
+    try:
+        prior = get_10k_sections(CIK, filings[1], ("1A",))["1A"]
+    except (ValueError, requests.RequestException) as e:
+        print(f"[Warning] No prior risk factors to compare for CIK {CIK}: {e}")
+        return None
+    diff = filing_parser().run(diff_paragraphs, prior, current)
+    diff.update(accession=filings[0]["accession"], prior_accession=filings[1]["accession"],
+                prior_filed=filings[1].get("filed"))
+    return diff
 
 # This function was used in development but is not currently called in the flow, left for debugging
 def prompt(risk_text: str, mda_text: str):
@@ -372,17 +830,19 @@ def prompt(risk_text: str, mda_text: str):
     )
     return response.choices[0].message.content
 
-# This function was used in development but is not currently called in the flow, left for debugging
+# Component weights of the SEC score
+FINAL_RATING_WEIGHTS = {
+    'risk': 0.3,
+    'yoy': 0.2,
+    'profit': 0.2,
+    'debt_equity': 0.15,
+    'net_income': 0.15
+}
+
+# Weighted score and recommendation from the component ratings (used by SECFilingAnalysis local scoring)
 def final_rating(risk_rating, yoy_rating, profit_rating, debt_equity_rating, net_income_rating):
-    # Set weights for calculation
-    weights = {
-        'risk': 0.3,
-        'yoy': 0.2,
-        'profit': 0.2,
-        'debt_equity': 0.15,
-        'net_income': 0.15
-    }
-    
+    weights = FINAL_RATING_WEIGHTS
+
     # Calculate final score with weights
     final_score = (
         risk_rating * weights['risk'] +
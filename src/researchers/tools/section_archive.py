@@ -0,0 +1,124 @@
+"""
+section_archive.py - Compressed per-company archive of extracted 10-K sections
+"""
+
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class SectionArchive:
+    """
+    One append-only data file per CIK (CIK##########.sections) holding each section
+    as a separate zlib block, plus an offset index (CIK##########.index.json) mapping
+    accession -> item -> [offset, compressed length]. Reading one section is a seek
+    and a single decompress; filings never change, so entries are never rewritten.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, tuple] = {}  # cik -> (index mtime, index)
+
+    # === Public API ===
+
+    def get(self, cik: str, accession: str, item: str) -> Optional[str]:
+        entry = self._index(cik).get(accession, {}).get("sections", {}).get(item)
+        if entry is None:
+            return None
+        offset, length = entry
+        with open(self._data_path(cik), "rb") as f:
+            f.seek(offset)
+            return zlib.decompress(f.read(length)).decode("utf-8")
+
+    def get_many(self, cik: str, accession: str, items) -> Optional[Dict[str, str]]:
+        """
+        The requested sections of a filing, or None unless every one is either archived
+        or recorded as not present in the filing (those are left out of the result).
+        """
+        record = self._index(cik).get(accession, {})
+        not_present = set(record.get("missing", ()))
+        sections = {}
+        for item in items:
+            if item in not_present:
+                continue
+            text = self.get(cik, accession, item)
+            if text is None:
+                return None
+            sections[item] = text
+        return sections
+
+    def put(self, cik: str, accession: str, sections: Dict[str, str], missing=(), **meta):
+        """
+        Append the sections of one filing (meta, e.g. filed date, is kept in the index).
+        Items already archived for the accession are skipped; missing lists items the
+        filing was searched for and doesn't contain, so it isn't indexed again for them.
+        """
+        cik = cik.zfill(10)
+        with self._lock:
+            record = dict(self._index(cik).get(accession, {}))
+            archived = record.get("sections", {})
+            blocks = {item: zlib.compress(text.encode("utf-8"), 6)
+                      for item, text in sections.items() if item not in archived}
+            not_present = sorted((set(record.get("missing", ())) | set(missing)) - set(archived) - set(blocks))
+            if not blocks and not_present == record.get("missing", []) and all(record.get(k) == v for k, v in meta.items()):
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            entries = {}
+            if blocks:
+                with open(self._data_path(cik), "ab") as f:
+                    for item, block in blocks.items():
+                        f.write(block)
+                        # tell() after an appending write is the end of our own block, even if another writer appended
+                        entries[item] = [f.tell() - len(block), len(block)]
+            index = dict(self._index(cik))
+            record.update(meta)
+            record["sections"] = {**archived, **entries}
+            record["missing"] = not_present
+            index[accession] = record
+            self._write_index(cik, index)
+
+    def accessions(self, cik: str) -> List[dict]:
+        """Archived filings of a company, newest filed first: [{"accession", "filed", "items"}]."""
+        rows = [
+            {"accession": accession, "filed": record.get("filed"), "items": list(record.get("sections", {}))}
+            for accession, record in self._index(cik).items()
+        ]
+        return sorted(rows, key=lambda r: r["filed"] or "", reverse=True)
+
+    # === Internals ===
+
+    def _data_path(self, cik: str) -> Path:
+        return self.directory / f"CIK{cik.zfill(10)}.sections"
+
+    def _index_path(self, cik: str) -> Path:
+        return self.directory / f"CIK{cik.zfill(10)}.index.json"
+
+    def _index(self, cik: str) -> dict:
+        path = self._index_path(cik)
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        cached = self._indexes.get(cik.zfill(10))
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(path) as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[Warning] Ignoring unreadable section archive index {path}: {e}")
+            return {}
+        self._indexes[cik.zfill(10)] = (mtime, index)
+        return index
+
+    def _write_index(self, cik: str, index: dict):
+        path = self._index_path(cik)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, path)
+        self._indexes[cik] = (path.stat().st_mtime_ns, index)
@@ -0,0 +1,61 @@
+"""
+text_chunks.py - Token counting and token-budgeted chunking for LLM prompts
+"""
+
+import re
+from typing import List
+
+# optional exact tokenizer; without it tokens are estimated at ~4 characters each
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODING = None
+
+CHARS_PER_TOKEN = 4
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of text that fits in max_tokens."""
+    if _ENCODING is not None:
+        tokens = _ENCODING.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else _ENCODING.decode(tokens[:max_tokens])
+    return text[:max_tokens * CHARS_PER_TOKEN]
+
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """
+    Split text into pieces of at most ~max_tokens, cutting at sentence ends where possible.
+    The text is tokenized once to learn its characters-per-token ratio and then cut by
+    character offsets, so chunking stays linear even for very long sections.
+    """
+    if not text:
+        return []
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return [text]
+
+    chunk_chars = max(1, int(max_tokens * len(text) / total))
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + chunk_chars)
+        if end < len(text):
+            # Back up to the last sentence end in the second half of the window
+            boundary = None
+            for m in _SENTENCE_END.finditer(text, start + chunk_chars // 2, end):
+                boundary = m.end()
+            if boundary is not None:
+                end = boundary
+        chunks.append(text[start:end].strip())
+        start = end
+    return [c for c in chunks if c]
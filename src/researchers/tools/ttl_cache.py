@@ -0,0 +1,112 @@
+"""
+ttl_cache.py - Size-bounded in-memory cache with LRU eviction and per-kind TTLs
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def estimate_bytes(value: Any, _depth: int = 0) -> int:
+    """Rough memory footprint of a cached value: exact for arrays and frames, recursive for containers."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (str, bytes, bytearray)):
+        return sys.getsizeof(value)
+    if _depth < 4:
+        if isinstance(value, dict):
+            return sys.getsizeof(value) + sum(
+                estimate_bytes(k, _depth + 1) + estimate_bytes(v, _depth + 1) for k, v in value.items())
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return sys.getsizeof(value) + sum(estimate_bytes(v, _depth + 1) for v in value)
+    return sys.getsizeof(value)
+
+
+class TtlLruCache:
+    """
+    Entries are keyed by (kind, key) and expire after their kind's TTL. The total
+    estimated size is kept under max_bytes (and the count under max_entries) by
+    evicting the least recently used entries; expired entries are dropped when read
+    and swept out before anything live is evicted. Thread-safe.
+    """
+
+    def __init__(self, max_bytes: int, ttls: Optional[Dict[str, float]] = None, default_ttl: float = 300.0,
+                 max_entries: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "rejected": 0}
+        self.bytes = 0
+        # (kind, key) -> (expires_at, size, value), least recently used first
+        self._entries: "OrderedDict[Tuple[str, Hashable], tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry[0] <= time.monotonic():
+                self._drop((kind, key))
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end((kind, key))
+            self.stats["hits"] += 1
+            return entry[2]
+
+    def set(self, kind: str, key: Hashable, value: Any, ttl: Optional[float] = None):
+        size = estimate_bytes(value)
+        ttl = ttl if ttl is not None else self.ttls.get(kind, self.default_ttl)
+        with self._lock:
+            if (kind, key) in self._entries:
+                self._drop((kind, key))
+            if size > self.max_bytes:
+                # Would evict everything else and still not fit
+                self.stats["rejected"] += 1
+                return
+            self._entries[(kind, key)] = (time.monotonic() + ttl, size, value)
+            self.bytes += size
+            if self._over_budget():
+                self._sweep_expired()
+            while self._over_budget():
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def invalidate(self, kind: Optional[str] = None):
+        with self._lock:
+            for k in [k for k in self._entries if kind is None or k[0] == kind]:
+                self._drop(k)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def info(self) -> dict:
+        """Counters plus current size, e.g. for logging from a long-running worker."""
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes}
+
+    # === Internals (lock held) ===
+
+    def _over_budget(self) -> bool:
+        return self.bytes > self.max_bytes or (self.max_entries is not None and len(self._entries) > self.max_entries)
+
+    def _sweep_expired(self):
+        now = time.monotonic()
+        for k in [k for k, entry in self._entries.items() if entry[0] <= now]:
+            self._drop(k)
+            self.stats["expirations"] += 1
+
+    def _drop(self, k):
+        _, size, _ = self._entries.pop(k)
+        self.bytes -= size
@@ -1,3 +1,7 @@
+import copy
+import threading
+from collections import OrderedDict
+
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
@@ -6,7 +10,23 @@ from typing import Optional, List, Dict
 SEARCH_URL = "https://query2.finance.yahoo.com/v1/finance/search"   # preferred
 AUTOC_URL  = "https://autoc.finance.yahoo.com/autoc"                # fallback
 
+# One keep-alive session is shared by every lookup in the process (batch runs resolve many names)
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+
+# Best matches by company name, least recently used first (see yahoo_find_ticker_cached)
+MAX_CACHED_MATCHES = 4096
+_MATCHES: "OrderedDict[str, Dict]" = OrderedDict()
+_MATCHES_LOCK = threading.Lock()
+
 def _session() -> requests.Session:
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = _new_session()
+        return _SESSION
+
+def _new_session() -> requests.Session:
     s = requests.Session()
     s.headers.update({
         # Some Yahoo endpoints 404/403 without a UA
@@ -18,7 +38,7 @@ def _session() -> requests.Session:
         status_forcelist=[429, 500, 502, 503, 504],
         allowed_methods=["GET"]
     )
-    s.mount("https://", HTTPAdapter(max_retries=retry))
+    s.mount("https://", HTTPAdapter(max_retries=retry, pool_maxsize=32))
     return s
 
 def yahoo_find_ticker(
@@ -95,6 +115,27 @@ def yahoo_find_ticker(
             "Try the newer search API, ensure a real User-Agent, or check your network/proxy."
         ) from e
 
+def yahoo_find_ticker_cached(company_name: str) -> Optional[Dict]:
+    """
+    Memoized best-match lookup for batch runs, so repeated names resolve once per process.
+    Only successful resolutions are kept; a name that found nothing is looked up again next time.
+    Returns a copy so callers can't mutate the cached entry.
+    """
+    key = company_name.strip()
+    with _MATCHES_LOCK:
+        best = _MATCHES.get(key)
+        if best is not None:
+            _MATCHES.move_to_end(key)
+    if best is None:
+        best = yahoo_find_ticker(key)
+        if best is None:
+            return None
+        with _MATCHES_LOCK:
+            _MATCHES[key] = best
+            while len(_MATCHES) > MAX_CACHED_MATCHES:
+                _MATCHES.popitem(last=False)
+    return copy.deepcopy(best)
+
 # --- Example ---
 if __name__ == "__main__":
     print(yahoo_find_ticker("Apple"))            # -> {'symbol': 'AAPL', ...}